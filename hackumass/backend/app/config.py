@@ -13,5 +13,69 @@ class Settings:
     gemini_api_key: str = os.getenv("GEMINI_API_KEY", "")
     server_host: str = os.getenv("SERVER_HOST", "0.0.0.0")
     server_port: int = int(os.getenv("SERVER_PORT", "8000"))
+    admin_token: str = os.getenv("ADMIN_TOKEN", "")  # /admin/* is only served when set, and requires it in X-Admin-Token
+
+    # Food image index built from MM-Food-100K (see app/food_index_store.py)
+    food_index_path: str = os.getenv("FOOD_INDEX_PATH", "food_index.bin")
+    image_cache_size: int = int(os.getenv("IMAGE_CACHE_SIZE", "20000"))          # memoized name -> image lookups
+    image_cache_ttl: float = float(os.getenv("IMAGE_CACHE_TTL", "86400"))        # seconds before a lookup is redone
+    image_match_workers: int = int(os.getenv("IMAGE_MATCH_WORKERS", str(min(4, os.cpu_count() or 1))))  # batch fuzzy-match processes; <2 disables
+    image_match_parallel_min: int = int(os.getenv("IMAGE_MATCH_PARALLEL_MIN", "16"))  # fewer fuzzy misses than this stay in-process
+
+    # Database backend: "snowflake", or "sqlite" for the local fixture in app/local_db.py
+    db_backend: str = os.getenv("DB_BACKEND", "snowflake").lower()
+    sqlite_path: str = os.getenv("SQLITE_PATH", "local.db")
+
+    # Connection pool (see app/db.py)
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "8"))                          # max open connections
+    db_pool_timeout: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))               # seconds to wait for a free connection
+    db_pool_max_idle: float = float(os.getenv("DB_POOL_MAX_IDLE", "600"))            # close connections idle longer than this
+    db_pool_health_check_after: float = float(os.getenv("DB_POOL_HEALTH_CHECK_AFTER", "60"))  # ping connections idle longer than this
+
+    # Async query executor (see app/db.py)
+    db_executor_workers: int = int(os.getenv("DB_EXECUTOR_WORKERS", os.getenv("DB_POOL_SIZE", "8")))
+    db_query_timeout: float = float(os.getenv("DB_QUERY_TIMEOUT", "30"))         # seconds per awaited query; the statement is cancelled after
+    db_statement_timeout: int = int(os.getenv("DB_STATEMENT_TIMEOUT", "300"))    # server-side cap on any statement (Snowflake); 0 disables
+
+    # Reference-data cache (see app/services/reference_data.py)
+    reference_cache_ttl: float = float(os.getenv("REFERENCE_CACHE_TTL", "3600"))  # seconds before halls/meal/workout types reload
+    user_key_cache_size: int = int(os.getenv("USER_KEY_CACHE_SIZE", "50000"))     # external_user_key -> user_id LRU entries
+
+    # Write-behind queue for food/workout logs (see app/services/write_queue.py)
+    write_queue_enabled: bool = os.getenv("WRITE_QUEUE_ENABLED", "1").lower() in ("1", "true", "yes")
+    write_journal_path: str = os.getenv("WRITE_JOURNAL_PATH", "write_journal.log")
+    write_batch_size: int = int(os.getenv("WRITE_BATCH_SIZE", "200"))            # flush once this many rows are queued
+    write_flush_interval: float = float(os.getenv("WRITE_FLUSH_INTERVAL", "1.0")) # ...or after this many seconds
+    write_max_attempts: int = int(os.getenv("WRITE_MAX_ATTEMPTS", "3"))          # a row failing alone this often goes to the .dead file
+
+    # /dashboard/today snapshot cache (see app/services/dashboard_cache.py)
+    dashboard_cache_size: int = int(os.getenv("DASHBOARD_CACHE_SIZE", "50000"))   # users kept
+    dashboard_cache_ttl: float = float(os.getenv("DASHBOARD_CACHE_TTL", "300"))   # upper bound on staleness from writes made elsewhere
+
+    # In-memory daily menu (see app/services/menu_service.py)
+    menu_refresh_time: str = os.getenv("MENU_REFRESH_TIME", "03:00")            # local HH:MM to reload today's menu
+    menu_refresh_retry: float = float(os.getenv("MENU_REFRESH_RETRY", "300"))   # seconds before retrying a failed reload
+    menu_days_kept: int = int(os.getenv("MENU_DAYS_KEPT", "3"))                 # loaded days kept in memory
+
+    # Gemini recommendation cache for /coach (see app/services/recommendation_cache.py)
+    coach_cache_size: int = int(os.getenv("COACH_CACHE_SIZE", "2000"))
+    coach_cache_ttl: float = float(os.getenv("COACH_CACHE_TTL", "21600"))            # fresh for this long, never past the menu's day
+    coach_cache_stale_ttl: float = float(os.getenv("COACH_CACHE_STALE_TTL", "86400"))  # kept this much longer for LLM timeouts
+    coach_cache_path: str = os.getenv("COACH_CACHE_PATH", "")                         # JSON-lines file to persist entries; empty disables
+    coach_cache_compact_bytes: int = int(os.getenv("COACH_CACHE_COMPACT_BYTES", str(16 * 1024 * 1024)))  # rewrite the file with live entries past this size
+    coach_cache_kcal_bucket: int = int(os.getenv("COACH_CACHE_KCAL_BUCKET", "50"))    # calorie fields are rounded to this for the key
+    coach_llm_timeout: float = float(os.getenv("COACH_LLM_TIMEOUT", "20"))            # seconds before falling back to a stale answer
+
+    # /coach prompt size (see app/services/coach_prompt.py)
+    coach_prompt_per_hall: int = int(os.getenv("COACH_PROMPT_PER_HALL", "15"))          # candidate items kept per hall
+    coach_prompt_token_budget: int = int(os.getenv("COACH_PROMPT_TOKEN_BUDGET", "1200"))  # approx tokens for the menu table
+
+    # Async Gemini client (see GeminiClient in app/gemini_client.py)
+    gemini_api_base: str = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")  # point at a fake server for load tests
+    gemini_max_concurrency: int = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))   # calls in flight; others queue
+    gemini_deadline: float = float(os.getenv("GEMINI_DEADLINE", "30"))            # seconds per call, retries included
+    gemini_max_retries: int = int(os.getenv("GEMINI_MAX_RETRIES", "2"))           # retries on 429/5xx/transport errors
+    gemini_backoff: float = float(os.getenv("GEMINI_BACKOFF", "0.5"))             # first retry delay, doubled each time
+    gemini_hedge_after: float = float(os.getenv("GEMINI_HEDGE_AFTER", "0"))       # send a backup request after this many seconds; 0 disables
 
 settings = Settings()
@@ -1,7 +1,20 @@
-import snowflake.connector
+import asyncio
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
 from .config import settings
 
-def get_connection():
+def _connect_snowflake():
+    import snowflake.connector
+
+    session_parameters = {}
+    if settings.db_statement_timeout > 0:
+        # Backstop for statements nobody is waiting on any more (see _RunningQuery).
+        session_parameters["STATEMENT_TIMEOUT_IN_SECONDS"] = settings.db_statement_timeout
     return snowflake.connector.connect(
         account=settings.snowflake_account,
         user=settings.snowflake_user,
@@ -9,11 +22,280 @@ def get_connection():
         warehouse=settings.snowflake_warehouse,
         database=settings.snowflake_database,
         schema=settings.snowflake_schema,
+        # The connector autocommits each statement by default, which would make
+        # execute_transaction's batches non-atomic; writers commit explicitly.
+        autocommit=False,
+        session_parameters=session_parameters,
     )
 
-def fetch_one(query: str, params: tuple = ()):
-    conn = get_connection()
+def _connect_sqlite():
+    from .local_db import connect
+
+    return connect(settings.sqlite_path)
+
+# Drivers selectable with DB_BACKEND; each returns a DB-API style connection
+# that also supports is_closed().
+DRIVERS = {
+    "snowflake": _connect_snowflake,
+    "sqlite": _connect_sqlite,
+}
+
+def _cancel_snowflake(conn):
+    # The connection is used by one query at a time, so this cancels exactly that one.
+    conn.cursor().execute("SELECT SYSTEM$CANCEL_ALL_QUERIES(%s)", (conn.session_id,))
+
+def _cancel_sqlite(conn):
+    conn.interrupt()
+
+# How to abort the statement a connection is running, called from another thread.
+CANCELLERS = {
+    "snowflake": _cancel_snowflake,
+    "sqlite": _cancel_sqlite,
+}
+
+def get_connection():
+    """Open a brand new connection (used by the pool as its factory)."""
     try:
+        driver = DRIVERS[settings.db_backend]
+    except KeyError:
+        raise ValueError(
+            f"Unknown DB_BACKEND {settings.db_backend!r}; expected one of {sorted(DRIVERS)}"
+        ) from None
+    return driver()
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the checkout timeout."""
+
+
+class QueryTimeout(Exception):
+    """Raised when an awaited query does not finish within its timeout."""
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of reusable connections.
+
+    Idle connections are kept LIFO so the warmest one is reused first, closed
+    once they sit idle longer than `max_idle`, and pinged before reuse if they
+    have been idle longer than `health_check_after`.
+    """
+
+    def __init__(
+        self,
+        connect,
+        max_size: int,
+        timeout: float,
+        max_idle: float,
+        health_check_after: float,
+    ):
+        self._connect = connect
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+
+        self._idle = deque()  # (conn, last_used) pairs, most recent on the right
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._waiting = 0
+        self._created = 0
+        self._closed = 0
+        self._checkouts = 0
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._closed += 1
+
+    def _evict_idle(self, now: float):
+        # Oldest connections sit on the left of the deque.
+        while self._idle and now - self._idle[0][1] > self.max_idle:
+            conn, _ = self._idle.popleft()
+            self._close(conn)
+
+    def _is_healthy(self, conn) -> bool:
+        try:
+            if conn.is_closed():
+                return False
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            return True
+        except Exception:
+            return False
+
+    def checkout(self):
+        """Borrow a connection, opening a new one if the pool has room."""
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._evict_idle(now)
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._in_use < self.max_size:
+                    conn, last_used = None, now
+                    self._in_use += 1
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise PoolTimeout(
+                        f"no database connection free after {self.timeout}s "
+                        f"({self._in_use} in use)"
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._checkouts += 1
+
+        # Connecting and pinging happen outside the lock so other threads
+        # can keep checking connections in and out meanwhile.
+        try:
+            if conn is not None and time.monotonic() - last_used > self.health_check_after:
+                if not self._is_healthy(conn):
+                    with self._cond:
+                        self._close(conn)
+                    conn = None
+            if conn is None:
+                conn = self._connect()
+                with self._cond:
+                    self._created += 1
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def checkin(self, conn, discard: bool = False):
+        """Return a borrowed connection; broken ones should be discarded."""
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.checkout()
+        try:
+            yield conn
+        except Exception:
+            # Roll back whatever the failed statement left behind; if even that
+            # fails the connection is unusable and gets dropped.
+            try:
+                conn.rollback()
+            except Exception:
+                self.checkin(conn, discard=True)
+                raise
+            self.checkin(conn)
+            raise
+        else:
+            self.checkin(conn)
+
+    def close_all(self):
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._close(conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "created": self._created,
+                "closed": self._closed,
+                "checkouts": self._checkouts,
+                "max_size": self.max_size,
+            }
+
+
+# Singleton pool
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Get or create the process-wide connection pool."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    get_connection,
+                    max_size=settings.db_pool_size,
+                    timeout=settings.db_pool_timeout,
+                    max_idle=settings.db_pool_max_idle,
+                    health_check_after=settings.db_pool_health_check_after,
+                )
+    return _pool
+
+def pool_stats() -> dict:
+    return get_pool().stats()
+
+def close_pool():
+    if _pool is not None:
+        _pool.close_all()
+
+
+class _RunningQuery:
+    """The connection an awaited query is using, so its timeout can cancel the statement."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.conn = None
+        self.cancelled = False
+
+    def attach(self, conn):
+        with self._lock:
+            if self.cancelled:
+                raise QueryTimeout("query timed out while waiting for a connection")
+            self.conn = conn
+
+    def detach(self):
+        # Waits for an in-progress cancel, so it never hits the connection's next user.
+        with self._lock:
+            self.conn = None
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self.conn is None:
+                return
+            try:
+                CANCELLERS[settings.db_backend](self.conn)
+            except Exception as e:
+                print(f"Could not cancel timed-out query: {e}")
+
+_local = threading.local()
+
+@contextmanager
+def _connection():
+    """A pooled connection, registered with the awaited query running on this thread (if any)."""
+    running = getattr(_local, "running", None)
+    with get_pool().connection() as conn:
+        if running is None:
+            yield conn
+            return
+        running.attach(conn)
+        try:
+            yield conn
+        finally:
+            running.detach()
+
+
+def fetch_one(query: str, params: tuple = ()):
+    with _connection() as conn:
         cur = conn.cursor()
         cur.execute(query, params)
         row = cur.fetchone()
@@ -21,25 +303,85 @@ def fetch_one(query: str, params: tuple = ()):
             return None
         columns = [c[0] for c in cur.description]
         return dict(zip(columns, row))
-    finally:
-        conn.close()
 
 def fetch_all(query: str, params: tuple = ()):
-    conn = get_connection()
-    try:
+    with _connection() as conn:
         cur = conn.cursor()
         cur.execute(query, params)
         rows = cur.fetchall()
         columns = [c[0] for c in cur.description]
         return [dict(zip(columns, r)) for r in rows]
-    finally:
-        conn.close()
 
 def execute(query: str, params: tuple = ()):
-    conn = get_connection()
-    try:
+    with _connection() as conn:
         cur = conn.cursor()
         cur.execute(query, params)
         conn.commit()
+
+def execute_transaction(statements: list):
+    """
+    Run several (query, params) statements on one connection with a single
+    commit. If any statement fails, the pool rolls back all of them.
+    """
+    with _connection() as conn:
+        cur = conn.cursor()
+        for query, params in statements:
+            cur.execute(query, params)
+        conn.commit()
+
+
+# Async API: the blocking helpers above run on a dedicated, bounded executor so
+# slow queries queue here instead of occupying Starlette's shared threadpool.
+_executor = None
+
+def get_executor() -> ThreadPoolExecutor:
+    """Get or create the executor that runs awaited queries."""
+    global _executor
+    if _executor is None:
+        with _pool_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, settings.db_executor_workers),
+                    thread_name_prefix="db",
+                )
+    return _executor
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def _tracked(running: _RunningQuery, fn, *args):
+    _local.running = running
+    try:
+        return fn(*args)
     finally:
-        conn.close()
+        _local.running = None
+
+async def _run_query(fn, *args, timeout: float = None):
+    if timeout is None:
+        timeout = settings.db_query_timeout
+    loop = asyncio.get_running_loop()
+    running = _RunningQuery()
+    future = loop.run_in_executor(get_executor(), functools.partial(_tracked, running, fn, *args))
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        # wait_for only stops waiting. Cancel the statement so it fails and gives
+        # back its executor thread and connection (the pool rolls it back).
+        # Off the event loop: on Snowflake the cancel is a round trip.
+        loop.run_in_executor(None, running.cancel)
+        raise QueryTimeout(f"query did not finish within {timeout}s") from None
+
+async def fetch_one_async(query: str, params: tuple = (), timeout: float = None):
+    return await _run_query(fetch_one, query, params, timeout=timeout)
+
+async def fetch_all_async(query: str, params: tuple = (), timeout: float = None):
+    return await _run_query(fetch_all, query, params, timeout=timeout)
+
+async def execute_async(query: str, params: tuple = (), timeout: float = None):
+    return await _run_query(execute, query, params, timeout=timeout)
+
+async def execute_transaction_async(statements: list, timeout: float = None):
+    return await _run_query(execute_transaction, statements, timeout=timeout)
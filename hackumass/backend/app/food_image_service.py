@@ -1,51 +1,59 @@
 """
 Service for fetching food images from Hugging Face MM-Food-100K dataset.
+
+Lookups are served from a compact on-disk index (see food_index_store.py) that
+is built from the dataset once and then mmap'd at startup. Results, including
+"no image" answers, are memoized per normalized name in a bounded LRU.
+
+Batch lookups de-duplicate names first and spread the remaining fuzzy matches
+over a small process pool; each worker mmaps the same index file, so the
+pages are shared rather than copied.
 """
-from datasets import load_dataset
-from typing import Optional, Dict
-import re
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Dict, List, Tuple
 from difflib import SequenceMatcher
+from .cache import MISSING, TTLCache
+from .config import settings
+from .food_index_store import FoodIndexStore, build_index_bytes, open_or_build
+from .name_index import normalize_name
 
 class FoodImageService:
-    def __init__(self):
-        self.dataset = None
-        self.food_index = {}
-        self._load_dataset()
+    def __init__(self, on_phase=lambda phase: None):
+        self.store = None
+        self.name_index = None
+        self.index_path = None  # set when backed by a file the match pool can open
+        self.lookup_cache = TTLCache(settings.image_cache_size, settings.image_cache_ttl)
+        self._load_index(on_phase)
     
-    def _load_dataset(self):
-        """Load the MM-Food-100K dataset from Hugging Face."""
+    def _load_index(self, on_phase):
+        """Open the food index, building it from Hugging Face on first run."""
         try:
-            print("Loading MM-Food-100K dataset from Hugging Face...")
-            # Load the dataset - it may take a moment on first load
-            self.dataset = load_dataset("Codatta/MM-Food-100K", split="train", streaming=False)
-            
-            # Create an index mapping food names to dataset entries for faster lookup
-            print("Building food name index...")
-            for idx, item in enumerate(self.dataset):
-                # The dataset uses 'dish_name' field
-                if 'dish_name' in item:
-                    food_name = item.get('dish_name', '')
-                    if food_name:
-                        normalized_name = self._normalize_name(food_name)
-                        
-                        if normalized_name not in self.food_index:
-                            self.food_index[normalized_name] = []
-                        self.food_index[normalized_name].append(idx)
-            
-            print(f"Dataset loaded with {len(self.dataset)} food items")
-            print(f"Index created with {len(self.food_index)} unique food names")
+            self.store = open_or_build(settings.food_index_path, on_phase=on_phase)
+            self.name_index = self.store.trigram_index()
+            self.index_path = settings.food_index_path
+            print(f"Food index loaded with {len(self.store)} food items")
+            print(f"Index has {len(self.store.names)} unique food names")
         except Exception as e:
-            print(f"Error loading dataset: {e}")
-            self.dataset = None
+            print(f"Error loading food index: {e}")
+            self.store = None
+    
+    @classmethod
+    def from_names(cls, dish_names: list[str]) -> "FoodImageService":
+        """Name-only in-memory instance (used by benchmarks)."""
+        service = cls.__new__(cls)
+        service.store = FoodIndexStore(build_index_bytes({"dish_name": dish_names}, "names"))
+        service.name_index = service.store.trigram_index()
+        service.index_path = None
+        service.lookup_cache = TTLCache(settings.image_cache_size, settings.image_cache_ttl)
+        return service
     
     def _normalize_name(self, name: str) -> str:
         """Normalize food name for better matching."""
-        if not name:
-            return ""
-        # Convert to lowercase, remove special characters, and extra spaces
-        normalized = re.sub(r'[^\w\s]', '', name.lower())
-        normalized = re.sub(r'\s+', ' ', normalized).strip()
-        return normalized
+        return normalize_name(name)
     
     def _calculate_similarity(self, str1: str, str2: str) -> float:
         """Calculate similarity ratio between two strings."""
@@ -62,36 +70,68 @@ class FoodImageService:
         Returns:
             Dictionary with image information or None if not found
         """
-        if not self.dataset:
+        if not self.store:
             return None
         
         normalized_query = self._normalize_name(food_name)
+        key = (normalized_query, threshold)
         
+        # Misses are cached as None too, so repeat misses skip the fuzzy scan
+        result = self.lookup_cache.get(key)
+        if result is MISSING:
+            result = self._lookup(normalized_query, threshold)
+            self.lookup_cache.set(key, result)
+        
+        return self._label(result, food_name)
+    
+    def _label(self, result: Optional[Dict], food_name: str) -> Optional[Dict]:
+        """Cached entries are shared; hand back a copy labelled with the caller's name."""
+        if result is None:
+            return None
+        return {**result, 'food_name': food_name}
+    
+    def _lookup(self, normalized_query: str, threshold: float) -> Optional[Dict]:
+        """Uncached exact-then-fuzzy lookup of a normalized name."""
         # First, try exact match
-        if normalized_query in self.food_index:
-            idx = self.food_index[normalized_query][0]
-            item = self.dataset[idx]
-            return self._extract_image_info(item, food_name)
+        name_id = self.store.find_name(normalized_query)
+        if name_id is not None:
+            return self._result_for(name_id, normalized_query)
         
         # If no exact match, try fuzzy matching
+        return self._result_for_match(self._fuzzy_match(normalized_query, threshold), normalized_query)
+    
+    def _result_for(self, name_id: int, normalized_query: str) -> Optional[Dict]:
+        item = self.store.row(self.store.row_for_name(name_id))
+        return self._extract_image_info(item, normalized_query)
+    
+    def _result_for_match(self, match: Optional[Tuple[int, float]], normalized_query: str) -> Optional[Dict]:
+        if match is None:
+            return None
+        name_id, best_score = match
+        result = self._result_for(name_id, normalized_query)
+        if result:
+            result['match_score'] = best_score
+        return result
+    
+    def _fuzzy_match(self, normalized_query: str, threshold: float) -> Optional[Tuple[int, float]]:
+        """Best (name id, score) above threshold using the trigram index."""
+        return self.name_index.best_match(normalized_query, threshold)
+    
+    def _fuzzy_match_linear(self, normalized_query: str, threshold: float) -> Optional[Tuple[int, float]]:
+        """Reference full scan over every indexed name (kept for benchmarks)."""
         best_match = None
         best_score = 0
         
-        for indexed_name, indices in self.food_index.items():
+        for name_id, indexed_name in enumerate(self.store.names):
             similarity = self._calculate_similarity(normalized_query, indexed_name)
             
             if similarity > best_score and similarity >= threshold:
                 best_score = similarity
-                best_match = indices[0]
-        
-        if best_match is not None:
-            item = self.dataset[best_match]
-            result = self._extract_image_info(item, food_name)
-            if result:
-                result['match_score'] = best_score
-            return result
+                best_match = name_id
         
-        return None
+        if best_match is None:
+            return None
+        return best_match, best_score
     
     def _extract_image_info(self, item: Dict, original_name: str) -> Optional[Dict]:
         """Extract image information from dataset item."""
@@ -115,28 +155,151 @@ class FoodImageService:
             print(f"Error extracting image info: {e}")
             return None
     
-    def get_multiple_images(self, food_names: list[str]) -> Dict[str, Optional[Dict]]:
+    def get_multiple_images(self, food_names: list[str], threshold: float = 0.7) -> Dict[str, Optional[Dict]]:
         """
         Get images for multiple food items at once.
         
+        Each distinct normalized name is matched once; cache misses that need
+        fuzzy matching run on the match pool when there are enough of them.
+        
         Args:
             food_names: List of food names from Snowflake
+            threshold: Similarity threshold for fuzzy matching (0.0 to 1.0)
         
         Returns:
-            Dictionary mapping food names to their image information
+            Dictionary mapping food names to their image information, in input order
         """
-        results = {}
-        for name in food_names:
-            results[name] = self.get_food_image(name)
-        return results
+        if not self.store:
+            return {name: None for name in food_names}
+        
+        normalized = {name: self._normalize_name(name) for name in food_names}
+        resolved: Dict[str, Optional[Dict]] = {}
+        fuzzy: List[str] = []
+        for query in dict.fromkeys(normalized.values()):
+            cached = self.lookup_cache.get((query, threshold))
+            if cached is not MISSING:
+                resolved[query] = cached
+                continue
+            name_id = self.store.find_name(query)
+            if name_id is not None:
+                resolved[query] = self._result_for(name_id, query)
+                self.lookup_cache.set((query, threshold), resolved[query])
+            else:
+                fuzzy.append(query)
+        
+        for query, match in zip(fuzzy, self._fuzzy_match_many(fuzzy, threshold)):
+            resolved[query] = self._result_for_match(match, query)
+            self.lookup_cache.set((query, threshold), resolved[query])
+        
+        return {name: self._label(resolved[normalized[name]], name) for name in food_names}
+    
+    def _fuzzy_match_many(self, queries: List[str], threshold: float) -> List[Optional[Tuple[int, float]]]:
+        """Fuzzy-match `queries`, on the match pool when it is worth the IPC."""
+        pool = None
+        if self.index_path and len(queries) >= settings.image_match_parallel_min:
+            pool = _get_match_pool(self.index_path)
+        if pool is not None:
+            chunk = -(-len(queries) // (settings.image_match_workers * 2))
+            chunks = [queries[i:i + chunk] for i in range(0, len(queries), chunk)]
+            try:
+                matches = []
+                for part in pool.map(_match_chunk, chunks, [threshold] * len(chunks)):
+                    matches.extend(part)
+                return matches
+            except BrokenProcessPool as e:
+                print(f"Image match pool failed, matching in-process: {e}")
+                shutdown_match_pool()
+        return [self._fuzzy_match(query, threshold) for query in queries]
+
+
+# Process pool for batch fuzzy matching. Workers open the index file themselves
+# (mmap'd, so the pages are shared) instead of receiving a pickled copy.
+_match_pool = None
+_match_pool_lock = threading.Lock()
+_worker_name_index = None
+
+def _init_match_worker(index_path: str):
+    global _worker_name_index
+    _worker_name_index = FoodIndexStore.open(index_path, verify=False).trigram_index()
+
+def _match_chunk(queries: List[str], threshold: float) -> List[Optional[Tuple[int, float]]]:
+    return [_worker_name_index.best_match(query, threshold) for query in queries]
+
+def _get_match_pool(index_path: str) -> Optional[ProcessPoolExecutor]:
+    """The shared match pool, or None when IMAGE_MATCH_WORKERS is below 2."""
+    global _match_pool
+    if settings.image_match_workers < 2:
+        return None
+    if _match_pool is None:
+        with _match_pool_lock:
+            if _match_pool is None:
+                # spawn, not fork: the API process has DB and write-queue threads running
+                _match_pool = ProcessPoolExecutor(
+                    max_workers=settings.image_match_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_match_worker,
+                    initargs=(index_path,),
+                )
+    return _match_pool
+
+def shutdown_match_pool():
+    global _match_pool
+    with _match_pool_lock:
+        if _match_pool is not None:
+            _match_pool.shutdown(wait=False, cancel_futures=True)
+            _match_pool = None
 
 
 # Singleton instance
 _food_image_service = None
+_service_lock = threading.Lock()
+
+# Warm-up progress, reported by /health/ready
+_warmup = {"status": "not_started", "phase": None, "started_at": None, "finished_at": None, "error": None}
+
+def _set_phase(phase: str):
+    _warmup["phase"] = phase
 
 def get_food_image_service() -> FoodImageService:
-    """Get or create the singleton FoodImageService instance."""
+    """Get or create the singleton FoodImageService instance (blocks while it loads)."""
     global _food_image_service
     if _food_image_service is None:
-        _food_image_service = FoodImageService()
+        with _service_lock:
+            if _food_image_service is None:
+                _warmup.update(status="loading", started_at=time.time())
+                service = FoodImageService(on_phase=_set_phase)
+                _warmup.update(
+                    status="ready" if service.store else "failed",
+                    phase=None,
+                    finished_at=time.time(),
+                    error=None if service.store else "food index unavailable",
+                )
+                _food_image_service = service
+    return _food_image_service
+
+def get_ready_food_image_service() -> Optional[FoodImageService]:
+    """The service if warm-up has finished, else None so callers can degrade."""
     return _food_image_service
+
+def start_warmup() -> threading.Thread:
+    """Load the food image service on a background thread."""
+    thread = threading.Thread(target=get_food_image_service, name="food-image-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def warmup_status() -> dict:
+    status = dict(_warmup)
+    if status["started_at"] is not None:
+        end = status["finished_at"] or time.time()
+        status["elapsed_s"] = round(end - status["started_at"], 3)
+    # A failed load still counts as ready: DB routes work and image lookups degrade.
+    status["ready"] = status["status"] in ("ready", "failed")
+    status["degraded"] = status["status"] == "failed"
+    return status
+
+def image_cache_stats() -> Optional[dict]:
+    """Lookup-cache counters, or None until the service has loaded."""
+    service = _food_image_service
+    if service is None:
+        return None
+    return service.lookup_cache.stats()
@@ -0,0 +1,300 @@
+"""
+Compact on-disk index of the MM-Food-100K fields FoodImageService serves.
+
+Building it walks the Hugging Face dataset once; after that every process just
+mmaps the file, so startup takes milliseconds and uvicorn workers share the
+same page-cache pages instead of each holding a copy of the dataset.
+
+File layout (all sections 8-byte aligned):
+
+    b"UMFIDX01" | u32 header length | JSON header | pad | sections...
+
+The JSON header records the format version, the dataset it was built from,
+each section's (offset, byte length, dtype) relative to the end of the padded
+header, and a CRC32 of all section bytes. A file with the wrong version or
+source, or a bad checksum, is treated as stale and rebuilt.
+
+Builds for the API run in a short-lived child process: decoding the dataset
+into Python objects takes far more memory than the finished index, and the
+allocator would not hand it back, so a worker that built in-process would
+keep that RSS for its whole life.
+
+Rebuild by hand with:
+    python -m app.food_index_store --output food_index.bin
+"""
+import json
+import mmap
+import multiprocessing
+import os
+import struct
+import zlib
+from typing import Callable, Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+from .name_index import TrigramIndex, normalize_name
+
+MAGIC = b"UMFIDX01"
+FORMAT_VERSION = 1
+DATASET_SOURCE = "Codatta/MM-Food-100K:train"
+
+# Columns kept per dataset row; the JSON ones are stored json-encoded.
+ROW_COLUMNS = ("dish_name", "image_url", "nutritional_profile", "ingredients", "cooking_method")
+JSON_COLUMNS = ("nutritional_profile", "ingredients", "cooking_method")
+
+
+class StaleIndexError(Exception):
+    """The index file is missing pieces, from another version/source, or corrupt."""
+
+
+class StringColumn:
+    """Read-only sequence of strings stored as offsets + one UTF-8 blob."""
+
+    def __init__(self, offsets: np.ndarray, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return str(self.blob[start:end], "utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def _encode_strings(values: Iterable[str]):
+    parts = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+    np.cumsum([len(p) for p in parts], out=offsets[1:])
+    return offsets, b"".join(parts)
+
+
+def _encode_value(column: str, value) -> str:
+    if column in JSON_COLUMNS:
+        return json.dumps(value, default=str)
+    return value or ""
+
+
+def build_index_bytes(columns: Dict[str, Sequence], source: str) -> bytes:
+    """
+    Serialize the served columns plus name and trigram indexes.
+
+    `columns` maps column name -> per-row values; only `dish_name` is required.
+    """
+    dish_names = list(columns["dish_name"])
+    n_rows = len(dish_names)
+
+    # Unique normalized names in first-seen order (fuzzy-match ties go to the
+    # earliest name, like the old dict-ordered scan) and the first row of each.
+    first_row: Dict[str, int] = {}
+    for idx, food_name in enumerate(dish_names):
+        if food_name:
+            first_row.setdefault(normalize_name(food_name), idx)
+    names = list(first_row)
+
+    sections = {}
+    for column in ROW_COLUMNS:
+        values = columns.get(column)
+        if values is None:
+            values = [None] * n_rows
+        offsets, blob = _encode_strings(_encode_value(column, v) for v in values)
+        sections[f"{column}.offsets"] = offsets
+        sections[f"{column}.blob"] = blob
+
+    offsets, blob = _encode_strings(names)
+    sections["names.offsets"] = offsets
+    sections["names.blob"] = blob
+    sections["name_first_row"] = np.array([first_row[n] for n in names], dtype=np.int32)
+    sections["name_sorted"] = np.array(sorted(range(len(names)), key=names.__getitem__), dtype=np.int32)
+    sections.update(TrigramIndex.build_arrays(names))
+
+    payload = bytearray()
+    layout = {}
+    for name, data in sections.items():
+        if isinstance(data, np.ndarray):
+            raw, dtype = data.tobytes(), data.dtype.str
+        else:
+            raw, dtype = bytes(data), "bytes"
+        layout[name] = [len(payload), len(raw), dtype]
+        payload += raw
+        payload += b"\0" * (-len(payload) % 8)
+
+    header = json.dumps({
+        "version": FORMAT_VERSION,
+        "source": source,
+        "rows": n_rows,
+        "names": len(names),
+        "sections": layout,
+        "crc32": zlib.crc32(payload),
+    }).encode("utf-8")
+    prefix = MAGIC + struct.pack("<I", len(header)) + header
+    prefix += b"\0" * (-len(prefix) % 8)
+    return prefix + bytes(payload)
+
+
+class FoodIndexStore:
+    """Row and name lookups served directly out of the index bytes."""
+
+    def __init__(self, buffer, expected_source: Optional[str] = None, verify: bool = True):
+        view = memoryview(buffer)
+        if bytes(view[:8]) != MAGIC:
+            raise StaleIndexError("not a food index file")
+        (header_len,) = struct.unpack_from("<I", view, 8)
+        header = json.loads(bytes(view[12:12 + header_len]))
+        if header.get("version") != FORMAT_VERSION:
+            raise StaleIndexError(f"format version {header.get('version')} != {FORMAT_VERSION}")
+        if expected_source is not None and header.get("source") != expected_source:
+            raise StaleIndexError(f"built from {header.get('source')!r}, expected {expected_source!r}")
+
+        base = 12 + header_len
+        base += -base % 8
+        payload = view[base:]
+        if verify and zlib.crc32(payload) != header["crc32"]:
+            raise StaleIndexError("checksum mismatch")
+
+        self._buffer = buffer  # keep the mmap alive as long as the views
+        self.header = header
+        self.n_rows = header["rows"]
+
+        def section(name):
+            offset, length, dtype = header["sections"][name]
+            if offset + length > len(payload):
+                raise StaleIndexError(f"section {name} is truncated")
+            if dtype == "bytes":
+                return payload[offset:offset + length]
+            return np.frombuffer(payload, dtype=np.dtype(dtype), count=length // np.dtype(dtype).itemsize, offset=offset)
+
+        self.columns = {
+            column: StringColumn(section(f"{column}.offsets"), section(f"{column}.blob"))
+            for column in ROW_COLUMNS
+        }
+        self.names = StringColumn(section("names.offsets"), section("names.blob"))
+        self.name_first_row = section("name_first_row")
+        self.name_sorted = section("name_sorted")
+        self.trigram_arrays = {
+            key: section(key)
+            for key in ("name_lengths", "name_trigram_counts", "trigram_keys", "trigram_offsets", "trigram_ids")
+        }
+
+    @classmethod
+    def open(cls, path: str, expected_source: Optional[str] = None, verify: bool = True) -> "FoodIndexStore":
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mapped, expected_source=expected_source, verify=verify)
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def trigram_index(self) -> TrigramIndex:
+        return TrigramIndex.from_arrays(self.names, self.trigram_arrays)
+
+    def find_name(self, normalized_name: str) -> Optional[int]:
+        """Name id of an exact normalized name, by binary search."""
+        lo, hi = 0, len(self.name_sorted)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            candidate = self.names[self.name_sorted[mid]]
+            if candidate < normalized_name:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.name_sorted):
+            name_id = int(self.name_sorted[lo])
+            if self.names[name_id] == normalized_name:
+                return name_id
+        return None
+
+    def row_for_name(self, name_id: int) -> int:
+        return int(self.name_first_row[name_id])
+
+    def row(self, idx: int) -> dict:
+        """Decode one dataset row into the dict shape FoodImageService expects."""
+        item = {}
+        for column, values in self.columns.items():
+            raw = values[idx]
+            if column in JSON_COLUMNS:
+                item[column] = json.loads(raw)
+            else:
+                item[column] = raw or None
+        return item
+
+
+def load_dataset_columns() -> Dict[str, list]:
+    """Pull just the served columns out of the Hugging Face dataset."""
+    from datasets import load_dataset
+
+    print("Loading MM-Food-100K dataset from Hugging Face...")
+    dataset = load_dataset("Codatta/MM-Food-100K", split="train", streaming=False)
+    return {c: dataset[c] for c in ROW_COLUMNS if c in dataset.column_names}
+
+
+def write_index(path: str, data: bytes):
+    """Write atomically so concurrent workers never mmap a half-written file."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def build_index_file(path: str, source: str, load_columns: Callable[[], Dict[str, list]] = load_dataset_columns):
+    write_index(path, build_index_bytes(load_columns(), source))
+
+
+def _build_in_subprocess(path: str, source: str, load_columns: Callable[[], Dict[str, list]]):
+    """Run build_index_file in a spawned child so its peak memory dies with it."""
+    ctx = multiprocessing.get_context("spawn")
+    child = ctx.Process(target=build_index_file, args=(path, source, load_columns), name="food-index-build")
+    child.start()
+    child.join()
+    if child.exitcode != 0:
+        raise RuntimeError(f"food index build failed (exit code {child.exitcode})")
+
+
+def open_or_build(
+    path: str,
+    source: str = DATASET_SOURCE,
+    load_columns: Callable[[], Dict[str, list]] = load_dataset_columns,
+    on_phase: Callable[[str], None] = lambda phase: None,
+    isolate_build: bool = True,
+) -> FoodIndexStore:
+    """
+    Open the index at `path`, rebuilding it first if it is missing or stale.
+    `on_phase` is told which step is running, for warm-up progress reporting.
+    With `isolate_build` the rebuild runs in a child process (`load_columns`
+    must then be a module-level function so it can be pickled).
+    """
+    on_phase("opening_index")
+    try:
+        return FoodIndexStore.open(path, expected_source=source)
+    except FileNotFoundError:
+        print(f"No food index at {path}, building it...")
+    except (StaleIndexError, ValueError, KeyError) as e:
+        print(f"Food index at {path} is stale ({e}), rebuilding...")
+    if isolate_build:
+        on_phase("building_index")
+        _build_in_subprocess(path, source, load_columns)
+    else:
+        on_phase("loading_dataset")
+        columns = load_columns()
+        on_phase("building_index")
+        write_index(path, build_index_bytes(columns, source))
+    on_phase("opening_index")
+    return FoodIndexStore.open(path, expected_source=source)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the on-disk MM-Food-100K index.")
+    parser.add_argument("--output", default="food_index.bin")
+    args = parser.parse_args()
+
+    build_index_file(args.output, DATASET_SOURCE)
+    store = FoodIndexStore.open(args.output)
+    print(f"Wrote {args.output}: {len(store)} rows, {len(store.names)} unique names")
@@ -1,11 +1,31 @@
 # app/gemini_client.py
+import asyncio
 import json
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
 import google.generativeai as genai
+import httpx
+
 from .config import settings
+from .services.coach_prompt import build_prompt
+
+MODEL_NAME = "gemini-2.0-flash"
 
 # Make sure Gemini is configured once
 genai.configure(api_key=settings.gemini_api_key)
 
+_model = None
+
+def get_model() -> "genai.GenerativeModel":
+    """One GenerativeModel for the process instead of one per request."""
+    global _model
+    if _model is None:
+        _model = genai.GenerativeModel(MODEL_NAME)
+    return _model
+
 
 def ask_umunch(user: dict, dining_halls: list[dict], meal_type: str) -> dict:
     """
@@ -13,62 +33,11 @@ def ask_umunch(user: dict, dining_halls: list[dict], meal_type: str) -> dict:
     It returns parsed JSON instead of just printing text.
     """
 
-    model = genai.GenerativeModel("gemini-2.0-flash")
-
-    prompt = f"""
-You are a nutrition assistant helping a student choose meals.
-
-User info (JSON):
-{json.dumps(user, indent=2, default=str)}
-
-Dining hall options (JSON; each row has hall_name/location, item name, kcal, macros, allergens, etc):
-{json.dumps(dining_halls, indent=2, default=str)}
-
-The student is eating **{meal_type.lower()}**.
-
-For EACH dining hall (Worcester, Franklin, Berkshire, Hampshire), pick the top 5 meal options that:
-- Do NOT include any of the user's allergies
-- Respect the user's diet type if provided
-- Are at least 100 calories so the meal is filling
-- Help keep them near or under their daily calorie target if the data is available
-
-Return VALID JSON **only** in this format:
-
-{{
-  "recommendations": {{
-    "Worcester": [
-      {{
-        "itemName": "string",
-        "estimatedCalories": number,
-        "reason": "string"
-      }}
-    ],
-    "Franklin": [
-      {{
-        "itemName": "string",
-        "estimatedCalories": number,
-        "reason": "string"
-      }}
-    ],
-    "Berkshire": [
-      {{
-        "itemName": "string",
-        "estimatedCalories": number,
-        "reason": "string"
-      }}
-    ],
-    "Hampshire": [
-      {{
-        "itemName": "string",
-        "estimatedCalories": number,
-        "reason": "string"
-      }}
-    ]
-  }}
-}}
-
-Do not include any extra text outside that JSON structure.
-"""
+    model = get_model()
+
+    # Allergy/diet/calorie filtering and the compact menu table happen here,
+    # not in the model (see services/coach_prompt.py)
+    prompt, _ = build_prompt(user, dining_halls, meal_type)
 
     response = model.generate_content(
         prompt,
@@ -79,7 +48,333 @@ Do not include any extra text outside that JSON structure.
     return json.loads(response.text)
 
 
+class HallStreamParser:
+    """
+    Incrementally scans streamed `{"recommendations": {"<hall>": [...], ...}}`
+    JSON and returns each hall's list as soon as its closing bracket arrives.
+    `closed` is set once the top-level object has closed.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._key = None
+        self._value_start = None
+        self.closed = False
+
+    def feed(self, chunk: str) -> list[tuple[str, list]]:
+        self.text += chunk
+        done = []
+        for i in range(self._pos, len(self.text)):
+            ch = self.text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 2 and self._value_start is None:
+                        self._key = json.loads(self.text[self._string_start:i + 1])
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in "[{":
+                if self._depth == 2 and self._key is not None:
+                    self._value_start = i
+                self._depth += 1
+            elif ch in "]}":
+                self._depth -= 1
+                if self._depth == 2 and self._value_start is not None:
+                    done.append((self._key, json.loads(self.text[self._value_start:i + 1])))
+                    self._key = self._value_start = None
+                elif self._depth == 0:
+                    self.closed = True
+        self._pos = len(self.text)
+        return done
+
+
+class GeminiError(Exception):
+    """A failed Gemini call; `transient` errors are worth retrying."""
+
+    def __init__(self, message: str, status: Optional[int] = None, transient: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.transient = transient
+
+
+# 408/429 and 5xx are retried; other statuses mean the request itself is bad.
+TRANSIENT_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class GeminiClient:
+    """
+    Async client for the Gemini REST API used by /coach.
+
+    - one pooled HTTP client for the process
+    - at most `max_concurrency` calls in flight; the rest wait their turn
+    - each call has an overall `deadline`, shared by its retries
+    - transient errors are retried with exponential backoff and jitter
+    - with `hedge_after` set, a second identical request is sent if the first
+      has not answered by then, and whichever finishes first wins
+
+    `base_url` can point at a local fake server (see benchmarks/fake_gemini.py).
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str = MODEL_NAME,
+        base_url: str = "https://generativelanguage.googleapis.com",
+        max_concurrency: int = 8,
+        deadline: float = 30.0,
+        max_retries: int = 2,
+        backoff: float = 0.5,
+        hedge_after: float = 0.0,
+    ):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max(1, max_concurrency)
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.hedge_after = hedge_after
+        self._loop = None
+        self._http = None
+        self._semaphore = None
+        self._in_flight = 0
+        self.stats_counters = {"calls": 0, "attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0,
+                               "timeouts": 0, "errors": 0}
 
+    async def _bind(self):
+        """HTTP client and semaphore belong to one event loop; rebuild them for a new one."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            old, self._loop = self._http, loop
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"x-goog-api-key": self.api_key},
+                limits=httpx.Limits(max_connections=self.max_concurrency * 2),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            if old is not None:
+                try:
+                    await old.aclose()
+                except Exception:
+                    # Its connections belong to the previous (maybe closed) loop.
+                    pass
+
+    def _payload(self, prompt: str, json_mode: bool) -> dict:
+        payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        if json_mode:
+            payload["generationConfig"] = {"responseMimeType": "application/json"}
+        return payload
+
+    @staticmethod
+    def _text(body: dict) -> str:
+        try:
+            return "".join(p.get("text", "") for p in body["candidates"][0]["content"]["parts"])
+        except (KeyError, IndexError, TypeError):
+            return ""
+
+    async def _attempt(self, payload: dict, timeout: float) -> str:
+        self.stats_counters["attempts"] += 1
+        try:
+            response = await self._http.post(
+                f"/v1beta/models/{self.model}:generateContent", json=payload, timeout=timeout
+            )
+        except httpx.TimeoutException as e:
+            raise GeminiError(f"request timed out: {e}", transient=True)
+        except httpx.TransportError as e:
+            raise GeminiError(f"transport error: {e}", transient=True)
+        if response.status_code != 200:
+            raise GeminiError(
+                f"Gemini returned {response.status_code}: {response.text[:200]}",
+                status=response.status_code,
+                transient=response.status_code in TRANSIENT_STATUSES,
+            )
+        return self._text(response.json())
+
+    async def _hedged(self, payload: dict, timeout: float) -> str:
+        """Run one attempt, plus a backup if it is still going after `hedge_after`."""
+        if not self.hedge_after or self.hedge_after >= timeout:
+            return await self._attempt(payload, timeout)
+
+        tasks = [asyncio.ensure_future(self._attempt(payload, timeout))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if not done:
+                self.stats_counters["hedges"] += 1
+                tasks.append(asyncio.ensure_future(self._attempt(payload, timeout - self.hedge_after)))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self.stats_counters["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Also runs when the caller's deadline cancels us mid-wait.
+            for task in tasks:
+                task.cancel()
+
+    async def generate(self, prompt: str, json_mode: bool = True, deadline: Optional[float] = None) -> str:
+        """Response text for `prompt`; raises GeminiError or asyncio.TimeoutError."""
+        await self._bind()
+        self.stats_counters["calls"] += 1
+        payload = self._payload(prompt, json_mode)
+        expires = time.monotonic() + (deadline or self.deadline)
+        try:
+            async with self._semaphore, self._counting():
+                attempt = 0
+                while True:
+                    remaining = expires - time.monotonic()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    try:
+                        return await asyncio.wait_for(self._hedged(payload, remaining), remaining)
+                    except GeminiError as e:
+                        if not e.transient or attempt >= self.max_retries:
+                            raise
+                    attempt += 1
+                    self.stats_counters["retries"] += 1
+                    delay = self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                    await asyncio.sleep(min(delay, max(0.0, expires - time.monotonic())))
+        except asyncio.TimeoutError:
+            self.stats_counters["timeouts"] += 1
+            raise
+        except GeminiError:
+            self.stats_counters["errors"] += 1
+            raise
+
+    async def stream(self, prompt: str, json_mode: bool = True, deadline: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Yield response text chunks as they are generated. Only the connection
+        is retried; once text has been yielded a failure is raised as is.
+        The whole stream, retries included, must finish within the deadline
+        or asyncio.TimeoutError is raised.
+        """
+        await self._bind()
+        self.stats_counters["calls"] += 1
+        payload = self._payload(prompt, json_mode)
+        expires = time.monotonic() + (deadline or self.deadline)
+
+        def remaining() -> float:
+            left = expires - time.monotonic()
+            if left <= 0:
+                self.stats_counters["timeouts"] += 1
+                raise asyncio.TimeoutError()
+            return left
+
+        async with self._semaphore, self._counting():
+            for attempt in range(self.max_retries + 1):
+                self.stats_counters["attempts"] += 1
+                started = False
+                try:
+                    async with self._http.stream(
+                        "POST", f"/v1beta/models/{self.model}:streamGenerateContent",
+                        params={"alt": "sse"}, json=payload, timeout=remaining(),
+                    ) as response:
+                        if response.status_code != 200:
+                            body = (await response.aread()).decode("utf-8", "replace")
+                            raise GeminiError(
+                                f"Gemini returned {response.status_code}: {body[:200]}",
+                                status=response.status_code,
+                                transient=response.status_code in TRANSIENT_STATUSES,
+                            )
+                        lines = response.aiter_lines()
+                        while True:
+                            # Bounds a stalled or trickling stream, not just each read.
+                            left = remaining()
+                            try:
+                                line = await asyncio.wait_for(lines.__anext__(), left)
+                            except StopAsyncIteration:
+                                return
+                            except asyncio.TimeoutError:
+                                self.stats_counters["timeouts"] += 1
+                                raise
+                            if line.startswith("data:"):
+                                started = True
+                                yield self._text(json.loads(line[5:]))
+                except httpx.TransportError as e:
+                    error = GeminiError(f"transport error: {e}", transient=not started)
+                except GeminiError as e:
+                    error = e
+                if not error.transient or attempt >= self.max_retries:
+                    self.stats_counters["errors"] += 1
+                    raise error
+                self.stats_counters["retries"] += 1
+                await asyncio.sleep(min(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5), remaining()))
+
+    @asynccontextmanager
+    async def _counting(self):
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+
+    def stats(self) -> dict:
+        return {**self.stats_counters, "in_flight": self._in_flight, "max_concurrency": self.max_concurrency}
+
+
+# Singleton client
+_gemini_client = None
+
+def get_gemini_client() -> GeminiClient:
+    global _gemini_client
+    if _gemini_client is None:
+        _gemini_client = GeminiClient(
+            settings.gemini_api_key,
+            base_url=settings.gemini_api_base,
+            max_concurrency=settings.gemini_max_concurrency,
+            deadline=settings.gemini_deadline,
+            max_retries=settings.gemini_max_retries,
+            backoff=settings.gemini_backoff,
+            hedge_after=settings.gemini_hedge_after,
+        )
+    return _gemini_client
+
+async def close_gemini_client():
+    global _gemini_client
+    if _gemini_client is not None and _gemini_client._http is not None:
+        await _gemini_client._http.aclose()
+    _gemini_client = None
+
+
+async def ask_umunch_async(user: dict, dining_halls: list[dict], meal_type: str) -> dict:
+    """ask_umunch through the shared async client."""
+    prompt, _ = build_prompt(user, dining_halls, meal_type)
+    text = await get_gemini_client().generate(prompt)
+    return json.loads(text)
+
+
+async def stream_umunch_async(user: dict, dining_halls: list[dict], meal_type: str):
+    """
+    Streaming variant of ask_umunch_async: yields (hall, recommendations) as
+    each hall's part of the JSON finishes generating. Raises GeminiError after
+    the last hall if the response did not end as one complete JSON object.
+    """
+    prompt, _ = build_prompt(user, dining_halls, meal_type)
+    parser = HallStreamParser()
+    async for chunk in get_gemini_client().stream(prompt):
+        for hall in parser.feed(chunk):
+            yield hall
+    try:
+        if not parser.closed:
+            raise ValueError("response ended before the JSON object closed")
+        json.loads(parser.text)
+    except ValueError as e:
+        raise GeminiError(f"incomplete streamed response: {e}")
 
 
 # import google.generativeai as genai
@@ -0,0 +1,650 @@
+"""
+Embedded SQLite stand-in for Snowflake.
+
+Lets the backend run (and be benchmarked) on a laptop without Snowflake
+credentials. Set DB_BACKEND=sqlite and the db.py helpers will talk to a local
+file created from the schema below and filled with synthetic data.
+
+The routers are written in Snowflake SQL, so queries go through a few small
+shims first: `%s` placeholders, `CURRENT_DATE()`, `PARSE_JSON`, the
+`TO_VARIANT` / `ARRAY_CONTAINS` / `ARRAY_SIZE` array helpers, fully
+qualified `DB.SCHEMA.TABLE` names and the `MERGE ... WHEN MATCHED / WHEN NOT
+MATCHED` upsert shape used by onboarding.
+
+Rebuild the fixture by hand with:
+    python -m app.local_db --path local.db --users 2000 --days 30
+"""
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Optional
+
+# ---------------------------------------------------------------------------
+# SQL shims
+# ---------------------------------------------------------------------------
+
+_MERGE_RE = re.compile(
+    r"^\s*MERGE\s+INTO\s+(?P<table>[\w.]+)\s+(?:AS\s+)?(?P<talias>\w+)\s+"
+    r"USING\s+\((?P<source>SELECT\b.*?)\)\s+(?:AS\s+)?(?P<salias>\w+)\s+"
+    r"ON\s+(?P<on>.*?)\s+"
+    r"WHEN\s+MATCHED\s+THEN\s+UPDATE\s+SET\s+(?P<set>.*?)\s+"
+    r"WHEN\s+NOT\s+MATCHED\s+THEN\s+INSERT\s*\((?P<cols>.*?)\)\s*"
+    r"VALUES\s*\((?P<vals>.*)\)\s*;?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+_THREE_PART_NAME_RE = re.compile(r"\b[A-Za-z_]\w*\.[A-Za-z_]\w*\.([A-Za-z_]\w*)\b")
+_CURRENT_DATE_RE = re.compile(r"\bCURRENT_DATE\s*\(\s*\)", re.IGNORECASE)
+_CURRENT_TS_RE = re.compile(r"\bCURRENT_TIMESTAMP\s*\(\s*\)", re.IGNORECASE)
+
+
+def _translate_merge(sql: str):
+    """
+    Rewrite a Snowflake MERGE upsert as SQLite's INSERT ... ON CONFLICT.
+
+    Returns (sql, param_order) where param_order maps the new placeholder
+    positions back to the original parameter tuple, or None if `sql` is not a
+    MERGE of the supported shape.
+    """
+    m = _MERGE_RE.match(sql)
+    if not m:
+        return None
+    table, talias, salias = m["table"], m["talias"], m["salias"]
+    if "%s" in m["on"]:
+        raise ValueError("MERGE shim does not support parameters in the ON clause")
+
+    keys = re.findall(
+        rf"\b{talias}\.(\w+)\s*=\s*{salias}\.\w+", m["on"], re.IGNORECASE
+    )
+    if not keys:
+        raise ValueError("MERGE shim needs equality join keys in the ON clause")
+
+    set_clause = re.sub(rf"\b{talias}\.", f"{table}.", m["set"])
+    set_clause = re.sub(rf"\b{salias}\.", "excluded.", set_clause)
+
+    n_source = m["source"].count("%s")
+    n_set = m["set"].count("%s")
+    n_vals = m["vals"].count("%s")
+    param_order = (
+        list(range(n_source + n_set, n_source + n_set + n_vals))
+        + list(range(0, n_source))
+        + list(range(n_source, n_source + n_set))
+    )
+
+    translated = (
+        f"INSERT INTO {table} ({m['cols']}) "
+        f"SELECT {m['vals']} FROM ({m['source']}) AS {salias} WHERE true "
+        f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {set_clause}"
+    )
+    return translated, param_order
+
+
+@lru_cache(maxsize=512)
+def translate(sql: str):
+    """Translate one Snowflake statement to SQLite; returns (sql, param_order)."""
+    param_order = None
+    merged = _translate_merge(sql)
+    if merged:
+        sql, param_order = merged
+    sql = _THREE_PART_NAME_RE.sub(r"\1", sql)
+    sql = _CURRENT_DATE_RE.sub("umunch_current_date()", sql)
+    sql = _CURRENT_TS_RE.sub("CURRENT_TIMESTAMP", sql)
+    sql = sql.replace("%s", "?")
+    return sql, param_order
+
+
+def _parse_json(value):
+    if value is None:
+        return None
+    return json.dumps(json.loads(value))
+
+
+def _array_contains(value, array):
+    if array is None:
+        return None
+    return int(value in json.loads(array))
+
+
+def _array_size(array):
+    if array is None:
+        return None
+    parsed = json.loads(array)
+    return len(parsed) if isinstance(parsed, list) else None
+
+
+class SQLiteCursor:
+    """DB-API cursor facade that mimics what db.py expects from Snowflake."""
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+        self.description = None
+
+    def execute(self, query: str, params=()):
+        sql, param_order = translate(query)
+        params = tuple(params or ())
+        if param_order is not None:
+            params = tuple(params[i] for i in param_order)
+        self._cursor.execute(sql, params)
+        # Snowflake reports unquoted identifiers in upper case.
+        if self._cursor.description:
+            self.description = [
+                (d[0].upper(),) + tuple(d[1:]) for d in self._cursor.description
+            ]
+        else:
+            self.description = None
+        return self
+
+    def executemany(self, query: str, seq_of_params):
+        sql, param_order = translate(query)
+        if param_order is not None:
+            seq_of_params = [tuple(p[i] for i in param_order) for p in seq_of_params]
+        self._cursor.executemany(sql, seq_of_params)
+        self.description = None
+        return self
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+        self._closed = False
+
+    def cursor(self) -> SQLiteCursor:
+        return SQLiteCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def interrupt(self):
+        """Abort the running statement (safe to call from another thread)."""
+        self._conn.interrupt()
+
+    def close(self):
+        self._closed = True
+        self._conn.close()
+
+    def is_closed(self) -> bool:
+        return self._closed
+
+
+def _open(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.create_function("umunch_current_date", 0, lambda: date.today().isoformat())
+    conn.create_function("PARSE_JSON", 1, _parse_json)
+    conn.create_function("TO_VARIANT", 1, lambda value: value)
+    conn.create_function("ARRAY_CONTAINS", 2, _array_contains)
+    conn.create_function("ARRAY_SIZE", 1, _array_size)
+    conn.create_function("CURRENT_VERSION", 0, lambda: f"sqlite {sqlite3.sqlite_version}")
+    return conn
+
+
+_init_lock = threading.Lock()
+_initialized_paths = set()
+
+def connect(path: str) -> SQLiteConnection:
+    """Open the local database, creating and seeding it on first use."""
+    if path not in _initialized_paths:
+        with _init_lock:
+            if path not in _initialized_paths:
+                conn = _open(path)
+                try:
+                    if not _has_schema(conn):
+                        print(f"Creating local database fixture at {path}...")
+                        create_schema(conn)
+                        seed(conn)
+                    else:
+                        _migrate(conn)
+                finally:
+                    conn.close()
+                _initialized_paths.add(path)
+    return SQLiteConnection(_open(path))
+
+
+# ---------------------------------------------------------------------------
+# Schema fixture
+# ---------------------------------------------------------------------------
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dining_halls (
+    dining_hall_id INTEGER PRIMARY KEY,
+    hall_code TEXT NOT NULL UNIQUE,
+    hall_name TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meal_types (
+    meal_type_id INTEGER PRIMARY KEY,
+    meal_type_code TEXT NOT NULL UNIQUE,
+    meal_type_name TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS workout_types (
+    workout_type_id INTEGER PRIMARY KEY,
+    workout_code TEXT NOT NULL UNIQUE,
+    workout_name TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    external_user_key TEXT NOT NULL UNIQUE,
+    first_name TEXT,
+    last_name TEXT,
+    age_years INTEGER,
+    gender_identity TEXT,
+    height_in REAL,
+    weight_lbs REAL,
+    diet_type TEXT,
+    allergies TEXT,
+    goal_type TEXT,
+    activity_level TEXT,
+    preferred_halls TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS user_daily_targets (
+    user_id INTEGER NOT NULL,
+    date_id TEXT NOT NULL,
+    kcal_target REAL,
+    protein_target_g REAL,
+    carb_target_g REAL,
+    fat_target_g REAL,
+    goal_type TEXT,
+    activity_level TEXT,
+    weight_lbs_snapshot REAL,
+    height_in_snapshot REAL,
+    target_source TEXT,
+    PRIMARY KEY (user_id, date_id)
+);
+
+CREATE TABLE IF NOT EXISTS food_logs (
+    food_log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    date_id TEXT NOT NULL,
+    meal_type_id INTEGER,
+    dining_hall_id INTEGER,
+    kcal_total REAL,
+    protein_total_g REAL,
+    carb_total_g REAL,
+    fat_total_g REAL,
+    logged_mode TEXT,
+    logged_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS workout_logs (
+    workout_log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    date_id TEXT NOT NULL,
+    workout_type_id INTEGER,
+    duration_min REAL,
+    intensity TEXT,
+    kcal_burned REAL,
+    is_planned BOOLEAN,
+    logged_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS user_daily_totals (
+    user_id INTEGER NOT NULL,
+    date_id TEXT NOT NULL,
+    consumed_kcal REAL DEFAULT 0,
+    consumed_protein_g REAL DEFAULT 0,
+    consumed_carb_g REAL DEFAULT 0,
+    consumed_fat_g REAL DEFAULT 0,
+    kcal_burned REAL DEFAULT 0,
+    meals_logged INTEGER DEFAULT 0,
+    workouts_logged INTEGER DEFAULT 0,
+    PRIMARY KEY (user_id, date_id)
+);
+
+CREATE TABLE IF NOT EXISTS menu_items (
+    menu_item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date_id TEXT NOT NULL,
+    dining_hall_id INTEGER NOT NULL,
+    meal_type_id INTEGER NOT NULL,
+    item_name TEXT NOT NULL,
+    category TEXT,
+    kcal REAL,
+    protein_g REAL,
+    carb_g REAL,
+    fat_g REAL,
+    allergens TEXT,
+    diet_tags TEXT
+);
+
+-- UMUNCH_DB.DINING_DATA.NOV_12_2025 (the shim drops the DB.SCHEMA qualifier)
+CREATE TABLE IF NOT EXISTS nov_12_2025 (
+    FOOD_ID INTEGER PRIMARY KEY,
+    NAME TEXT NOT NULL,
+    MEAL TEXT NOT NULL,
+    LOCATION TEXT NOT NULL,
+    CATEGORY TEXT,
+    CALORIES REAL,
+    PROTEIN REAL,
+    CARBS REAL,
+    FAT REAL,
+    ALLERGENS TEXT,
+    DIET_TAGS TEXT
+);
+"""
+
+DINING_HALLS = [
+    (1, "WORCESTER", "Worcester Dining Commons", "Worcester"),
+    (2, "FRANKLIN", "Franklin Dining Commons", "Frank"),
+    (3, "BERKSHIRE", "Berkshire Dining Commons", "Berkshire"),
+    (4, "HAMPSHIRE", "Hampshire Dining Commons", "Hampshire"),
+]
+MEAL_TYPES = [
+    (1, "BREAKFAST", "Breakfast"),
+    (2, "LUNCH", "Lunch"),
+    (3, "DINNER", "Dinner"),
+    (4, "SNACK", "Snack"),
+]
+WORKOUT_TYPES = [
+    (1, "WALK", "Walking"),
+    (2, "RUN", "Running"),
+    (3, "LIFT", "Weight Lifting"),
+    (4, "BIKE", "Cycling"),
+    (5, "SWIM", "Swimming"),
+    (6, "YOGA", "Yoga"),
+    (7, "HIIT", "HIIT"),
+]
+
+# (name, category, kcal, protein, carbs, fat, allergens, diet tags)
+MENU_DISHES = [
+    ("Scrambled Eggs", "Entrees", 180, 12, 2, 14, "egg,milk", "vegetarian"),
+    ("Buttermilk Pancakes", "Entrees", 320, 8, 52, 9, "wheat,milk,egg", "vegetarian"),
+    ("Belgian Waffle", "Entrees", 380, 9, 50, 16, "wheat,milk,egg", "vegetarian"),
+    ("Turkey Sausage Links", "Proteins", 150, 14, 2, 9, "", ""),
+    ("Applewood Smoked Bacon", "Proteins", 160, 10, 0, 13, "", ""),
+    ("Tofu Scramble", "Entrees", 200, 16, 8, 12, "soy", "vegan,vegetarian"),
+    ("Steel Cut Oatmeal", "Grains", 160, 6, 28, 3, "", "vegan,vegetarian"),
+    ("Greek Yogurt Parfait", "Dairy", 240, 14, 32, 6, "milk,tree_nut", "vegetarian"),
+    ("Home Fries", "Sides", 210, 3, 30, 9, "", "vegan,vegetarian"),
+    ("Breakfast Burrito", "Entrees", 450, 20, 45, 21, "wheat,egg,milk", ""),
+    ("Everything Bagel with Cream Cheese", "Grains", 360, 11, 56, 10, "wheat,milk,sesame", "vegetarian"),
+    ("Avocado Toast", "Entrees", 290, 8, 30, 16, "wheat", "vegan,vegetarian"),
+    ("Grilled Chicken Breast", "Proteins", 230, 43, 0, 5, "", "halal"),
+    ("Herb Roasted Chicken", "Proteins", 280, 38, 2, 13, "", "halal"),
+    ("Beef Bulgogi", "Entrees", 410, 30, 22, 22, "soy,sesame,wheat", ""),
+    ("Chicken Tikka Masala", "Entrees", 430, 32, 18, 25, "milk", "halal"),
+    ("Chana Masala", "Entrees", 310, 12, 45, 9, "", "vegan,vegetarian"),
+    ("Vegan Black Bean Burger", "Entrees", 340, 17, 45, 11, "wheat,soy", "vegan,vegetarian"),
+    ("Cheeseburger", "Grill", 560, 30, 38, 31, "wheat,milk,sesame", ""),
+    ("French Fries", "Grill", 320, 4, 42, 15, "", "vegan,vegetarian"),
+    ("Sweet Potato Fries", "Grill", 300, 3, 40, 14, "", "vegan,vegetarian"),
+    ("Margherita Pizza", "Pizza", 290, 12, 36, 11, "wheat,milk", "vegetarian"),
+    ("Pepperoni Pizza", "Pizza", 320, 13, 35, 14, "wheat,milk", ""),
+    ("Buffalo Chicken Wrap", "Deli", 520, 31, 44, 24, "wheat,milk", ""),
+    ("Turkey Club Sandwich", "Deli", 480, 29, 40, 22, "wheat,egg", ""),
+    ("Caesar Salad", "Salads", 220, 7, 10, 17, "milk,fish,egg,wheat", "vegetarian"),
+    ("Quinoa Power Bowl", "Bowls", 420, 16, 58, 14, "sesame", "vegan,vegetarian"),
+    ("Salmon Poke Bowl", "Bowls", 480, 32, 52, 15, "fish,soy,sesame", ""),
+    ("General Tso's Chicken", "Entrees", 520, 26, 56, 21, "wheat,soy,egg", ""),
+    ("Vegetable Lo Mein", "Entrees", 380, 11, 62, 10, "wheat,soy", "vegan,vegetarian"),
+    ("Pad Thai with Tofu", "Entrees", 450, 17, 60, 16, "peanut,soy,egg", "vegetarian"),
+    ("Shrimp Fried Rice", "Entrees", 410, 19, 58, 11, "shellfish,soy,egg", ""),
+    ("Baked Ziti", "Pasta", 430, 19, 52, 16, "wheat,milk", "vegetarian"),
+    ("Spaghetti and Meatballs", "Pasta", 560, 28, 64, 20, "wheat,milk,egg", ""),
+    ("Mac and Cheese", "Pasta", 470, 18, 48, 22, "wheat,milk", "vegetarian"),
+    ("Penne Alla Vodka", "Pasta", 440, 13, 55, 18, "wheat,milk", "vegetarian"),
+    ("Beef Tacos", "Entrees", 390, 22, 30, 20, "milk", ""),
+    ("Chicken Quesadilla", "Entrees", 510, 33, 38, 25, "wheat,milk", ""),
+    ("Black Bean Soup", "Soups", 190, 10, 32, 2, "", "vegan,vegetarian"),
+    ("New England Clam Chowder", "Soups", 260, 9, 20, 16, "shellfish,milk,wheat", ""),
+    ("Tomato Basil Soup", "Soups", 150, 3, 20, 7, "milk", "vegetarian"),
+    ("Chicken Noodle Soup", "Soups", 140, 10, 15, 4, "wheat,egg", ""),
+    ("Roasted Broccoli", "Vegetables", 80, 4, 9, 4, "", "vegan,vegetarian"),
+    ("Garlic Green Beans", "Vegetables", 70, 2, 8, 4, "", "vegan,vegetarian"),
+    ("Steamed Jasmine Rice", "Grains", 200, 4, 45, 0, "", "vegan,vegetarian"),
+    ("Brown Rice Pilaf", "Grains", 210, 5, 43, 2, "", "vegan,vegetarian"),
+    ("Mashed Potatoes", "Sides", 230, 4, 33, 9, "milk", "vegetarian"),
+    ("Cod with Lemon Butter", "Proteins", 240, 30, 2, 12, "fish,milk", ""),
+    ("Teriyaki Salmon", "Proteins", 330, 34, 12, 16, "fish,soy,wheat", ""),
+    ("Pulled Pork Sandwich", "Entrees", 540, 32, 50, 22, "wheat", ""),
+    ("Falafel Pita", "Entrees", 460, 15, 58, 18, "wheat,sesame", "vegan,vegetarian"),
+    ("Hummus and Pita", "Sides", 250, 8, 32, 10, "wheat,sesame", "vegan,vegetarian"),
+    ("Chocolate Chip Cookie", "Desserts", 210, 2, 28, 10, "wheat,milk,egg", "vegetarian"),
+    ("Fudge Brownie", "Desserts", 260, 3, 36, 12, "wheat,milk,egg", "vegetarian"),
+    ("Fresh Fruit Cup", "Desserts", 70, 1, 18, 0, "", "vegan,vegetarian"),
+    ("Peanut Butter Smoothie", "Beverages", 350, 15, 40, 14, "peanut,milk", "vegetarian"),
+]
+MENU_MODIFIERS = ["", "Spicy ", "Roasted ", "Homestyle ", "Grilled ", "Lemon Herb ", "Smoky ", "Korean "]
+
+FIRST_NAMES = ["Alex", "Jordan", "Taylor", "Sam", "Riley", "Casey", "Morgan", "Jamie", "Avery", "Quinn"]
+LAST_NAMES = ["Nguyen", "Smith", "Garcia", "Patel", "Kim", "Johnson", "Lee", "Brown", "Lopez", "Cohen"]
+ACTIVITY_LEVELS = ["NOT_VERY_ACTIVE", "LIGHTLY_ACTIVE", "ACTIVE", "VERY_ACTIVE"]
+ALLERGENS = ["peanut", "tree_nut", "milk", "egg", "wheat", "soy", "fish", "shellfish", "sesame"]
+
+
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone()
+    return row is not None
+
+
+def _has_schema(conn: sqlite3.Connection) -> bool:
+    return _has_table(conn, "users")
+
+
+def _migrate(conn: sqlite3.Connection):
+    """Bring a fixture built by an older version up to the current schema."""
+    if not _has_table(conn, "user_daily_totals"):
+        print("Adding user_daily_totals to the local database fixture...")
+        conn.executescript(SCHEMA)
+        backfill_daily_totals(conn)
+        conn.commit()
+
+
+def backfill_daily_totals(conn: sqlite3.Connection):
+    """Fill user_daily_totals from the log tables (daily_totals.reconcile in plain SQLite)."""
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO user_daily_totals
+        SELECT user_id, date_id, SUM(kcal), SUM(protein_g), SUM(carb_g), SUM(fat_g),
+               SUM(kcal_burned), SUM(meals), SUM(workouts)
+        FROM (
+            SELECT user_id, date_id, kcal_total AS kcal, protein_total_g AS protein_g,
+                   carb_total_g AS carb_g, fat_total_g AS fat_g,
+                   0 AS kcal_burned, 1 AS meals, 0 AS workouts
+            FROM food_logs
+            UNION ALL
+            SELECT user_id, date_id, 0, 0, 0, 0, kcal_burned, 0, 1 FROM workout_logs
+        )
+        GROUP BY user_id, date_id
+        """
+    )
+
+
+def create_schema(conn: sqlite3.Connection):
+    conn.executescript(SCHEMA)
+    conn.executemany(
+        "INSERT OR IGNORE INTO dining_halls VALUES (?, ?, ?)",
+        [h[:3] for h in DINING_HALLS],
+    )
+    conn.executemany("INSERT OR IGNORE INTO meal_types VALUES (?, ?, ?)", MEAL_TYPES)
+    conn.executemany("INSERT OR IGNORE INTO workout_types VALUES (?, ?, ?)", WORKOUT_TYPES)
+    conn.commit()
+
+
+def _menu_rows(rng: random.Random, items_per_meal: int):
+    """Yield (hall, meal_type, name, category, kcal, protein, carbs, fat, allergens, diets)."""
+    for hall in DINING_HALLS:
+        for meal_type in MEAL_TYPES[:3]:
+            picks = rng.sample(MENU_DISHES, min(items_per_meal, len(MENU_DISHES)))
+            for name, category, kcal, protein, carbs, fat, allergens, diets in picks:
+                scale = rng.uniform(0.85, 1.2)
+                yield (
+                    hall, meal_type,
+                    rng.choice(MENU_MODIFIERS) + name, category,
+                    round(kcal * scale), round(protein * scale, 1),
+                    round(carbs * scale, 1), round(fat * scale, 1),
+                    allergens, diets,
+                )
+
+
+def seed(
+    conn: sqlite3.Connection,
+    users: int = 2000,
+    days: int = 30,
+    items_per_meal: int = 40,
+    seed_value: int = 12,
+    today: Optional[date] = None,
+):
+    """
+    Fill the schema with synthetic data.
+
+    The defaults give ~2K users, ~180K food_logs and ~30K workout_logs over a
+    month of history, plus a ~40-item menu per hall and meal for every day.
+    """
+    rng = random.Random(seed_value)
+    today = today or date.today()
+    day_ids = [(today - timedelta(days=d)).isoformat() for d in range(days - 1, -1, -1)]
+
+    user_rows = []
+    for i in range(users):
+        allergies = rng.sample(ALLERGENS, rng.choice([0, 0, 0, 1, 2]))
+        diet = rng.choice(["NONE", "NONE", "NONE", "VEGETARIAN", "VEGAN", "HALAL"])
+        halls = rng.sample([h[1] for h in DINING_HALLS], rng.randint(1, 4))
+        user_rows.append((
+            f"student{i}@umass.edu",
+            rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+            rng.randint(18, 26), rng.choice(["MALE", "FEMALE", "NON-BINARY"]),
+            rng.randint(60, 76), round(rng.uniform(110, 230), 1),
+            diet, json.dumps(allergies),
+            rng.choice(["CUT", "BULK", "MAINTAIN"]), rng.choice(ACTIVITY_LEVELS),
+            json.dumps(halls),
+        ))
+    conn.executemany(
+        """
+        INSERT INTO users (
+            external_user_key, first_name, last_name, age_years, gender_identity,
+            height_in, weight_lbs, diet_type, allergies, goal_type, activity_level,
+            preferred_halls
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        user_rows,
+    )
+    user_ids = [r[0] for r in conn.execute("SELECT user_id FROM users ORDER BY user_id")]
+
+    target_rows, food_rows, workout_rows = [], [], []
+    for user_id in user_ids:
+        kcal_target = rng.randint(1700, 3200)
+        protein = round(kcal_target * 0.25 / 4, 1)
+        fat = round(kcal_target * 0.25 / 9, 1)
+        carbs = round(kcal_target * 0.5 / 4, 1)
+        for day_id in day_ids:
+            target_rows.append((user_id, day_id, kcal_target, protein, carbs, fat, "AUTO_CALC"))
+            for _ in range(rng.choice([2, 3, 3, 4])):
+                kcal = rng.randint(250, 900)
+                food_rows.append((
+                    user_id, day_id, rng.randint(1, 4), rng.randint(1, 4),
+                    kcal, round(kcal * 0.2 / 4, 1), round(kcal * 0.5 / 4, 1),
+                    round(kcal * 0.3 / 9, 1), "MANUAL",
+                ))
+            if rng.random() < 0.5:
+                workout_rows.append((
+                    user_id, day_id, rng.randint(1, len(WORKOUT_TYPES)),
+                    rng.choice([20, 30, 45, 60]),
+                    rng.choice(["LIGHT", "MODERATE", "INTENSE"]), rng.randint(100, 700), False,
+                ))
+    conn.executemany(
+        """
+        INSERT INTO user_daily_targets (
+            user_id, date_id, kcal_target, protein_target_g, carb_target_g,
+            fat_target_g, target_source
+        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        target_rows,
+    )
+    conn.executemany(
+        """
+        INSERT INTO food_logs (
+            user_id, date_id, meal_type_id, dining_hall_id,
+            kcal_total, protein_total_g, carb_total_g, fat_total_g, logged_mode
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        food_rows,
+    )
+    conn.executemany(
+        """
+        INSERT INTO workout_logs (
+            user_id, date_id, workout_type_id, duration_min, intensity, kcal_burned, is_planned
+        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        workout_rows,
+    )
+    backfill_daily_totals(conn)
+
+    menu_rows = []
+    for day_id in day_ids:
+        for hall, meal_type, *item in _menu_rows(rng, items_per_meal):
+            menu_rows.append((day_id, hall[0], meal_type[0], *item))
+    conn.executemany(
+        """
+        INSERT INTO menu_items (
+            date_id, dining_hall_id, meal_type_id, item_name, category,
+            kcal, protein_g, carb_g, fat_g, allergens, diet_tags
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        menu_rows,
+    )
+
+    # The legacy single-day dining table uses location names and lower-case meals.
+    conn.executemany(
+        """
+        INSERT INTO nov_12_2025 (
+            NAME, MEAL, LOCATION, CATEGORY, CALORIES, PROTEIN, CARBS, FAT, ALLERGENS, DIET_TAGS
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (name, meal_type[2].lower(), hall[3], category, kcal, protein, carbs, fat, allergens, diets)
+            for hall, meal_type, name, category, kcal, protein, carbs, fat, allergens, diets
+            in _menu_rows(rng, items_per_meal)
+        ],
+    )
+    conn.commit()
+    print(
+        f"Seeded {len(user_ids)} users, {len(target_rows)} targets, "
+        f"{len(food_rows)} food logs, {len(workout_rows)} workout logs, "
+        f"{len(menu_rows)} menu items"
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the local SQLite fixture database.")
+    parser.add_argument("--path", default="local.db")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--items-per-meal", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=12)
+    args = parser.parse_args()
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.path + suffix):
+            os.remove(args.path + suffix)
+    conn = _open(args.path)
+    create_schema(conn)
+    seed(conn, users=args.users, days=args.days, items_per_meal=args.items_per_meal, seed_value=args.seed)
+    conn.close()
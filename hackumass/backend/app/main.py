@@ -1,9 +1,15 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from .testdb import router as test_db_router
-from .routers import dashboard, meals, workout, coach, onboarding
-from .food_image_service import get_food_image_service
+from .routers import dashboard, meals, workout, coach, onboarding, admin
+from .food_image_service import start_warmup, warmup_status, shutdown_match_pool
+from .db import pool_stats, close_pool, shutdown_executor, PoolTimeout, QueryTimeout
+from .services.write_queue import get_write_queue, close_write_queue
+from .services.menu_service import menu_service
+from .gemini_client import close_gemini_client
+from .config import settings
 
 app = FastAPI(title="UMunch API")
 
@@ -21,14 +27,51 @@ app.include_router(meals.router)
 app.include_router(workout.router)
 app.include_router(coach.router)
 app.include_router(onboarding.router)
+# Cache stats and data-mutating jobs; off unless an admin token is configured.
+if settings.admin_token:
+    app.include_router(admin.router)
+
+@app.exception_handler(PoolTimeout)
+@app.exception_handler(QueryTimeout)
+async def database_timeout_handler(request: Request, exc: Exception):
+    return JSONResponse(status_code=503, content={"error": "database_timeout", "detail": str(exc)})
 
 @app.get("/health")
 def health():
+    return {"status": "ok", "db_pool": pool_stats(), "image_service": warmup_status()}
+
+@app.get("/health/live")
+def liveness():
+    """The process is up and serving requests."""
     return {"status": "ok"}
 
+@app.get("/health/ready")
+def readiness():
+    """503 until the food image service has finished warming up."""
+    status = warmup_status()
+    return JSONResponse(
+        status_code=200 if status["ready"] else 503,
+        content={"ready": status["ready"], "image_service": status},
+    )
+
 @app.on_event("startup")
 async def startup_event():
-    """Preload the food image dataset on server startup."""
-    print("Preloading food image dataset...")
-    get_food_image_service()
-    print("Food image service ready!")
+    """Replay unflushed log writes, load today's menu and start warming up the food image index."""
+    get_write_queue()
+    menu_service.start()
+    # Loads in the background so DB-only routes are served right away.
+    print("Warming up food image service in the background...")
+    start_warmup()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """Flush queued log writes, stop worker pools and close pooled database connections."""
+    menu_service.stop()
+    close_write_queue()
+    shutdown_executor()
+    shutdown_match_pool()
+    close_pool()
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    await close_gemini_client()
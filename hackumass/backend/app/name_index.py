@@ -0,0 +1,155 @@
+"""
+Character-trigram index for approximate food-name lookup.
+
+FoodImageService used to score a query against every dataset name with
+difflib.SequenceMatcher. This index narrows that down to a small candidate set
+first and only runs SequenceMatcher on those, so a miss costs a few
+milliseconds instead of a full scan.
+
+Postings are kept as flat numpy arrays (sorted trigram keys, offsets, name
+ids) so the index can be stored in and served straight from the mmap'd food
+index file (see food_index_store.py).
+"""
+import re
+from difflib import SequenceMatcher
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def normalize_name(name: str) -> str:
+    """Normalize food name for better matching."""
+    if not name:
+        return ""
+    # Convert to lowercase, remove special characters, and extra spaces
+    normalized = re.sub(r'[^\w\s]', '', name.lower())
+    normalized = re.sub(r'\s+', ' ', normalized).strip()
+    return normalized
+
+
+def trigrams(name: str) -> set:
+    """Trigrams of `name` padded so short names and word starts still count."""
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def trigram_key(gram: str) -> int:
+    """Pack a trigram's three code points (21 bits each) into one int64."""
+    return (ord(gram[0]) << 42) | (ord(gram[1]) << 21) | ord(gram[2])
+
+
+class TrigramIndex:
+    def __init__(
+        self,
+        names: Sequence[str],
+        lengths: np.ndarray,
+        trigram_counts: np.ndarray,
+        keys: np.ndarray,
+        offsets: np.ndarray,
+        ids: np.ndarray,
+        max_candidates: int = 256,
+    ):
+        self.names = names
+        self.lengths = lengths                # len(name) per name id
+        self.trigram_counts = trigram_counts  # distinct trigrams per name id
+        self.keys = keys                      # sorted trigram keys
+        self.offsets = offsets                # postings of keys[k] are ids[offsets[k]:offsets[k + 1]]
+        self.ids = ids
+        self.max_candidates = max_candidates
+
+    @staticmethod
+    def build_arrays(names: Sequence[str]) -> dict:
+        """Compute the index arrays for `names` (name ids are list positions)."""
+        lengths = np.fromiter((len(n) for n in names), dtype=np.int32, count=len(names))
+        trigram_counts = np.zeros(len(names), dtype=np.int32)
+        pair_keys, pair_ids = [], []
+        for i, name in enumerate(names):
+            grams = trigrams(name)
+            trigram_counts[i] = len(grams)
+            pair_keys.extend(trigram_key(g) for g in grams)
+            pair_ids.extend([i] * len(grams))
+
+        pair_keys = np.array(pair_keys, dtype=np.int64)
+        pair_ids = np.array(pair_ids, dtype=np.int32)
+        # Stable sort keeps each posting list in ascending name-id order.
+        order = np.argsort(pair_keys, kind="stable")
+        pair_keys, pair_ids = pair_keys[order], pair_ids[order]
+        keys, starts = np.unique(pair_keys, return_index=True)
+        offsets = np.append(starts, len(pair_keys)).astype(np.int64)
+        return {
+            "name_lengths": lengths,
+            "name_trigram_counts": trigram_counts,
+            "trigram_keys": keys,
+            "trigram_offsets": offsets,
+            "trigram_ids": pair_ids,
+        }
+
+    @classmethod
+    def from_arrays(cls, names: Sequence[str], arrays: dict, **kwargs) -> "TrigramIndex":
+        return cls(
+            names,
+            lengths=arrays["name_lengths"],
+            trigram_counts=arrays["name_trigram_counts"],
+            keys=arrays["trigram_keys"],
+            offsets=arrays["trigram_offsets"],
+            ids=arrays["trigram_ids"],
+            **kwargs,
+        )
+
+    @classmethod
+    def build(cls, names: Sequence[str], **kwargs) -> "TrigramIndex":
+        return cls.from_arrays(names, cls.build_arrays(names), **kwargs)
+
+    def _postings(self, grams):
+        if len(self.keys) == 0:
+            return []
+        query_keys = np.fromiter((trigram_key(g) for g in grams), dtype=np.int64, count=len(grams))
+        pos = np.searchsorted(self.keys, query_keys)
+        lists = []
+        for k, p in zip(query_keys, pos):
+            if p < len(self.keys) and self.keys[p] == k:
+                lists.append(self.ids[self.offsets[p]:self.offsets[p + 1]])
+        return lists
+
+    def candidates(self, query: str, threshold: float) -> np.ndarray:
+        """Ids of the names most likely to score >= threshold, in index order."""
+        grams = trigrams(query)
+        lists = self._postings(grams)
+        if not lists:
+            return np.empty(0, dtype=np.int32)
+        shared = np.bincount(np.concatenate(lists), minlength=len(self.names))
+
+        # SequenceMatcher.ratio() <= 2 * min(la, lb) / (la + lb), which rules
+        # out names that are too short or too long before any scoring.
+        la = len(query)
+        mask = shared > 0
+        if threshold > 0:
+            mask &= self.lengths >= la * threshold / (2 - threshold)
+            mask &= self.lengths <= la * (2 - threshold) / threshold
+        ids = np.flatnonzero(mask)
+
+        if len(ids) > self.max_candidates:
+            dice = 2 * shared[ids] / (len(grams) + self.trigram_counts[ids])
+            top = np.argpartition(-dice, self.max_candidates - 1)[:self.max_candidates]
+            ids = np.sort(ids[top])
+        return ids
+
+    def best_match(self, query: str, threshold: float) -> Optional[Tuple[int, float]]:
+        """
+        Best (id, score) with score >= threshold, scored like the old linear
+        scan: SequenceMatcher(None, query, name).ratio(), first name wins ties.
+        """
+        matcher = SequenceMatcher(None, query, "")
+        best_id, best_score = None, 0
+        for i in self.candidates(query, threshold):
+            matcher.set_seq2(self.names[i])
+            # quick_ratio() is an upper bound on ratio(); skip hopeless names cheaply.
+            bound = matcher.quick_ratio()
+            if bound <= best_score or bound < threshold:
+                continue
+            score = matcher.ratio()
+            if score > best_score and score >= threshold:
+                best_id, best_score = int(i), score
+        if best_id is None:
+            return None
+        return best_id, best_score
@@ -0,0 +1,74 @@
+import hmac
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from ..config import settings
+from ..food_image_service import image_cache_stats
+from ..gemini_client import get_gemini_client
+from ..services import daily_totals, reference_data
+from ..services.dashboard_cache import dashboard_cache
+from ..services.menu_service import menu_service
+from ..services.targets import rollover_targets
+from ..services.recommendation_cache import recommendation_cache
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Every /admin route needs the configured ADMIN_TOKEN in X-Admin-Token."""
+    if not settings.admin_token or not hmac.compare_digest(x_admin_token or "", settings.admin_token):
+        raise HTTPException(status_code=401, detail="admin token required")
+
+# Only mounted when ADMIN_TOKEN is set (see main.py).
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+@router.get("/admin/cache")
+def get_cache_stats():
+    """Hit/miss counters for the in-process caches (and the Gemini client they front)."""
+    return {
+        "reference_data": reference_data.cache_stats(),
+        "food_images": image_cache_stats(),
+        "recommendations": recommendation_cache.stats(),
+        "dashboard": dashboard_cache.stats(),
+        "menu": menu_service.stats(),
+        "gemini": get_gemini_client().stats(),
+    }
+
+@router.post("/admin/cache/reference/invalidate")
+def invalidate_reference_cache(table: Optional[str] = None):
+    """
+    Force the dimension tables to reload on next use, e.g. after adding a
+    dining hall or workout type. Omit `table` to drop all of them.
+    """
+    if table is not None and table not in reference_data.REFERENCE_TABLES:
+        return {"error": "unknown_table", "tables": sorted(reference_data.REFERENCE_TABLES)}
+    reference_data.invalidate(table)
+    return {"status": "ok"}
+
+@router.post("/admin/cache/recommendations/clear")
+def clear_recommendation_cache():
+    """Drop cached /coach answers, e.g. after changing the prompt or a menu fix."""
+    recommendation_cache.clear()
+    return {"status": "ok"}
+
+@router.post("/admin/daily-totals/reconcile")
+def reconcile_daily_totals(start: Optional[date] = None, end: Optional[date] = None):
+    """
+    Recompute user_daily_totals from food_logs / workout_logs for [start, end]
+    (default: all history up to today), e.g. after editing log rows by hand.
+    """
+    batches = daily_totals.reconcile(start, end)
+    dashboard_cache.clear()
+    return {"status": "ok", "batches": batches}
+
+@router.post("/admin/menu/refresh")
+def refresh_menu(day: Optional[date] = None):
+    """Reload a day's menu (default today) into memory, e.g. after a menu fix."""
+    menu = menu_service.refresh(day)
+    return {"status": "ok", "day": menu.day.isoformat(), "items": len(menu)}
+
+@router.post("/admin/targets/rollover")
+def rollover_daily_targets(day: Optional[date] = None):
+    """Write `day`'s (default tomorrow) targets for every active user (see services/targets.py)."""
+    result = rollover_targets(day)
+    if day == date.today():
+        dashboard_cache.clear()
+    return {"status": "ok", **result}
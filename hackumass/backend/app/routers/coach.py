@@ -1,64 +1,222 @@
-from fastapi import APIRouter
+import asyncio
+import json
+import time
+from contextlib import contextmanager
+from datetime import date
+from fastapi import APIRouter, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from ..db import fetch_all
-from ..gemini_client import ask_umunch
-from ..food_image_service import get_food_image_service
+from ..db import fetch_all_async
+from ..gemini_client import ask_umunch_async, stream_umunch_async
+from ..food_image_service import get_ready_food_image_service
+from ..services.recommendation_cache import cached_recommendation, fingerprint, recommendation_cache
+from ..services.meal_ranking import rank_menu, ranked_answer
+from ..services.dashboard_cache import merge_pending
+from ..services.menu_service import menu_service
+from ..services.write_queue import read_with_pending
 
 router = APIRouter()
 
+# Targets, profile and what was eaten so far today (the same rollup /dashboard/today reads),
+# so the ranking, the prompt and the cache key all see what is left.
+SNAPSHOT_SQL = """
+        SELECT
+            t.*,
+            u.*,
+            COALESCE(d.consumed_kcal, 0) AS consumed_kcal,
+            COALESCE(d.consumed_protein_g, 0) AS consumed_protein_g,
+            COALESCE(d.consumed_carb_g, 0) AS consumed_carb_g,
+            COALESCE(d.consumed_fat_g, 0) AS consumed_fat_g,
+            COALESCE(d.kcal_burned, 0) AS workout_kcal_burned,
+            t.kcal_target - COALESCE(d.consumed_kcal, 0) AS remaining_kcal
+        FROM user_daily_targets t
+        JOIN users u ON u.user_id = t.user_id
+        LEFT JOIN user_daily_totals d ON d.user_id = t.user_id AND d.date_id = t.date_id
+        WHERE u.external_user_key = %s
+          AND t.date_id = %s
+        """
+
 class CoachRequest(BaseModel):
     external_user_key: str
     question: str
 
-@router.post("/coach")
-def coach(req: CoachRequest):
-    # fetch today's user snapshot
-    snap = fetch_all(
-        """
-        SELECT *
-        FROM user_daily_targets t
-        JOIN users u ON u.user_id = t.user_id
-        WHERE u.external_user_key = %s
-          AND t.date_id = CURRENT_DATE()
-        """,
-        (req.external_user_key,),
-    )
-    if not snap:
-        return {"error": "no_snapshot_for_today"}
-    snapshot = snap[0]
+class StageTimings:
+    """Wall-clock milliseconds per /coach stage, for the response and the log."""
 
-    # fetch menu items for user's preferred halls (today)
-    menus = fetch_all(
-        """
-        SELECT d.hall_name, m.item_name, m.kcal, m.protein_g, m.carb_g, m.fat_g
-        FROM menu_items m
-        JOIN dining_halls d ON m.dining_hall_id = d.dining_hall_id
-        JOIN users u ON u.user_id = %s
-        WHERE m.date_id = CURRENT_DATE()
-        """,
-        (snapshot["USER_ID"],),
-    )
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.ms = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.ms[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    def done(self) -> dict:
+        self.ms["total"] = round((time.perf_counter() - self.started) * 1000, 1)
+        print("Coach timings (ms): " + ", ".join(f"{k}={v}" for k, v in self.ms.items()))
+        return self.ms
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, so the stages show up in browser dev tools."""
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.ms.items())
+
+def _enhance_menus(menus: list[dict]) -> list[dict]:
+    image_service = get_ready_food_image_service()
+    if not image_service:
+        return [dict(menu) for menu in menus]
+
+    # One batch lookup: each distinct item name is matched once.
+    names = [menu.get('ITEM_NAME') for menu in menus if menu.get('ITEM_NAME')]
+    images = image_service.get_multiple_images(names)
 
-    # Enhance menus with image information
-    image_service = get_food_image_service()
     enhanced_menus = []
-    
     for menu in menus:
         menu_dict = dict(menu)
         food_name = menu_dict.get('ITEM_NAME')
         if food_name:
-            image_info = image_service.get_food_image(food_name)
+            image_info = images.get(food_name)
             menu_dict['has_image'] = image_info is not None
             if image_info:
                 menu_dict['matched_food_name'] = image_info.get('matched_name')
         enhanced_menus.append(menu_dict)
+    return enhanced_menus
+
+def _hall_codes(value) -> list[str]:
+    """preferred_halls as a list of hall codes (a JSON string from the driver)."""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            value = value.split(",")
+    return [str(v).strip().upper() for v in value or [] if str(v).strip()]
 
-    # generate Gemini response
+async def _load_coach_inputs(req: CoachRequest, timings: StageTimings):
+    """Today's snapshot and image-enhanced menu, or (None, None) without a snapshot."""
+    # "Today" is the server's date everywhere (log rows, caches, menus), not the database session's.
+    today = date.today().isoformat()
+
+    async def query():
+        rows = await fetch_all_async(SNAPSHOT_SQL, (req.external_user_key, today))
+        return rows[0] if rows else None
+
+    # The snapshot query and the (usually in-memory) menu don't depend on each other.
+    with timings.stage("db"):
+        (snapshot, pending), menu = await asyncio.gather(read_with_pending(query, today), menu_service.get())
+    if not snapshot:
+        return None, None
+    # Meals/workouts that are journaled but not flushed yet, as on the dashboard.
+    if pending and any(pending.values()):
+        snapshot = merge_pending(snapshot, pending)
+    # Only the user's preferred halls (all halls if they picked none).
+    menus = menu.rows_for_halls(_hall_codes(snapshot.get("PREFERRED_HALLS")))
+
+    # Enhance menus with image information (CPU-bound, keep it off the event loop)
+    with timings.stage("images"):
+        enhanced_menus = await run_in_threadpool(_enhance_menus, menus)
+    return snapshot, enhanced_menus
+
+@router.post("/coach")
+async def coach(req: CoachRequest, response: Response):
+    timings = StageTimings()
+    snapshot, enhanced_menus = await _load_coach_inputs(req, timings)
+    if snapshot is None:
+        return {"error": "no_snapshot_for_today"}
+
+    # generate Gemini response (cached per user profile + menu + meal type)
     try:
-        answer = ask_umunch(snapshot, enhanced_menus, req.question)
-        return {
-            "answer": answer,
-            "menu_items": enhanced_menus  # Include enhanced menu data for frontend
-        }
+        with timings.stage("llm"):
+            answer, source = await cached_recommendation(ask_umunch_async, snapshot, enhanced_menus, req.question)
     except Exception as e:
-        return {"error": str(e)}
+        # No LLM answer and nothing cached: fall back to the local ranking.
+        print(f"Coach LLM unavailable ({type(e).__name__}: {e}), answering from the ranking")
+        with timings.stage("rank"):
+            answer, source = ranked_answer(snapshot, rank_menu(snapshot, enhanced_menus, k=5)), "ranked"
+
+    timings_ms = timings.done()
+    response.headers["Server-Timing"] = timings.server_timing()
+    return {
+        "answer": answer,
+        "answer_source": source,  # "llm", "cache", "stale" after an LLM failure, or "ranked"
+        "menu_items": enhanced_menus,  # Include enhanced menu data for frontend
+        "timings_ms": timings_ms,
+    }
+
+@router.post("/coach/ranked")
+async def coach_ranked(req: CoachRequest, response: Response, k: int = 5):
+    """
+    Instant, deterministic recommendations from the local macro-fit ranking
+    (services/meal_ranking.py), without calling the LLM.
+    """
+    timings = StageTimings()
+    snapshot, enhanced_menus = await _load_coach_inputs(req, timings)
+    if snapshot is None:
+        return {"error": "no_snapshot_for_today"}
+    k = max(1, min(k, 20))
+    with timings.stage("rank"):
+        ranked = rank_menu(snapshot, enhanced_menus, k=k)
+    timings_ms = timings.done()
+    response.headers["Server-Timing"] = timings.server_timing()
+    return {
+        "answer": ranked_answer(snapshot, ranked, per_hall=k),
+        "answer_source": "ranked",
+        "ranked_items": ranked,
+        "timings_ms": timings_ms,
+    }
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@router.post("/coach/stream")
+async def coach_stream(req: CoachRequest):
+    """
+    Same inputs as /coach, answered as Server-Sent Events:
+    `menu` (the enhanced menu items), one `hall` event per dining hall as soon
+    as Gemini finishes that hall's recommendations, then `done` (or `error`).
+    `done` carries the per-stage timings.
+    """
+    timings = StageTimings()
+    snapshot, enhanced_menus = await _load_coach_inputs(req, timings)
+    if snapshot is None:
+        return {"error": "no_snapshot_for_today"}
+
+    key = fingerprint(snapshot, enhanced_menus, req.question)
+
+    async def events():
+        yield _sse("menu", {"menu_items": enhanced_menus})
+        cached = recommendation_cache.get(key)
+        if cached is not None:
+            for hall, items in cached.get("recommendations", {}).items():
+                yield _sse("hall", {"hall": hall, "recommendations": items})
+            yield _sse("done", {"answer_source": "cache", "timings_ms": timings.done()})
+            return
+
+        halls = {}
+        llm_start = time.perf_counter()
+        try:
+            async for hall, items in stream_umunch_async(snapshot, enhanced_menus, req.question):
+                if not halls:
+                    timings.ms["llm_first_hall"] = round((time.perf_counter() - llm_start) * 1000, 1)
+                halls[hall] = items
+                yield _sse("hall", {"hall": hall, "recommendations": items})
+        except Exception as e:
+            yield _sse("error", {"error": str(e) or type(e).__name__})
+            return
+        timings.ms["llm"] = round((time.perf_counter() - llm_start) * 1000, 1)
+        # stream_umunch_async raised above unless the JSON closed cleanly; an
+        # empty answer is not worth serving again either.
+        if halls:
+            recommendation_cache.set(key, {"recommendations": halls})
+        yield _sse("done", {"answer_source": "llm", "timings_ms": timings.done()})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Only the stages done before streaming starts; `done` has the rest.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Server-Timing": timings.server_timing()},
+    )
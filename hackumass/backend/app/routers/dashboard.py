@@ -1,15 +1,16 @@
-from fastapi import APIRouter, Query
-from ..db import fetch_all
+from datetime import date, timedelta
+from typing import Optional
+from fastapi import APIRouter, Header, Query, Response
+from ..db import fetch_all_async
+from ..services.dashboard_cache import dashboard_cache, etag_matches, merge_pending
+from ..services.reference_data import get_user_id
+from ..services.write_queue import read_with_pending
 
 router = APIRouter()
 
-@router.get("/dashboard/today")
-def get_today_dashboard(external_user_key: str = Query(...)):
-    """
-    Returns today's snapshot of calories, macros, and workouts for a given user.
-    """
-    rows = fetch_all(
-        """
+# One row: the user's targets and today's rollup from user_daily_totals
+# (kept current by the log writes, see services/daily_totals.py).
+DASHBOARD_SQL = """
         SELECT
             u.user_id,
             u.external_user_key,
@@ -22,31 +23,187 @@ def get_today_dashboard(external_user_key: str = Query(...)):
             t.protein_target_g,
             t.carb_target_g,
             t.fat_target_g,
-            COALESCE(f.consumed_kcal, 0) AS consumed_kcal,
-            COALESCE(f.consumed_protein_g, 0) AS consumed_protein_g,
-            COALESCE(f.consumed_carb_g, 0) AS consumed_carb_g,
-            COALESCE(f.consumed_fat_g, 0) AS consumed_fat_g,
-            COALESCE(w.kcal_burned_total, 0) AS workout_kcal_burned,
-            (COALESCE(f.consumed_kcal, 0) - COALESCE(w.kcal_burned_total, 0)) AS net_kcal,
-            t.kcal_target - COALESCE(f.consumed_kcal, 0) AS remaining_kcal
+            COALESCE(d.consumed_kcal, 0) AS consumed_kcal,
+            COALESCE(d.consumed_protein_g, 0) AS consumed_protein_g,
+            COALESCE(d.consumed_carb_g, 0) AS consumed_carb_g,
+            COALESCE(d.consumed_fat_g, 0) AS consumed_fat_g,
+            COALESCE(d.kcal_burned, 0) AS workout_kcal_burned,
+            (COALESCE(d.consumed_kcal, 0) - COALESCE(d.kcal_burned, 0)) AS net_kcal,
+            t.kcal_target - COALESCE(d.consumed_kcal, 0) AS remaining_kcal
         FROM user_daily_targets t
         JOIN users u ON u.user_id = t.user_id
-        LEFT JOIN (
-            SELECT user_id, date_id,
-                   SUM(kcal_total) AS consumed_kcal,
-                   SUM(protein_total_g) AS consumed_protein_g,
-                   SUM(carb_total_g) AS consumed_carb_g,
-                   SUM(fat_total_g) AS consumed_fat_g
-            FROM food_logs
-            GROUP BY user_id, date_id
-        ) f ON f.user_id = t.user_id AND f.date_id = t.date_id
-        LEFT JOIN (
-            SELECT user_id, date_id, SUM(kcal_burned) AS kcal_burned_total
-            FROM workout_logs
-            GROUP BY user_id, date_id
-        ) w ON w.user_id = t.user_id AND w.date_id = t.date_id
-        WHERE u.external_user_key = %s AND t.date_id = CURRENT_DATE();
-        """,
-        (external_user_key,),
+        LEFT JOIN user_daily_totals d ON d.user_id = t.user_id AND d.date_id = t.date_id
+        WHERE u.external_user_key = %s AND t.date_id = %s;
+        """
+
+@router.get("/dashboard/today")
+async def get_today_dashboard(
+    response: Response,
+    external_user_key: str = Query(...),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Returns today's snapshot of calories, macros, and workouts for a given user.
+    Cached per user until they log something or change goals; send the ETag
+    back in If-None-Match to get a 304 when nothing changed.
+    """
+    cached = dashboard_cache.get(external_user_key)
+    if cached is not None:
+        snapshot, etag = cached
+    else:
+        version = dashboard_cache.version(external_user_key)
+        # The server's date, as stamped on log rows (not the database session's CURRENT_DATE).
+        today = date.today().isoformat()
+
+        async def query():
+            rows = await fetch_all_async(DASHBOARD_SQL, (external_user_key, today))
+            return rows[0] if rows else None
+
+        # Include meals/workouts that are journaled but not flushed yet.
+        snapshot, pending = await read_with_pending(query, today)
+        if snapshot and pending and any(pending.values()):
+            snapshot = merge_pending(snapshot, pending)
+        etag = dashboard_cache.set(external_user_key, snapshot, version)
+
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return {"snapshot": snapshot}
+
+
+# Every day in the window that has a target or any logs, in one pass over the
+# (user_id, date_id) keys of the two daily tables.
+RANGE_SQL = """
+        SELECT
+            d.date_id AS day,
+            t.kcal_target,
+            t.protein_target_g,
+            t.carb_target_g,
+            t.fat_target_g,
+            COALESCE(x.consumed_kcal, 0) AS consumed_kcal,
+            COALESCE(x.consumed_protein_g, 0) AS consumed_protein_g,
+            COALESCE(x.consumed_carb_g, 0) AS consumed_carb_g,
+            COALESCE(x.consumed_fat_g, 0) AS consumed_fat_g,
+            COALESCE(x.kcal_burned, 0) AS workout_kcal_burned,
+            COALESCE(x.meals_logged, 0) AS meals_logged,
+            COALESCE(x.workouts_logged, 0) AS workouts_logged
+        FROM (
+            SELECT date_id FROM user_daily_targets WHERE user_id = %s AND date_id BETWEEN %s AND %s
+            UNION
+            SELECT date_id FROM user_daily_totals WHERE user_id = %s AND date_id BETWEEN %s AND %s
+        ) d
+        LEFT JOIN user_daily_targets t ON t.user_id = %s AND t.date_id = d.date_id
+        LEFT JOIN user_daily_totals x ON x.user_id = %s AND x.date_id = d.date_id
+        ORDER BY d.date_id
+        """
+
+# A logged day is "on target" when consumed kcal is within this share of the target.
+ADHERENCE_TOLERANCE = 0.10
+MAX_PAGE_DAYS = 92
+
+
+def _day_row(day: date, row: Optional[dict]) -> dict:
+    """One calendar day with derived net/remaining kcal; zeros when nothing was logged."""
+    row = dict(row or {})
+    row["DAY"] = day.isoformat()
+    for column in ("CONSUMED_KCAL", "CONSUMED_PROTEIN_G", "CONSUMED_CARB_G", "CONSUMED_FAT_G",
+                   "WORKOUT_KCAL_BURNED", "MEALS_LOGGED", "WORKOUTS_LOGGED"):
+        row[column] = float(row.get(column) or 0)
+    for column in ("KCAL_TARGET", "PROTEIN_TARGET_G", "CARB_TARGET_G", "FAT_TARGET_G"):
+        row[column] = float(row[column]) if row.get(column) is not None else None
+    row["NET_KCAL"] = row["CONSUMED_KCAL"] - row["WORKOUT_KCAL_BURNED"]
+    target = row["KCAL_TARGET"]
+    row["REMAINING_KCAL"] = target - row["CONSUMED_KCAL"] if target is not None else None
+    row["ON_TARGET"] = (
+        abs(row["CONSUMED_KCAL"] - target) <= ADHERENCE_TOLERANCE * target
+        if target and row["MEALS_LOGGED"] else None
     )
-    return {"snapshot": rows[0] if rows else None}
+    return row
+
+
+def weekly_summary(days: list) -> list:
+    """Per ISO week (Monday start): averages over logged days and kcal adherence %."""
+    weeks = {}
+    for row in days:
+        day = date.fromisoformat(row["DAY"])
+        weeks.setdefault(day - timedelta(days=day.weekday()), []).append(row)
+
+    summary = []
+    for week_start, rows in weeks.items():
+        logged = [r for r in rows if r["MEALS_LOGGED"]]
+        judged = [r for r in logged if r["ON_TARGET"] is not None]
+
+        def avg(column, rows=logged):
+            return round(sum(r[column] for r in rows) / len(rows), 1) if rows else None
+
+        summary.append({
+            "week_start": week_start.isoformat(),
+            "days": len(rows),
+            "days_logged": len(logged),
+            "workouts": int(sum(r["WORKOUTS_LOGGED"] for r in rows)),
+            "avg_consumed_kcal": avg("CONSUMED_KCAL"),
+            "avg_protein_g": avg("CONSUMED_PROTEIN_G"),
+            "avg_carb_g": avg("CONSUMED_CARB_G"),
+            "avg_fat_g": avg("CONSUMED_FAT_G"),
+            "avg_kcal_burned": avg("WORKOUT_KCAL_BURNED", rows),
+            "avg_net_kcal": avg("NET_KCAL"),
+            "avg_kcal_target": avg("KCAL_TARGET", [r for r in rows if r["KCAL_TARGET"] is not None]),
+            "adherence_pct": round(100 * sum(r["ON_TARGET"] for r in judged) / len(judged), 1) if judged else None,
+        })
+    return summary
+
+
+@router.get("/dashboard/range")
+async def get_dashboard_range(
+    external_user_key: str = Query(...),
+    start: date = Query(...),
+    end: Optional[date] = Query(None),
+    cursor: Optional[date] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(28, ge=7, le=MAX_PAGE_DAYS, description="max days per page"),
+):
+    """
+    Per-day targets, consumed/burned totals and net kcal for [start, end]
+    (default end: today), plus weekly aggregates, one page of at most `limit`
+    days at a time. Pages end on a Sunday so no week is split across pages;
+    pass `next_cursor` back as `cursor` for the next one.
+    """
+    end = end or date.today()
+    page_start = max(cursor or start, start)
+    if page_start > end:
+        return {"error": "start_after_end"}
+
+    page_end = page_start + timedelta(days=limit - 1)
+    page_end -= timedelta(days=(page_end.weekday() + 1) % 7)  # back to Sunday
+    page_end = min(page_end, end)
+
+    user_id = await get_user_id(external_user_key)
+    if not user_id:
+        return {"error": "user_not_found"}
+
+    async def query():
+        first, last = page_start.isoformat(), page_end.isoformat()
+        rows = await fetch_all_async(RANGE_SQL, (user_id, first, last, user_id, first, last, user_id, user_id))
+        return {"USER_ID": user_id, "rows": rows}
+
+    # Today's unflushed meals/workouts, as /dashboard/today shows them.
+    result, pending = await read_with_pending(query)
+    by_day = {str(row["DAY"])[:10]: row for row in result["rows"]}
+    today = date.today().isoformat()
+    if pending and any(pending.values()) and page_start.isoformat() <= today <= page_end.isoformat():
+        row = merge_pending(by_day.get(today) or {}, pending)
+        row["MEALS_LOGGED"] = float(row.get("MEALS_LOGGED") or 0) + pending["meals"]
+        row["WORKOUTS_LOGGED"] = float(row.get("WORKOUTS_LOGGED") or 0) + pending["workouts"]
+        by_day[today] = row
+
+    days = [
+        _day_row(page_start + timedelta(days=i), by_day.get((page_start + timedelta(days=i)).isoformat()))
+        for i in range((page_end - page_start).days + 1)
+    ]
+    return {
+        "start": page_start.isoformat(),
+        "end": page_end.isoformat(),
+        "days": days,
+        "weeks": weekly_summary(days),
+        "next_cursor": (page_end + timedelta(days=1)).isoformat() if page_end < end else None,
+    }
@@ -2,8 +2,11 @@ from fastapi import APIRouter, Query
 from fastapi.responses import Response
 from pydantic import BaseModel
 from typing import Optional
-from ..db import fetch_one, fetch_all, execute
-from ..food_image_service import get_food_image_service
+from ..food_image_service import get_ready_food_image_service
+from ..services.reference_data import get_user_id, get_dining_hall_id, get_meal_type_id
+from ..services import write_queue
+from ..services.dashboard_cache import dashboard_cache
+from ..services.menu_service import menu_service, page_after
 
 router = APIRouter()
 
@@ -17,136 +20,85 @@ class MealLog(BaseModel):
     fat_total_g: float
 
 @router.post("/meals")
-def log_meal(meal: MealLog):
-    user = fetch_one(
-        "SELECT user_id FROM users WHERE external_user_key = %s",
-        (meal.external_user_key,),
-    )
-    if not user:
+async def log_meal(meal: MealLog):
+    user_id = await get_user_id(meal.external_user_key)
+    if not user_id:
         return {"error": "user_not_found"}
 
-    dh = fetch_one(
-        "SELECT dining_hall_id FROM dining_halls WHERE hall_code = %s",
-        (meal.dining_hall_code.upper(),),
-    )
-    mt = fetch_one(
-        "SELECT meal_type_id FROM meal_types WHERE meal_type_code = %s",
-        (meal.meal_type_code.upper(),),
-    )
+    dining_hall_id = await get_dining_hall_id(meal.dining_hall_code)
+    meal_type_id = await get_meal_type_id(meal.meal_type_code)
 
-    if not dh or not mt:
+    if not dining_hall_id or not meal_type_id:
         return {"error": "invalid_hall_or_meal_type"}
 
-    execute(
-        """
-        INSERT INTO food_logs (
-            user_id, date_id, meal_type_id, dining_hall_id,
-            kcal_total, protein_total_g, carb_total_g, fat_total_g,
-            logged_mode
-        )
-        VALUES (%s, CURRENT_DATE(), %s, %s, %s, %s, %s, %s, 'MANUAL')
-        """,
-        (
-            user["USER_ID"],
-            mt["MEAL_TYPE_ID"],
-            dh["DINING_HALL_ID"],
-            meal.kcal_total,
-            meal.protein_total_g,
-            meal.carb_total_g,
-            meal.fat_total_g,
-        ),
-    )
+    row = {
+        "user_id": user_id,
+        "meal_type_id": meal_type_id,
+        "dining_hall_id": dining_hall_id,
+        "kcal_total": meal.kcal_total,
+        "protein_total_g": meal.protein_total_g,
+        "carb_total_g": meal.carb_total_g,
+        "fat_total_g": meal.fat_total_g,
+    }
+    # Journaled and flushed to food_logs in batches (see services/write_queue.py)
+    since = dashboard_cache.begin_write(meal.external_user_key)
+    await write_queue.submit("food_logs", row)
+    dashboard_cache.apply_log(meal.external_user_key, "food_logs", row, since)
 
     return {"status": "ok"}
 
 
+MAX_MENU_PAGE = 200
+
+
 @router.get("/meals/menu")
-def get_menu_with_images(
+async def get_menu_with_images(
     dining_hall_code: Optional[str] = Query(None),
-    meal_type_code: Optional[str] = Query(None)
+    meal_type_code: Optional[str] = Query(None),
+    category: Optional[str] = Query(None),
+    kcal_min: Optional[float] = Query(None),
+    kcal_max: Optional[float] = Query(None),
+    protein_min: Optional[float] = Query(None),
+    protein_max: Optional[float] = Query(None),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=MAX_MENU_PAGE),
 ):
     """
-    Get menu items with images from Hugging Face dataset.
-    Optionally filter by dining hall and meal type.
-    """
-    # Query the nov_12_2025 table with correct fully qualified name
-    query = """
-        SELECT 
-            FOOD_ID,
-            NAME,
-            MEAL,
-            LOCATION,
-            CATEGORY,
-            CALORIES,
-            PROTEIN,
-            CARBS,
-            FAT
-        FROM umunch_db.dining_data.nov_12_2025
+    One page of today's menu, optionally filtered by dining hall, meal type,
+    category and kcal/protein ranges. Served from the in-memory menu
+    (services/menu_service.py).
+
+    Items are ordered by menu_item_id and paged by keyset: pass `next_cursor`
+    back as `cursor` until it is null. `total` counts all items matching the
+    filters.
     """
-    
-    params = []
-    
-    if dining_hall_code:
-        # Map hall codes to location names (matching your data)
-        hall_location_map = {
-            'BERKSHIRE': 'Berkshire',
-            'WORCESTER': 'Worcester',
-            'FRANKLIN': 'Frank',
-            'HAMPSHIRE': 'Hampshire'
-        }
-        location_name = hall_location_map.get(dining_hall_code.upper())
-        if location_name:
-            query += " WHERE LOCATION = %s"
-            params.append(location_name)
-    
-    if meal_type_code:
-        # Add meal type filter (breakfast, lunch, dinner)
-        if 'WHERE' in query:
-            query += " AND MEAL = %s"
-        else:
-            query += " WHERE MEAL = %s"
-        params.append(meal_type_code.lower())
-    
-    # Limit results to 10 items for faster response
-    query += " LIMIT 10"
-    
-    menu_items = fetch_all(query, tuple(params) if params else None)
-    
-    if not menu_items:
-        return {"menu_items": []}
-    
-    # Map location back to hall code
-    location_to_code = {
-        'Berkshire': 'BERKSHIRE',
-        'Worcester': 'WORCESTER',
-        'Frank': 'FRANKLIN',
-        'Hampshire': 'HAMPSHIRE'
+    if dining_hall_code and not await get_dining_hall_id(dining_hall_code):
+        return {"error": "invalid_dining_hall"}
+    after = None
+    if cursor:
+        try:
+            after = int(cursor)
+        except ValueError:
+            return {"error": "invalid_cursor"}
+
+    menu = await menu_service.get()
+    items = menu.select(dining_hall_code, meal_type_code)
+    if category:
+        category = category.lower()
+        items = [i for i in items if (i["category"] or "").lower() == category]
+    for key, low, high in (("kcal", kcal_min, kcal_max), ("protein_g", protein_min, protein_max)):
+        if low is not None:
+            items = [i for i in items if i[key] is not None and i[key] >= low]
+        if high is not None:
+            items = [i for i in items if i[key] is not None and i[key] <= high]
+
+    page, next_cursor = page_after(items, after, limit)
+    return {
+        # Return menu items without image lookups (fetch images separately if needed)
+        "menu_items": page,
+        "total": len(items),
+        "next_cursor": str(next_cursor) if next_cursor is not None else None,
     }
-    
-    # Return menu items without image lookups (fetch images separately if needed)
-    enhanced_items = []
-    for item in menu_items:
-        food_name = item.get('NAME')
-        location = item.get('LOCATION')
-        meal_type = item.get('MEAL')
-        
-        enhanced_item = {
-            "menu_item_id": item.get('FOOD_ID'),
-            "name": food_name,
-            "kcal": item.get('CALORIES'),
-            "protein_g": item.get('PROTEIN'),
-            "carb_g": item.get('CARBS'),
-            "fat_g": item.get('FAT'),
-            "hall_name": f"{location} Dining Commons" if location else "Unknown",
-            "hall_code": location_to_code.get(location, 'UNKNOWN'),
-            "meal_type_name": meal_type.capitalize() if meal_type else None,
-            "meal_type_code": meal_type.upper() if meal_type else None,
-            "category": item.get('CATEGORY'),
-        }
-        
-        enhanced_items.append(enhanced_item)
-    
-    return {"menu_items": enhanced_items}
 
 
 @router.get("/meals/image/{food_name}")
@@ -155,7 +107,14 @@ def get_food_image_endpoint(food_name: str):
     Get image URL for a specific food item by name.
     Returns image URL from the MM-Food-100K dataset.
     """
-    image_service = get_food_image_service()
+    image_service = get_ready_food_image_service()
+    if image_service is None:
+        return {
+            "error": "Image service warming up",
+            "food_name": food_name,
+            "has_image": False,
+            "warming_up": True,
+        }
     image_info = image_service.get_food_image(food_name)
     
     if not image_info or not image_info.get('image_url'):
@@ -183,11 +142,14 @@ def get_food_images_batch(food_names: list[str]):
     Get image URLs for multiple food items at once.
     Much faster than calling /meals/image/{food_name} multiple times.
     """
-    image_service = get_food_image_service()
+    image_service = get_ready_food_image_service()
+    # While warming up every name degrades to "no image" instead of waiting.
+    # Repeated names are matched once; results keep the input order.
+    matches = image_service.get_multiple_images(food_names) if image_service else {}
     results = {}
     
     for food_name in food_names:
-        image_info = image_service.get_food_image(food_name)
+        image_info = matches.get(food_name)
         if image_info and image_info.get('image_url'):
             results[food_name] = {
                 "has_image": True,
@@ -202,4 +164,3 @@ def get_food_images_batch(food_names: list[str]):
             }
     
     return results
-
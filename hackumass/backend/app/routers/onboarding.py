@@ -1,9 +1,66 @@
+from datetime import date
 from fastapi import APIRouter
 from pydantic import BaseModel
-from ..db import fetch_one, execute
+from ..db import fetch_one_async, execute_async, execute_transaction_async
+from ..services.dashboard_cache import dashboard_cache
+from ..services.reference_data import user_keys
+from ..services.targets import compute_targets
 
 router = APIRouter()
 
+
+def _json_list(values: list[str]) -> str:
+    return str(values).replace("'", '"')
+
+def _diet_type(dietary_restrictions: list[str]) -> str:
+    return dietary_restrictions[0].upper() if dietary_restrictions else "NONE"
+
+def _goal_type(goals: list[str]) -> str:
+    if "loseWeight" in goals:
+        return "CUT"
+    if "gainMuscle" in goals:
+        return "BULK"
+    return "MAINTAIN"
+
+
+# Upsert the targets for (date_id, user with external_user_key = the last param).
+TODAY_TARGETS_SQL = """
+    MERGE INTO user_daily_targets t
+    USING (SELECT user_id, %s AS date_id,
+                  %s AS kcal_target, %s AS protein_target_g, %s AS carb_target_g, %s AS fat_target_g,
+                  %s AS goal_type, %s AS activity_level, %s AS weight_lbs_snapshot, %s AS height_in_snapshot
+           FROM users WHERE external_user_key = %s) s
+    ON t.user_id = s.user_id AND t.date_id = s.date_id
+    WHEN MATCHED THEN UPDATE SET
+        kcal_target = s.kcal_target,
+        protein_target_g = s.protein_target_g,
+        carb_target_g = s.carb_target_g,
+        fat_target_g = s.fat_target_g,
+        goal_type = s.goal_type,
+        activity_level = COALESCE(t.activity_level, s.activity_level),
+        weight_lbs_snapshot = s.weight_lbs_snapshot,
+        height_in_snapshot = s.height_in_snapshot,
+        target_source = 'AUTO_CALC'
+    WHEN NOT MATCHED THEN INSERT (
+        user_id, date_id, kcal_target, protein_target_g, carb_target_g, fat_target_g,
+        goal_type, activity_level, weight_lbs_snapshot, height_in_snapshot, target_source
+    ) VALUES (
+        s.user_id, s.date_id, s.kcal_target, s.protein_target_g, s.carb_target_g, s.fat_target_g,
+        s.goal_type, s.activity_level, s.weight_lbs_snapshot, s.height_in_snapshot, 'AUTO_CALC'
+    )
+"""
+
+def _today_targets(external_user_key, weight_lbs, height_in, gender_identity, activity_level, goal_type):
+    """Compute one user's targets; returns (targets dict, (query, params) upserting today's row)."""
+    computed = compute_targets([weight_lbs], [height_in], [gender_identity], [activity_level], [goal_type])
+    targets = {k: round(float(computed[k][0]), 1) for k in ("kcal", "protein_g", "carb_g", "fat_g")}
+    # The server's date, the same "today" the log rows and dashboard use.
+    params = (
+        date.today().isoformat(), targets["kcal"], targets["protein_g"], targets["carb_g"], targets["fat_g"],
+        goal_type, activity_level, weight_lbs, height_in, external_user_key,
+    )
+    return targets, (TODAY_TARGETS_SQL, params)
+
 # 1) User info (DOB, height, weight, gender)
 class UserInfo(BaseModel):
     external_user_key: str  # e.g. email or auth id
@@ -14,15 +71,16 @@ class UserInfo(BaseModel):
     gender_identity: str
 
 @router.post("/onboarding/user-info")
-def save_user_info(info: UserInfo):
+async def save_user_info(info: UserInfo):
     height_in = info.height_feet * 12 + info.height_inches
 
-    existing = fetch_one(
+    existing = await fetch_one_async(
         "SELECT user_id FROM users WHERE external_user_key = %s",
         (info.external_user_key,),
     )
     if existing:
-        execute(
+        user_keys.remember(info.external_user_key, existing["USER_ID"])
+        await execute_async(
             """
             UPDATE users
             SET height_in = %s,
@@ -34,7 +92,7 @@ def save_user_info(info: UserInfo):
             (height_in, info.weight_lbs, info.gender_identity, info.external_user_key),
         )
     else:
-        execute(
+        await execute_async(
             """
             INSERT INTO users (external_user_key, height_in, weight_lbs, gender_identity, age_years)
             VALUES (%s, %s, %s, %s, 22)
@@ -42,6 +100,8 @@ def save_user_info(info: UserInfo):
             (info.external_user_key, height_in, info.weight_lbs, info.gender_identity),
         )
 
+    # The dashboard shows age and gender.
+    dashboard_cache.invalidate(info.external_user_key)
     return {"status": "ok"}
 
 
@@ -52,16 +112,15 @@ class DietInfo(BaseModel):
     allergies: list[str]
 
 @router.post("/onboarding/diet")
-def save_diet(info: DietInfo):
-    diet_type = info.dietary_restrictions[0].upper() if info.dietary_restrictions else "NONE"
-    execute(
+async def save_diet(info: DietInfo):
+    await execute_async(
         """
         UPDATE users
         SET diet_type = %s,
             allergies = PARSE_JSON(%s)
         WHERE external_user_key = %s
         """,
-        (diet_type, str(info.allergies).replace("'", '"'), info.external_user_key),
+        (_diet_type(info.dietary_restrictions), _json_list(info.allergies), info.external_user_key),
     )
     return {"status": "ok"}
 
@@ -72,106 +131,31 @@ class GoalsInfo(BaseModel):
     goals: list[str]       # e.g. ['loseWeight','gainMuscle']
 
 @router.post("/onboarding/goals")
-def save_goals(info: GoalsInfo):
-    if "loseWeight" in info.goals:
-        goal_type = "CUT"
-    elif "gainMuscle" in info.goals:
-        goal_type = "BULK"
-    else:
-        goal_type = "MAINTAIN"
+async def save_goals(info: GoalsInfo):
+    goal_type = _goal_type(info.goals)
 
-    user = fetch_one(
-        "SELECT user_id, weight_lbs, height_in, activity_level FROM users WHERE external_user_key = %s",
+    user = await fetch_one_async(
+        """
+        SELECT user_id, weight_lbs, height_in, gender_identity, activity_level
+        FROM users WHERE external_user_key = %s
+        """,
         (info.external_user_key,),
     )
     if not user:
         return {"error": "user_not_found"}
+    user_keys.remember(info.external_user_key, user["USER_ID"])
 
-    # Calculate BMR using Mifflin-St Jeor Formula
-    weight_kg = user["WEIGHT_LBS"] * 0.453592
-    height_cm = user["HEIGHT_IN"] * 2.54
-    
-    # Get gender for BMR calculation
-    gender = fetch_one(
-        "SELECT gender_identity FROM users WHERE user_id = %s",
-        (user["USER_ID"],)
-    )["GENDER_IDENTITY"]
-    
-    # BMR Formula
-    if gender.upper() == "MALE":
-        bmr = (10 * weight_kg) + (6.25 * height_cm) - (5 * 20) + 5  # Assuming age 20 for now
-    else:
-        bmr = (10 * weight_kg) + (6.25 * height_cm) - (5 * 20) - 161
-    
-    # Activity level multipliers
-    activity_multipliers = {
-        "NOT_VERY_ACTIVE": 1.2,  # Sedentary
-        "LIGHTLY_ACTIVE": 1.375, # Light exercise
-        "ACTIVE": 1.55,          # Moderate exercise
-        "VERY_ACTIVE": 1.725     # Heavy exercise
-    }
-    
-    # Calculate TDEE (Total Daily Energy Expenditure)
-    activity_multiplier = activity_multipliers.get(user["ACTIVITY_LEVEL"], 1.2)
-    tdee = bmr * activity_multiplier
-    
-    # Adjust calories based on goal
-    if goal_type == "CUT":
-        kcal_target = tdee - 500  # 500 calorie deficit for weight loss
-    elif goal_type == "BULK":
-        kcal_target = tdee + 300  # 300 calorie surplus for muscle gain
-    else:
-        kcal_target = tdee       # Maintain weight
-        
-    # Calculate macro targets
-    protein_target = weight_kg * 2.0  # 2g protein per kg body weight
-    fat_target = (kcal_target * 0.25) / 9  # 25% of calories from fat
-    remaining_calories = kcal_target - (protein_target * 4) - (fat_target * 9)
-    carb_target = remaining_calories / 4  # Rest from carbs
-
-    execute(
-        """
-        UPDATE users
-        SET goal_type = %s
-        WHERE user_id = %s
-        """,
-        (goal_type, user["USER_ID"]),
-    )
-
-    execute(
-        """
-        MERGE INTO user_daily_targets t
-        USING (SELECT %s AS user_id, CURRENT_DATE() AS date_id) s
-        ON t.user_id = s.user_id AND t.date_id = s.date_id
-        WHEN MATCHED THEN UPDATE SET
-            kcal_target = %s,
-            protein_target_g = %s,
-            carb_target_g = %s,
-            fat_target_g = %s,
-            goal_type = %s,
-            activity_level = COALESCE(t.activity_level, %s),
-            weight_lbs_snapshot = %s,
-            height_in_snapshot = %s,
-            target_source = 'AUTO_CALC'
-        WHEN NOT MATCHED THEN INSERT (
-            user_id, date_id, kcal_target, protein_target_g, carb_target_g, fat_target_g,
-            goal_type, activity_level, weight_lbs_snapshot, height_in_snapshot, target_source
-        ) VALUES (
-            s.user_id, s.date_id, %s, %s, %s, %s,
-            %s, %s, %s, %s, 'AUTO_CALC'
-        );
-        """,
-        (
-            user["USER_ID"],
-            kcal_target, protein_target, carb_target, fat_target,
-            goal_type, user["ACTIVITY_LEVEL"],
-            user["WEIGHT_LBS"], user["HEIGHT_IN"],
-            kcal_target, protein_target, carb_target, fat_target,
-            goal_type, user["ACTIVITY_LEVEL"],
-            user["WEIGHT_LBS"], user["HEIGHT_IN"],
-        ),
+    # Mifflin-St Jeor BMR -> TDEE -> goal-adjusted kcal and macros (same math as the daily rollover)
+    _, targets_statement = _today_targets(
+        info.external_user_key, user["WEIGHT_LBS"], user["HEIGHT_IN"], user["GENDER_IDENTITY"],
+        user["ACTIVITY_LEVEL"], goal_type,
     )
+    await execute_transaction_async([
+        ("UPDATE users SET goal_type = %s WHERE user_id = %s", (goal_type, user["USER_ID"])),
+        targets_statement,
+    ])
 
+    dashboard_cache.invalidate(info.external_user_key)
     return {"status": "ok"}
 
 
@@ -181,8 +165,8 @@ class ActivityInfo(BaseModel):
     activity_level: str   # 'notVeryActive','lightlyActive','active','veryActive'
 
 @router.post("/onboarding/activity")
-def save_activity(info: ActivityInfo):
-    execute(
+async def save_activity(info: ActivityInfo):
+    await execute_async(
         """
         UPDATE users
         SET activity_level = %s
@@ -199,13 +183,72 @@ class HallsInfo(BaseModel):
     preferred_halls: list[str]   # e.g. ['BERKSHIRE','WORCESTER']
 
 @router.post("/onboarding/dining-halls")
-def save_halls(info: HallsInfo):
-    execute(
+async def save_halls(info: HallsInfo):
+    await execute_async(
         """
         UPDATE users
         SET preferred_halls = PARSE_JSON(%s)
         WHERE external_user_key = %s
         """,
-        (str(info.preferred_halls).replace("'", '"'), info.external_user_key),
+        (_json_list(info.preferred_halls), info.external_user_key),
     )
     return {"status": "ok"}
+
+
+# All steps at once: one transaction with two statements (user upsert + today's targets)
+class OnboardingProfile(UserInfo):
+    dietary_restrictions: list[str] = []
+    allergies: list[str] = []
+    goals: list[str] = []
+    activity_level: str
+    preferred_halls: list[str] = []
+
+USER_UPSERT_SQL = """
+    MERGE INTO users t
+    USING (SELECT %s AS external_user_key, %s AS height_in, %s AS weight_lbs, %s AS gender_identity,
+                  22 AS age_years, %s AS diet_type, PARSE_JSON(%s) AS allergies, %s AS goal_type,
+                  %s AS activity_level, PARSE_JSON(%s) AS preferred_halls) s
+    ON t.external_user_key = s.external_user_key
+    WHEN MATCHED THEN UPDATE SET
+        height_in = s.height_in,
+        weight_lbs = s.weight_lbs,
+        gender_identity = s.gender_identity,
+        age_years = s.age_years,
+        diet_type = s.diet_type,
+        allergies = s.allergies,
+        goal_type = s.goal_type,
+        activity_level = s.activity_level,
+        preferred_halls = s.preferred_halls
+    WHEN NOT MATCHED THEN INSERT (
+        external_user_key, height_in, weight_lbs, gender_identity, age_years,
+        diet_type, allergies, goal_type, activity_level, preferred_halls
+    ) VALUES (
+        s.external_user_key, s.height_in, s.weight_lbs, s.gender_identity, s.age_years,
+        s.diet_type, s.allergies, s.goal_type, s.activity_level, s.preferred_halls
+    )
+"""
+
+@router.post("/onboarding/complete")
+async def save_profile(info: OnboardingProfile):
+    height_in = info.height_feet * 12 + info.height_inches
+    goal_type = _goal_type(info.goals)
+    activity_level = info.activity_level.upper()
+
+    # Everything the targets need is in the request, so nothing is read first.
+    targets, targets_statement = _today_targets(
+        info.external_user_key, info.weight_lbs, height_in, info.gender_identity, activity_level, goal_type
+    )
+    await execute_transaction_async([
+        (
+            USER_UPSERT_SQL,
+            (
+                info.external_user_key, height_in, info.weight_lbs, info.gender_identity,
+                _diet_type(info.dietary_restrictions), _json_list(info.allergies), goal_type,
+                activity_level, _json_list(info.preferred_halls),
+            ),
+        ),
+        targets_statement,
+    ])
+
+    dashboard_cache.invalidate(info.external_user_key)
+    return {"status": "ok", "targets": targets}
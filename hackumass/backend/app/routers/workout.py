@@ -1,6 +1,8 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
-from ..db import fetch_one, execute
+from ..services.reference_data import get_user_id, get_workout_type_id
+from ..services import write_queue
+from ..services.dashboard_cache import dashboard_cache
 
 router = APIRouter()
 
@@ -12,37 +14,26 @@ class WorkoutLog(BaseModel):
     kcal_burned: float       # for now, frontend can send this
 
 @router.post("/workouts")
-def log_workout(workout: WorkoutLog):
-    user = fetch_one(
-        "SELECT user_id FROM users WHERE external_user_key = %s",
-        (workout.external_user_key,),
-    )
-    if not user:
+async def log_workout(workout: WorkoutLog):
+    user_id = await get_user_id(workout.external_user_key)
+    if not user_id:
         return {"error": "user_not_found"}
 
-    wt = fetch_one(
-        "SELECT workout_type_id FROM workout_types WHERE workout_code = %s",
-        (workout.workout_type_code.upper(),),
-    )
+    workout_type_id = await get_workout_type_id(workout.workout_type_code)
 
-    if not wt:
+    if not workout_type_id:
         return {"error": "invalid_workout_type"}  # later you can auto-create types
 
-    execute(
-        """
-        INSERT INTO workout_logs (
-            user_id, date_id, workout_type_id,
-            duration_min, intensity, kcal_burned, is_planned
-        )
-        VALUES (%s, CURRENT_DATE(), %s, %s, %s, %s, FALSE)
-        """,
-        (
-            user["USER_ID"],
-            wt["WORKOUT_TYPE_ID"],
-            workout.duration_min,
-            workout.intensity.upper(),
-            workout.kcal_burned,
-        ),
-    )
+    row = {
+        "user_id": user_id,
+        "workout_type_id": workout_type_id,
+        "duration_min": workout.duration_min,
+        "intensity": workout.intensity.upper(),
+        "kcal_burned": workout.kcal_burned,
+    }
+    # Journaled and flushed to workout_logs in batches (see services/write_queue.py)
+    since = dashboard_cache.begin_write(workout.external_user_key)
+    await write_queue.submit("workout_logs", row)
+    dashboard_cache.apply_log(workout.external_user_key, "workout_logs", row, since)
 
     return {"status": "ok"}
@@ -0,0 +1,136 @@
+# app/services/coach_prompt.py
+"""
+Builds the /coach prompt.
+
+The rules Gemini used to apply itself (no allergens, respect the diet, at
+least 100 kcal) are applied here first. Each hall keeps only its best few
+candidates by macro fit (see meal_ranking.py), and those rows go into a
+compact pipe-separated table instead of indented JSON. The table is trimmed
+to fit `coach_prompt_token_budget`.
+
+Allergies or a diet the menu tags can't express (see `unfiltered`) are not
+claimed as handled: the table then keeps its allergen and diet columns and
+the prompt tells Gemini to check those restrictions itself.
+"""
+from typing import Dict, List, Optional, Tuple
+
+from ..config import settings
+from .meal_ranking import MIN_KCAL, MenuMatrix, tags, unfiltered
+
+# Rough Gemini tokenizer ratio for English + numbers; good enough for budgeting.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _num(value) -> str:
+    return "" if value is None else f"{float(value):.0f}"
+
+
+def encode_menu(halls: Dict[str, List[dict]], with_tags: bool = False) -> str:
+    header = "hall|item|category|kcal|protein_g|carb_g|fat_g"
+    lines = [header + "|allergens|diet_tags" if with_tags else header]
+    for hall, rows in halls.items():
+        for row in rows:
+            fields = [
+                hall,
+                str(row.get("ITEM_NAME") or "").replace("|", "/"),
+                str(row.get("CATEGORY") or ""),
+                _num(row.get("KCAL")),
+                _num(row.get("PROTEIN_G")),
+                _num(row.get("CARB_G")),
+                _num(row.get("FAT_G")),
+            ]
+            if with_tags:
+                fields += [",".join(sorted(tags(row.get("ALLERGENS")))), ",".join(sorted(tags(row.get("DIET_TAGS"))))]
+            lines.append("|".join(fields))
+    return "\n".join(lines)
+
+
+def encode_user(user: dict) -> str:
+    fields = [
+        ("diet", user.get("DIET_TYPE")),
+        ("allergies", ",".join(sorted(tags(user.get("ALLERGIES")))) or "none"),
+        ("goal", user.get("GOAL_TYPE")),
+        ("kcal_target", _num(user.get("KCAL_TARGET"))),
+        ("protein_target_g", _num(user.get("PROTEIN_TARGET_G"))),
+        ("carb_target_g", _num(user.get("CARB_TARGET_G"))),
+        ("fat_target_g", _num(user.get("FAT_TARGET_G"))),
+        ("consumed_kcal", _num(user.get("CONSUMED_KCAL"))),
+        ("remaining_kcal", _num(user.get("REMAINING_KCAL"))),
+    ]
+    return "; ".join(f"{k}={v}" for k, v in fields if v not in (None, ""))
+
+
+def menu_table(
+    user: dict,
+    menus: List[dict],
+    per_hall: int,
+    token_budget: int,
+    matrix: Optional[MenuMatrix] = None,
+) -> Tuple[str, dict]:
+    """Filtered, ranked menu table within `token_budget`, plus counts for logging."""
+    matrix = matrix or MenuMatrix(menus)
+    halls = matrix.rank(user, per_hall)
+    # Restrictions the filter couldn't apply: the model needs the tags to apply them.
+    with_tags = bool(unfiltered(user, menus))
+    table = encode_menu(halls, with_tags)
+    # Over budget: drop each hall's worst row in turn until it fits.
+    while estimate_tokens(table) > token_budget and any(len(rows) > 1 for rows in halls.values()):
+        longest = max(len(rows) for rows in halls.values())
+        halls = {hall: rows[:longest - 1] if len(rows) == longest else rows for hall, rows in halls.items()}
+        table = encode_menu(halls, with_tags)
+    stats = {
+        "menu_rows": len(menus),
+        "after_filter": int(matrix.eligible(user).sum()),
+        "in_prompt": sum(len(rows) for rows in halls.values()),
+        "menu_tokens": estimate_tokens(table),
+    }
+    return table, stats
+
+
+def build_prompt(
+    user: dict,
+    menus: List[dict],
+    meal_type: str,
+    per_hall: Optional[int] = None,
+    token_budget: Optional[int] = None,
+    matrix: Optional[MenuMatrix] = None,
+) -> Tuple[str, dict]:
+    """The full coach prompt and its size stats."""
+    per_hall = settings.coach_prompt_per_hall if per_hall is None else per_hall
+    token_budget = settings.coach_prompt_token_budget if token_budget is None else token_budget
+    table, stats = menu_table(user, menus, per_hall, token_budget, matrix)
+
+    missing = unfiltered(user, menus)
+    if missing:
+        unchecked = "; ".join(
+            f"{label} {value if isinstance(value, str) else ', '.join(value)}" for label, value in missing.items()
+        )
+        candidates = (
+            f"Candidate items (at least {MIN_KCAL} kcal, filtered only for the allergies and diets the menu tags cover), one per line.\n"
+            f"WARNING: these were NOT checked against the student's {unchecked}. "
+            "Use the allergens and diet_tags columns and what each dish usually contains to leave out anything that may conflict; "
+            "when unsure, leave it out."
+        )
+    else:
+        candidates = f"Candidate items (already safe for their allergies and diet, at least {MIN_KCAL} kcal), one per line:"
+
+    prompt = f"""You are a nutrition assistant helping a student choose meals.
+
+Student: {encode_user(user)}
+
+{candidates}
+{table}
+
+The student is eating **{(meal_type or "").lower()}**.
+
+For EACH dining hall (Worcester, Franklin, Berkshire, Hampshire), pick up to 5 items from that hall's rows that best keep them near or under their calorie target and toward their macro targets. Use [] for a hall with no rows.
+
+Return VALID JSON **only** in this format:
+{{"recommendations": {{"Worcester": [{{"itemName": "string", "estimatedCalories": number, "reason": "string"}}], "Franklin": [...], "Berkshire": [...], "Hampshire": [...]}}}}
+"""
+    stats["prompt_tokens"] = estimate_tokens(prompt)
+    return prompt, stats
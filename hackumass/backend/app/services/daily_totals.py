@@ -0,0 +1,155 @@
+# app/services/daily_totals.py
+"""
+user_daily_totals: one row per user and day with the consumed kcal/macros,
+kcal burned and log counts, so /dashboard/today is a point lookup instead of
+a GROUP BY over all of food_logs and workout_logs.
+
+The rollup is kept up to date incrementally: every write of food_logs /
+workout_logs rows (the write-queue flush, or the direct insert when the queue
+is off) also MERGEs the per-(user, day) sums of those rows into the rollup,
+in the same transaction. Replaying a journal batch therefore double-counts
+the rollup exactly as much as it duplicates the log rows.
+
+`reconcile()` recomputes rows from the log tables. Use it to backfill
+existing history after creating the table, or to repair drift:
+
+    python -m app.services.daily_totals --create --start 2025-09-01
+"""
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from ..db import execute
+
+DDL = """
+CREATE TABLE IF NOT EXISTS user_daily_totals (
+    user_id NUMBER NOT NULL,
+    date_id DATE NOT NULL,
+    consumed_kcal FLOAT DEFAULT 0,
+    consumed_protein_g FLOAT DEFAULT 0,
+    consumed_carb_g FLOAT DEFAULT 0,
+    consumed_fat_g FLOAT DEFAULT 0,
+    kcal_burned FLOAT DEFAULT 0,
+    meals_logged NUMBER DEFAULT 0,
+    workouts_logged NUMBER DEFAULT 0,
+    PRIMARY KEY (user_id, date_id)
+)
+"""
+
+COLUMNS = [
+    "consumed_kcal", "consumed_protein_g", "consumed_carb_g", "consumed_fat_g",
+    "kcal_burned", "meals_logged", "workouts_logged",
+]
+
+# log table -> rollup column for each log column (None = counts the row)
+ROLLUP_SOURCES = {
+    "food_logs": {
+        "consumed_kcal": "kcal_total",
+        "consumed_protein_g": "protein_total_g",
+        "consumed_carb_g": "carb_total_g",
+        "consumed_fat_g": "fat_total_g",
+        "meals_logged": None,
+    },
+    "workout_logs": {
+        "kcal_burned": "kcal_burned",
+        "workouts_logged": None,
+    },
+}
+
+# (user, day) rows per MERGE source; 9 binds each.
+MAX_ROWS_PER_MERGE = 500
+
+
+def _merge_sql(source: str, set_expr: str) -> str:
+    return f"""
+        MERGE INTO user_daily_totals t
+        USING ({source.strip()}) s
+        ON t.user_id = s.user_id AND t.date_id = s.date_id
+        WHEN MATCHED THEN UPDATE SET
+            {", ".join(f"{c} = {set_expr.format(c=c)}" for c in COLUMNS)}
+        WHEN NOT MATCHED THEN INSERT (user_id, date_id, {", ".join(COLUMNS)})
+        VALUES (s.user_id, s.date_id, {", ".join(f"s.{c}" for c in COLUMNS)})
+        """
+
+
+def sum_rows(rows_by_table: Dict[str, List[dict]]) -> Dict[Tuple[int, str], List[float]]:
+    """Per-(user_id, date_id) sums of log rows, in COLUMNS order."""
+    sums: Dict[Tuple[int, str], List[float]] = {}
+    for table, rows in rows_by_table.items():
+        sources = ROLLUP_SOURCES[table]
+        for row in rows:
+            totals = sums.setdefault((row["user_id"], row["date_id"]), [0.0] * len(COLUMNS))
+            for column, source in sources.items():
+                totals[COLUMNS.index(column)] += 1 if source is None else float(row[source] or 0)
+    return sums
+
+
+def build_increments(rows_by_table: Dict[str, List[dict]]) -> List[tuple]:
+    """MERGE statements adding `rows_by_table` onto the rollup; returns [(query, params)]."""
+    items = list(sum_rows(rows_by_table).items())
+    statements = []
+    for i in range(0, len(items), MAX_ROWS_PER_MERGE):
+        chunk = items[i:i + MAX_ROWS_PER_MERGE]
+        first = "SELECT %s AS user_id, %s AS date_id, " + ", ".join(f"%s AS {c}" for c in COLUMNS)
+        rest = "SELECT " + ", ".join(["%s"] * (len(COLUMNS) + 2))
+        source = " UNION ALL ".join([first] + [rest] * (len(chunk) - 1))
+        params = tuple(v for (user_id, date_id), totals in chunk for v in (user_id, date_id, *totals))
+        statements.append((_merge_sql(source, "t.{c} + s.{c}"), params))
+    return statements
+
+
+RECONCILE_SOURCE = f"""
+    SELECT user_id, date_id, {", ".join(f"SUM({c}) AS {c}" for c in COLUMNS)}
+    FROM (
+        SELECT user_id, date_id,
+               kcal_total AS consumed_kcal, protein_total_g AS consumed_protein_g,
+               carb_total_g AS consumed_carb_g, fat_total_g AS consumed_fat_g,
+               0 AS kcal_burned, 1 AS meals_logged, 0 AS workouts_logged
+        FROM food_logs
+        WHERE date_id BETWEEN %s AND %s
+        UNION ALL
+        SELECT user_id, date_id, 0, 0, 0, 0, kcal_burned, 0, 1
+        FROM workout_logs
+        WHERE date_id BETWEEN %s AND %s
+    ) l
+    GROUP BY user_id, date_id
+"""
+
+RECONCILE_SQL = _merge_sql(RECONCILE_SOURCE, "s.{c}")
+
+
+def reconcile(start: Optional[date] = None, end: Optional[date] = None, days_per_batch: int = 31) -> int:
+    """
+    Recompute rollup rows from the log tables for days in [start, end]
+    (default: all history up to today), `days_per_batch` days per statement.
+    Returns the number of batches run.
+    """
+    end = end or date.today()
+    if start is None:
+        # Full backfill: all history in one statement.
+        execute(RECONCILE_SQL, (date.min.isoformat(), end.isoformat()) * 2)
+        return 1
+    batches = 0
+    while start <= end:
+        batch_end = min(start + timedelta(days=days_per_batch - 1), end)
+        execute(RECONCILE_SQL, (start.isoformat(), batch_end.isoformat()) * 2)
+        batches += 1
+        start = batch_end + timedelta(days=1)
+    return batches
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Backfill or reconcile user_daily_totals from the log tables.")
+    parser.add_argument("--create", action="store_true", help="create the table first if it is missing")
+    parser.add_argument("--start", type=date.fromisoformat, help="first day (default: all history)")
+    parser.add_argument("--end", type=date.fromisoformat, help="last day (default: today)")
+    parser.add_argument("--days-per-batch", type=int, default=31)
+    args = parser.parse_args()
+
+    if args.create:
+        execute(DDL)
+    started = time.perf_counter()
+    batches = reconcile(args.start, args.end, args.days_per_batch)
+    print(f"Reconciled user_daily_totals in {batches} batch(es), {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,167 @@
+# app/services/dashboard_cache.py
+"""
+Per-user cache of the /dashboard/today snapshot.
+
+The app polls the dashboard on every screen focus, but a user's snapshot only
+changes when that user logs a meal or workout or updates their goals. Those
+endpoints call `begin_write` before the write and `apply_log` after it (adds
+the new row onto a cached snapshot), or `invalidate`, so a poll between writes
+is answered from memory. Each snapshot carries an ETag; a poll whose
+If-None-Match still matches gets a 304.
+
+Every write bumps the user's version, and a read that overlaps a write does
+not store its result. A row is only added onto a snapshot built before the
+write began, so it is never counted twice. The cache is per process:
+`dashboard_cache_ttl` bounds how stale a snapshot can get from writes that
+bypass these hooks (other workers, manual SQL).
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+from ..cache import MISSING, TTLCache
+from ..config import settings
+
+
+def merge_pending(snapshot: dict, pending: dict) -> dict:
+    """Add unflushed log totals onto a dashboard row."""
+    snapshot = dict(snapshot)
+    for column, key in (
+        ("CONSUMED_KCAL", "kcal"),
+        ("CONSUMED_PROTEIN_G", "protein_g"),
+        ("CONSUMED_CARB_G", "carb_g"),
+        ("CONSUMED_FAT_G", "fat_g"),
+        ("WORKOUT_KCAL_BURNED", "kcal_burned"),
+    ):
+        snapshot[column] = float(snapshot.get(column) or 0) + pending[key]
+    snapshot["NET_KCAL"] = snapshot["CONSUMED_KCAL"] - snapshot["WORKOUT_KCAL_BURNED"]
+    if snapshot.get("KCAL_TARGET") is not None:
+        snapshot["REMAINING_KCAL"] = float(snapshot["KCAL_TARGET"]) - snapshot["CONSUMED_KCAL"]
+    return snapshot
+
+
+def log_totals(table: str, row: dict) -> dict:
+    """One food_logs / workout_logs row in the shape merge_pending takes."""
+    if table == "food_logs":
+        return {
+            "kcal": float(row["kcal_total"]), "protein_g": float(row["protein_total_g"]),
+            "carb_g": float(row["carb_total_g"]), "fat_g": float(row["fat_total_g"]), "kcal_burned": 0.0,
+        }
+    return {"kcal": 0.0, "protein_g": 0.0, "carb_g": 0.0, "fat_g": 0.0, "kcal_burned": float(row["kcal_burned"])}
+
+
+def make_etag(snapshot: Optional[dict]) -> str:
+    body = json.dumps(snapshot, sort_keys=True, default=str, separators=(",", ":"))
+    return '"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check (weak comparison, lists and `*` allowed)."""
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in [t[2:] if t.startswith("W/") else t for t in tags]
+
+
+class DashboardCache:
+    """(external_user_key, day) -> (snapshot, etag, version), with per-user write versions."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self._entries = TTLCache(max_size, ttl)
+        self._lock = threading.Lock()
+        # Last write per user, LRU-bounded like the entries. Versions come from one
+        # counter, and a user with no entry is at `_floor` (the newest version
+        # evicted or cleared), so a dropped version never reads as older.
+        self.max_versions = max(1, max_size)
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        self._counter = 0
+        self._floor = 0
+        self.updates = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(external_user_key: str) -> tuple:
+        return (external_user_key, date.today().isoformat())
+
+    def _current(self, external_user_key: str) -> int:
+        return self._versions.get(external_user_key, self._floor)
+
+    def _bump(self, external_user_key: str) -> int:
+        self._counter += 1
+        self._versions[external_user_key] = self._counter
+        self._versions.move_to_end(external_user_key)
+        while len(self._versions) > self.max_versions:
+            _, evicted = self._versions.popitem(last=False)
+            self._floor = max(self._floor, evicted)
+        return self._counter
+
+    def version(self, external_user_key: str) -> int:
+        """Take before reading the database; pass to `set`."""
+        with self._lock:
+            return self._current(external_user_key)
+
+    def get(self, external_user_key: str) -> Optional[Tuple[Optional[dict], str]]:
+        entry = self._entries.get(self._key(external_user_key))
+        return None if entry is MISSING else entry[:2]
+
+    def set(self, external_user_key: str, snapshot: Optional[dict], version: int) -> str:
+        """Cache a freshly read snapshot unless a write happened since `version`; returns its ETag."""
+        etag = make_etag(snapshot)
+        with self._lock:
+            if self._current(external_user_key) == version:
+                self._entries.set(self._key(external_user_key), (snapshot, etag, version))
+        return etag
+
+    def begin_write(self, external_user_key: str) -> int:
+        """
+        Call before writing a log row; pass the result to `apply_log`. Reads
+        started from here on are not cached, since they may or may not see the row.
+        """
+        with self._lock:
+            since = self._current(external_user_key)
+            self._bump(external_user_key)
+            return since
+
+    def apply_log(self, external_user_key: str, table: str, row: dict, since: int):
+        """
+        The row is written: add it onto the cached snapshot if that was built
+        before `begin_write` (so it cannot include the row yet), else drop it.
+        """
+        key = self._key(external_user_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            version = self._bump(external_user_key)
+            if entry is MISSING or entry[0] is None or entry[2] != since:
+                self._entries.pop(key)
+                return
+            snapshot = merge_pending(entry[0], log_totals(table, row))
+            self._entries.set(key, (snapshot, make_etag(snapshot), version))
+            self.updates += 1
+
+    def invalidate(self, external_user_key: str):
+        with self._lock:
+            self._bump(external_user_key)
+            self._entries.pop(self._key(external_user_key))
+            self.invalidations += 1
+
+    def clear(self):
+        """Drop every snapshot, e.g. after a bulk change to targets or totals."""
+        with self._lock:
+            self._counter += 1
+            self._floor = self._counter
+            self._versions.clear()
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            **self._entries.stats(),
+            "updates": self.updates,
+            "invalidations": self.invalidations,
+            "versions": len(self._versions),
+        }
+
+
+dashboard_cache = DashboardCache(settings.dashboard_cache_size, ttl=settings.dashboard_cache_ttl)
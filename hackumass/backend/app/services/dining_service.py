@@ -1,6 +1,7 @@
 # app/services/dining_service.py
+from datetime import date as date_type
 from typing import List, Dict, Any, Optional
-from ..db import fetch_all   # use the shared Snowflake helper
+from .menu_service import menu_service
 
 
 def get_dining_hall_data(
@@ -8,19 +9,12 @@ def get_dining_hall_data(
     date: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
     """
-    Fetch dining hall rows from UMUNCH_DB.DINING_DATA.NOV_12_2025.
-    Filters by MEAL and enforces CALORIES >= 100.
+    Menu rows for one meal on `date` (default today), from the in-memory menu.
+    Enforces KCAL >= 100.
     """
-
-    # fully qualified so we avoid "Object 'NOV_12_2025' does not exist" errors
-    table_name = "UMUNCH_DB.DINING_DATA.NOV_12_2025"
-
-    sql = f"""
-        SELECT *
-        FROM {table_name}
-        WHERE LOWER(MEAL) = LOWER(%s)
-          AND CALORIES >= 100
-    """
-
-    rows = fetch_all(sql, (meal_type,))
-    return rows
\ No newline at end of file
+    menu = menu_service.get_sync(date_type.fromisoformat(date) if date else None)
+    meal_type = (meal_type or "").upper()
+    return [
+        row for row in menu.rows
+        if str(row["MEAL_TYPE_CODE"]).upper() == meal_type and (row["KCAL"] or 0) >= 100
+    ]
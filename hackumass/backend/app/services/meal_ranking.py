@@ -0,0 +1,238 @@
+# app/services/meal_ranking.py
+"""
+Deterministic menu ranking for /coach.
+
+The day's menu is loaded into a MenuMatrix once: a float32 matrix of
+(kcal, protein, carb, fat) per row, a hall id per row, and allergen and diet
+tags packed into int64 bitmasks. Ranking a user is then a single vectorized
+pass:
+
+- rows with one of the user's allergens, a conflict with their diet, or
+  under MIN_KCAL are masked out
+- the rest are scored by how close they come to a meal-sized share of the
+  user's remaining kcal/protein/carb/fat, with extra cost for going over
+  the remaining calories
+- the top k per hall are taken
+
+The result is used as the LLM's shortlist and as an instant answer when the
+LLM is unavailable.
+"""
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+
+MIN_KCAL = 100
+
+# Diet types that map onto menu diet tags; other diets (kosher, keto, paleo, ...)
+# are reported by unfiltered() and left to the model.
+DIET_TAGS = {
+    "VEGAN": "vegan",
+    "VEGETARIAN": "vegetarian",
+    "HALAL": "halal",
+    # Fish dishes carry no diet tag, so pescatarians get the vegetarian rows.
+    "PESCATARIAN": "vegetarian",
+}
+# Diet types applied as allergen exclusions instead.
+DIET_ALLERGENS = {
+    "GLUTEN_FREE": ("wheat",),
+}
+
+# Allergen tags the menu rows use.
+MENU_ALLERGENS = frozenset({"peanut", "tree_nut", "milk", "egg", "wheat", "soy", "fish", "shellfish", "sesame"})
+# Allergy ids the app sends (DietaryRestrictionsForm.tsx), after _tag, that name a menu tag differently.
+TAG_ALIASES = {
+    "dairy": "milk",
+    "wheat_gluten": "wheat",
+    "gluten": "wheat",
+}
+
+MACROS = ("KCAL", "PROTEIN_G", "CARB_G", "FAT_G")
+TARGETS = ("KCAL_TARGET", "PROTEIN_TARGET_G", "CARB_TARGET_G", "FAT_TARGET_G")
+CONSUMED = ("CONSUMED_KCAL", "CONSUMED_PROTEIN_G", "CONSUMED_CARB_G", "CONSUMED_FAT_G")
+
+# Relative weight of each macro's miss in the fit score.
+WEIGHTS = np.array([1.0, 1.0, 0.5, 0.5], dtype=np.float32)
+# Extra cost per unit of (portion kcal - remaining kcal) / portion kcal.
+OVERSHOOT_PENALTY = 2.0
+# A meal aims for this share of the day's targets, capped by what is left.
+MEAL_SHARE = 1 / 3
+MIN_PORTION_KCAL = 300.0
+DEFAULT_TARGETS = (2000.0, 100.0, 250.0, 65.0)
+
+
+def _tag(value: str) -> str:
+    """'Tree Nuts' / 'tree-nuts' -> 'tree_nut', 'dairy' -> 'milk', so user allergies line up with menu allergen tags."""
+    tag = "_".join(str(value).strip().lower().replace("-", " ").replace("/", " ").split())
+    tag = tag[:-1] if tag.endswith("s") and not tag.endswith("ss") else tag
+    return TAG_ALIASES.get(tag, tag)
+
+
+def tags(value) -> set:
+    """Normalized tags from a JSON list, a comma-separated string or a list."""
+    if value is None:
+        return set()
+    if isinstance(value, str):
+        try:
+            value = json.loads(value) if value.startswith("[") else value.split(",")
+        except ValueError:
+            value = value.split(",")
+    return {_tag(v) for v in value if str(v).strip()}
+
+
+def menu_tagged(rows: List[dict]) -> bool:
+    """Whether the rows carry allergen/diet tags at all; the columns are optional (see menu_service)."""
+    return any(row.get("ALLERGENS") is not None or row.get("DIET_TAGS") is not None for row in rows)
+
+
+def unfiltered(user: dict, rows: Optional[List[dict]] = None) -> dict:
+    """
+    The user's allergies and diet that the menu tags can't filter on, e.g.
+    {"allergies": ["other"], "diet": "keto"}; empty when everything is filtered.
+    Given menu `rows` without any tags, that is every restriction.
+    """
+    tagged = not rows or menu_tagged(rows)
+    result = {}
+    allergies = sorted(tags(user.get("ALLERGIES")) - (MENU_ALLERGENS if tagged else set()))
+    if allergies:
+        result["allergies"] = allergies
+    diet = _diet(user)
+    if diet and diet != "NONE" and (not tagged or (diet not in DIET_TAGS and diet not in DIET_ALLERGENS)):
+        result["diet"] = diet.lower()
+    return result
+
+
+def _diet(user: dict) -> str:
+    """'gluten-free' / 'GLUTEN-FREE' -> 'GLUTEN_FREE', the DIET_TAGS/DIET_ALLERGENS keys."""
+    return "_".join(str(user.get("DIET_TYPE") or "").strip().upper().replace("-", " ").split())
+
+
+def hall_key(hall_name: Optional[str]) -> str:
+    """'Worcester Dining Commons' -> 'Worcester' (the keys the response uses)."""
+    return (hall_name or "Unknown").split()[0]
+
+
+class MenuMatrix:
+    """Column arrays for one day's menu rows (keeps the rows for output)."""
+
+    def __init__(self, rows: List[dict]):
+        self.rows = rows
+        self.macros = np.array(
+            [[float(row.get(m) or 0) for m in MACROS] for row in rows], dtype=np.float32
+        ).reshape(len(rows), len(MACROS))
+
+        hall_ids: Dict[str, int] = {}
+        self.hall_ids = np.array(
+            [hall_ids.setdefault(hall_key(row.get("HALL_NAME")), len(hall_ids)) for row in rows],
+            dtype=np.int32,
+        )
+        self.halls: List[str] = list(hall_ids)
+
+        self.tagged = menu_tagged(rows)
+        self.tag_bits: Dict[str, int] = {}
+        self.allergen_bits = np.array([self._bits(tags(row.get("ALLERGENS"))) for row in rows], dtype=np.int64)
+        self.diet_bits = np.array([self._bits(tags(row.get("DIET_TAGS"))) for row in rows], dtype=np.int64)
+
+    def _bits(self, names: set, add: bool = True) -> int:
+        """Bitmask for `names`; with add=False tags no row has are ignored."""
+        mask = 0
+        for tag in names:
+            if tag not in self.tag_bits:
+                if not add or len(self.tag_bits) >= 63:
+                    continue
+                self.tag_bits[tag] = 1 << len(self.tag_bits)
+            mask |= self.tag_bits[tag]
+        return mask
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def eligible(self, user: dict, min_kcal: float = MIN_KCAL) -> np.ndarray:
+        """Boolean mask of rows the user can eat."""
+        mask = self.macros[:, 0] >= min_kcal
+        if not self.tagged:
+            return mask  # nothing to filter on; unfiltered() reports the restrictions
+        diet = _diet(user)
+        allergies = self._bits(tags(user.get("ALLERGIES")) | set(DIET_ALLERGENS.get(diet, ())), add=False)
+        if allergies:
+            mask &= (self.allergen_bits & allergies) == 0
+        diet_tag = DIET_TAGS.get(diet)
+        if diet_tag:
+            # No row carries the tag at all: nothing on the menu fits the diet.
+            diet_bit = self.tag_bits.get(diet_tag, 0)
+            mask &= (self.diet_bits & diet_bit) != 0
+        return mask
+
+    def scores(self, user: dict) -> np.ndarray:
+        """Fit of every row to the user's next meal; higher is better (max 0)."""
+        targets = np.array(
+            [float(user.get(t) if user.get(t) is not None else d) for t, d in zip(TARGETS, DEFAULT_TARGETS)],
+            dtype=np.float32,
+        )
+        consumed = np.array([float(user.get(c) or 0) for c in CONSUMED], dtype=np.float32)
+        remaining = np.maximum(targets - consumed, 0)
+
+        # Meal-sized slice of what is left, in the same proportions.
+        portion_kcal = max(min(targets[0] * MEAL_SHARE, remaining[0]), MIN_PORTION_KCAL)
+        scale = portion_kcal / max(remaining[0], 1.0)
+        desired = np.where(remaining > 0, remaining * scale, targets * MEAL_SHARE)
+        desired = np.maximum(desired, 1.0)
+
+        miss = (self.macros - desired) / desired
+        score = -(miss * miss) @ WEIGHTS
+        overshoot = np.maximum(self.macros[:, 0] - remaining[0], 0) / portion_kcal
+        return score - OVERSHOOT_PENALTY * overshoot
+
+    def rank(self, user: dict, k: int) -> Dict[str, List[dict]]:
+        """Top `k` distinct items per hall as {hall: [row + "FIT_SCORE"]}, best first."""
+        if not len(self):
+            return {}
+        mask = self.eligible(user)
+        scores = np.where(mask, self.scores(user), -np.inf)
+        # Sort by hall, then by score descending; each hall is then a contiguous run.
+        order = np.lexsort((-scores, self.hall_ids))
+        order = order[mask[order]]
+        ranked: Dict[str, List[dict]] = {}
+        seen = set()
+        for i in order:
+            hall = self.halls[self.hall_ids[i]]
+            items = ranked.setdefault(hall, [])
+            name = self.rows[i].get("ITEM_NAME")
+            # An item served at several meals appears once, as its best-scoring row.
+            if len(items) >= k or (hall, name) in seen:
+                continue
+            seen.add((hall, name))
+            items.append({**self.rows[i], "FIT_SCORE": round(float(scores[i]), 4)})
+        return ranked
+
+
+def rank_menu(user: dict, menus: List[dict], k: int, matrix: Optional[MenuMatrix] = None) -> Dict[str, List[dict]]:
+    """Rank `menus` for `user`; pass a prebuilt `matrix` to skip the conversion."""
+    return (matrix or MenuMatrix(menus)).rank(user, k)
+
+
+def ranked_answer(user: dict, ranked: Dict[str, List[dict]], per_hall: int = 5) -> dict:
+    """
+    The /coach answer shape, built straight from the ranking (no LLM). With
+    restrictions the ranking couldn't apply, "unfiltered" lists them.
+    """
+    remaining = user.get("REMAINING_KCAL")
+    if remaining is None and user.get("KCAL_TARGET") is not None:
+        remaining = float(user["KCAL_TARGET"]) - float(user.get("CONSUMED_KCAL") or 0)
+    recommendations = {}
+    for hall, rows in ranked.items():
+        recommendations[hall] = []
+        for row in rows[:per_hall]:
+            reason = f"{float(row.get('KCAL') or 0):.0f} kcal with {float(row.get('PROTEIN_G') or 0):.0f} g protein"
+            if remaining is not None:
+                reason += f"; fits your remaining {max(float(remaining), 0):.0f} kcal"
+            recommendations[hall].append({
+                "itemName": row.get("ITEM_NAME"),
+                "estimatedCalories": row.get("KCAL"),
+                "reason": reason + ".",
+            })
+    answer = {"recommendations": recommendations}
+    missing = unfiltered(user, [row for rows in ranked.values() for row in rows])
+    if missing:
+        answer["unfiltered"] = missing
+    return answer
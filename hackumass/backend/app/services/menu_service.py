@@ -0,0 +1,237 @@
+# app/services/menu_service.py
+"""
+In-memory dining menu, one snapshot per day.
+
+The menu changes once a day, so each day's partition of menu_items (joined to
+dining_halls) is read once and turned into a DayMenu:
+
+- `items`: API-shaped item dicts, ordered by menu_item_id
+- `by_id`: menu_item_id -> item
+- `by_hall_meal`: (HALL_CODE, MEAL_TYPE_CODE) -> items
+- `rows`: the upper-case row dicts /coach ranks and prompts with
+
+Menu reads are then dictionary lookups. A day is loaded on first use, a
+background thread reloads today's menu every day at `menu_refresh_time`, and
+POST /admin/menu/refresh reloads on demand. A reload builds the new DayMenu
+completely before swapping it in, so readers never see a half-built menu.
+
+menu_items only has to have date_id, dining_hall_id, item_name and the macro
+columns. OPTIONAL_COLUMNS are used when the table has them (the SQLite
+fixture does) and are None otherwise:
+
+- without menu_item_id, rows are numbered in (hall, item) order for the day
+- without meal_type_id, items have no meal type and meal filters match nothing
+- without allergens/diet_tags, /coach can't filter on them and says so in the
+  prompt (see meal_ranking.unfiltered)
+
+To get meal types and filtering on Snowflake, add those columns to
+menu_items; no code change is needed.
+"""
+import threading
+import time
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import settings
+from ..db import fetch_all
+
+# m.* rather than named columns: the optional ones may not exist in every deployment.
+MENU_SQL = """
+    SELECT m.*, d.hall_code, d.hall_name
+    FROM menu_items m
+    JOIN dining_halls d ON m.dining_hall_id = d.dining_hall_id
+    WHERE m.date_id = %s
+"""
+MEAL_TYPES_SQL = "SELECT * FROM meal_types"
+
+OPTIONAL_COLUMNS = ("MENU_ITEM_ID", "MEAL_TYPE_ID", "CATEGORY", "ALLERGENS", "DIET_TAGS")
+
+
+def _menu_rows(rows: List[dict], meal_types: List[dict]) -> List[dict]:
+    """MENU_SQL rows with every optional column present (None if missing), in menu_item_id order."""
+    by_id = {mt["MEAL_TYPE_ID"]: mt for mt in meal_types}
+    out = []
+    for row in rows:
+        row = {**dict.fromkeys(OPTIONAL_COLUMNS), **row}
+        meal_type = by_id.get(row["MEAL_TYPE_ID"], {})
+        row["MEAL_TYPE_CODE"] = meal_type.get("MEAL_TYPE_CODE")
+        row["MEAL_TYPE_NAME"] = meal_type.get("MEAL_TYPE_NAME")
+        out.append(row)
+    if all(row["MENU_ITEM_ID"] is not None for row in out):
+        return sorted(out, key=lambda row: row["MENU_ITEM_ID"])
+    # No ids in the table: number the day's rows in a stable order.
+    out.sort(key=lambda row: (str(row["HALL_CODE"]), str(row["ITEM_NAME"])))
+    for i, row in enumerate(out, 1):
+        row["MENU_ITEM_ID"] = i
+    return out
+
+
+def _item(row: dict) -> dict:
+    """API shape of one menu row (as /meals/menu returns it)."""
+    return {
+        "menu_item_id": row["MENU_ITEM_ID"],
+        "name": row["ITEM_NAME"],
+        "kcal": row["KCAL"],
+        "protein_g": row["PROTEIN_G"],
+        "carb_g": row["CARB_G"],
+        "fat_g": row["FAT_G"],
+        "hall_name": row["HALL_NAME"],
+        "hall_code": row["HALL_CODE"],
+        "meal_type_name": row["MEAL_TYPE_NAME"],
+        "meal_type_code": row["MEAL_TYPE_CODE"],
+        "category": row["CATEGORY"],
+    }
+
+
+class DayMenu:
+    """One day's menu and its lookup indexes; never mutated after it is built."""
+
+    def __init__(self, day: date, rows: List[dict]):
+        self.day = day
+        self.loaded_at = time.time()
+        self.rows = rows
+        self.items = [_item(row) for row in rows]
+        self.ids = [item["menu_item_id"] for item in self.items]
+        self.by_id = dict(zip(self.ids, self.items))
+        self.by_hall_meal: Dict[Tuple[str, str], List[dict]] = {}
+        self._rows_by_hall: Dict[str, List[dict]] = {}
+        for row, item in zip(rows, self.items):
+            hall, meal = str(row["HALL_CODE"]).upper(), str(row["MEAL_TYPE_CODE"] or "").upper()
+            self.by_hall_meal.setdefault((hall, meal), []).append(item)
+            self._rows_by_hall.setdefault(hall, []).append(row)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def select(self, hall_code: Optional[str] = None, meal_type_code: Optional[str] = None) -> List[dict]:
+        """Items for one hall and/or meal, in menu_item_id order."""
+        if hall_code and meal_type_code:
+            return self.by_hall_meal.get((hall_code.upper(), meal_type_code.upper()), [])
+        if not hall_code and not meal_type_code:
+            return self.items
+        return [
+            item for item in self.items
+            if (not hall_code or item["hall_code"] == hall_code.upper())
+            and (not meal_type_code or item["meal_type_code"] == meal_type_code.upper())
+        ]
+
+    def rows_for_halls(self, hall_codes: Optional[List[str]] = None) -> List[dict]:
+        """Upper-case rows for the given halls (all halls when empty)."""
+        if not hall_codes:
+            return self.rows
+        return [row for code in dict.fromkeys(c.upper() for c in hall_codes) for row in self._rows_by_hall.get(code, [])]
+
+
+def page_after(items: List[dict], cursor: Optional[int], limit: int) -> Tuple[List[dict], Optional[int]]:
+    """Keyset page of `items` (sorted by menu_item_id) after `cursor`; returns (page, next_cursor)."""
+    start = bisect_right([item["menu_item_id"] for item in items], cursor) if cursor is not None else 0
+    page = items[start:start + limit]
+    has_more = start + limit < len(items)
+    return page, (page[-1]["menu_item_id"] if has_more else None)
+
+
+class MenuService:
+    """Loaded DayMenus by date, the most recent `days_kept` of them."""
+
+    def __init__(self, days_kept: int):
+        self.days_kept = max(1, days_kept)
+        self._menus: Dict[date, DayMenu] = {}
+        self._lock = threading.Lock()       # guards _menus
+        self._load_lock = threading.RLock()  # one loader at a time
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.hits = 0
+        self.loads = 0
+        self.load_errors = 0
+
+    def peek(self, day: Optional[date] = None) -> Optional[DayMenu]:
+        with self._lock:
+            menu = self._menus.get(day or date.today())
+            if menu is not None:
+                self.hits += 1
+            return menu
+
+    def refresh(self, day: Optional[date] = None) -> DayMenu:
+        """Read `day` from the database and swap it in."""
+        day = day or date.today()
+        with self._load_lock:
+            rows = _menu_rows(fetch_all(MENU_SQL, (day.isoformat(),)), fetch_all(MEAL_TYPES_SQL))
+            menu = DayMenu(day, rows)
+            with self._lock:
+                self._menus[day] = menu
+                for old in sorted(self._menus)[:-self.days_kept]:
+                    del self._menus[old]
+                self.loads += 1
+        print(f"Menu service: loaded {len(menu)} items for {day.isoformat()}")
+        return menu
+
+    def get_sync(self, day: Optional[date] = None) -> DayMenu:
+        """The day's menu, loading it on first use."""
+        day = day or date.today()
+        menu = self.peek(day)
+        if menu is not None:
+            return menu
+        with self._load_lock:
+            # Another request may have loaded it while we waited.
+            with self._lock:
+                menu = self._menus.get(day)
+            if menu is None:
+                menu = self.refresh(day)
+        return menu
+
+    async def get(self, day: Optional[date] = None) -> DayMenu:
+        menu = self.peek(day)
+        if menu is not None:
+            return menu
+        return await run_in_threadpool(self.get_sync, day)
+
+    # -- scheduled refresh ---------------------------------------------------
+
+    def _seconds_until_refresh(self) -> float:
+        hour, minute = (int(part) for part in settings.menu_refresh_time.split(":"))
+        now = datetime.now()
+        next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        return (next_run - now).total_seconds()
+
+    def _run(self):
+        delay = 0.0  # load today's menu right away
+        while not self._stop.wait(delay):
+            try:
+                self.refresh()
+                delay = self._seconds_until_refresh()
+            except Exception as e:
+                # Keep serving the previous snapshot and try again soon.
+                self.load_errors += 1
+                print(f"Menu service: refresh failed: {e}")
+                delay = min(settings.menu_refresh_retry, self._seconds_until_refresh())
+
+    def start(self):
+        """Load today's menu in the background and reload it daily."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="menu-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "days": {d.isoformat(): {"items": len(m), "loaded_at": m.loaded_at} for d, m in self._menus.items()},
+                "hits": self.hits,
+                "loads": self.loads,
+                "load_errors": self.load_errors,
+                "refresh_time": settings.menu_refresh_time,
+            }
+
+
+menu_service = MenuService(settings.menu_days_kept)
@@ -0,0 +1,242 @@
+# app/services/recommendation_cache.py
+"""
+Cache of Gemini meal recommendations for /coach.
+
+Two students with the same diet, allergies and targets asking about the same
+day's menu get the same answer, so the LLM call is keyed on a fingerprint of
+only the inputs that shape it: the diet/allergy/goal fields of the snapshot
+(numbers bucketed), a digest of the menu rows and the meal type.
+
+Entries are fresh until `coach_cache_ttl` or the end of the menu's day,
+whichever is sooner. They are kept `coach_cache_stale_ttl` seconds longer so
+a timed-out or failed LLM call can still be answered from a stale entry. With
+`coach_cache_path` set, entries are also appended to a JSON-lines file and
+reloaded on startup; the file is rewritten with only the live entries on
+startup and whenever it grows past `coach_cache_compact_bytes`.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import Awaitable, Callable, Optional, Tuple
+
+from ..cache import MISSING, TTLCache
+from ..config import settings
+
+# Bump when the prompt changes so old answers are not served for it.
+PROMPT_VERSION = 2
+
+# Snapshot fields that change the answer; everything else (names, ids, ...) is ignored.
+SNAPSHOT_FIELDS = ("DIET_TYPE", "ALLERGIES", "GOAL_TYPE")
+# Numeric snapshot fields, rounded to a bucket so near-identical users share entries.
+SNAPSHOT_BUCKETS = {
+    "KCAL_TARGET": settings.coach_cache_kcal_bucket,
+    "REMAINING_KCAL": settings.coach_cache_kcal_bucket,
+    "PROTEIN_TARGET_G": 5,
+    "CARB_TARGET_G": 5,
+    "FAT_TARGET_G": 5,
+}
+# Menu columns the prompt uses (image-match fields are left out).
+MENU_FIELDS = (
+    "HALL_NAME", "ITEM_NAME", "CATEGORY", "KCAL", "PROTEIN_G", "CARB_G", "FAT_G", "ALLERGENS", "DIET_TAGS",
+)
+
+
+def _allergy_list(value) -> list:
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            value = value.split(",")
+    return sorted({str(v).strip().lower() for v in value or [] if str(v).strip()})
+
+
+def menu_digest(menus: list) -> str:
+    """Order-independent digest of the menu rows the prompt sees."""
+    rows = sorted(
+        json.dumps([row.get(f) for f in MENU_FIELDS], default=str, separators=(",", ":"))
+        for row in menus
+    )
+    return hashlib.sha256("\n".join(rows).encode("utf-8")).hexdigest()
+
+
+def fingerprint(user: dict, menus: list, meal_type: str) -> str:
+    profile = {}
+    for field in SNAPSHOT_FIELDS:
+        value = user.get(field)
+        if field == "ALLERGIES":
+            value = _allergy_list(value)
+        elif isinstance(value, str):
+            value = value.strip().lower()
+        profile[field] = value
+    for field, bucket in SNAPSHOT_BUCKETS.items():
+        if user.get(field) is not None:
+            profile[field] = round(float(user[field]) / bucket) * bucket
+    key = {
+        "v": PROMPT_VERSION,
+        "user": profile,
+        "menu": menu_digest(menus),
+        "meal": (meal_type or "").strip().lower(),
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _end_of_day(menu_date: date) -> float:
+    return datetime.combine(menu_date + timedelta(days=1), dt_time.min).timestamp()
+
+
+class RecommendationCache:
+    """Fingerprint -> (fresh_until, answer), with stale retention and optional persistence."""
+
+    def __init__(self, max_size: int, ttl: float, stale_ttl: float, path: str = "", compact_bytes: int = 16 * 1024 * 1024):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.path = path
+        self.compact_bytes = compact_bytes
+        self._entries = TTLCache(max_size)
+        self._file_lock = threading.Lock()
+        self.stale_served = 0
+        self.llm_calls = 0
+        self.llm_timeouts = 0
+        if path:
+            self._load()
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is MISSING:
+            return None
+        fresh_until, answer = entry
+        if time.time() < fresh_until or allow_stale:
+            return answer
+        return None
+
+    def set(self, key: str, answer: dict, menu_date: Optional[date] = None):
+        now = time.time()
+        fresh_until = min(now + self.ttl, _end_of_day(menu_date or date.today()))
+        self._entries.set(key, (fresh_until, answer), ttl=fresh_until - now + self.stale_ttl)
+        if self.path:
+            self._append(key, fresh_until, answer)
+
+    # -- persistence ---------------------------------------------------------
+
+    def _append(self, key: str, fresh_until: float, answer: dict):
+        line = json.dumps({"key": key, "fresh_until": fresh_until, "answer": answer}, separators=(",", ":"))
+        with self._file_lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                size = f.tell()
+            if size >= self.compact_bytes:
+                self._compact()
+
+    def _compact(self):
+        """Rewrite the file with the entries still in memory. Caller holds _file_lock."""
+        now = time.time()
+        records = [
+            {"key": key, "fresh_until": fresh_until, "answer": answer}
+            for key, (fresh_until, answer) in self._entries.items()
+            if fresh_until + self.stale_ttl > now
+        ]
+        self._write_records(records)
+        print(f"Recommendation cache: compacted {self.path} to {len(records)} entries")
+
+    def _write_records(self, records):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        os.replace(tmp, self.path)
+
+    def _load(self):
+        """Reload live entries and rewrite the file without the dead ones."""
+        if not os.path.exists(self.path):
+            return
+        now = time.time()
+        live = {}
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn last line
+                if record["fresh_until"] + self.stale_ttl > now:
+                    live.pop(record["key"], None)
+                    live[record["key"]] = record
+        for record in live.values():
+            self._entries.set(
+                record["key"], (record["fresh_until"], record["answer"]),
+                ttl=record["fresh_until"] - now + self.stale_ttl,
+            )
+        self._write_records(live.values())
+        print(f"Recommendation cache: loaded {len(live)} entries from {self.path}")
+
+    def clear(self):
+        self._entries.clear()
+        if self.path:
+            with self._file_lock:
+                open(self.path, "w").close()
+
+    def stats(self) -> dict:
+        return {
+            **self._entries.stats(),
+            "stale_served": self.stale_served,
+            "llm_calls": self.llm_calls,
+            "llm_timeouts": self.llm_timeouts,
+            "persisted": bool(self.path),
+        }
+
+
+recommendation_cache = RecommendationCache(
+    settings.coach_cache_size,
+    ttl=settings.coach_cache_ttl,
+    stale_ttl=settings.coach_cache_stale_ttl,
+    path=settings.coach_cache_path,
+    compact_bytes=settings.coach_cache_compact_bytes,
+)
+
+
+async def cached_recommendation(
+    ask: Callable[[dict, list, str], Awaitable[dict]],
+    user: dict,
+    menus: list,
+    meal_type: str,
+    timeout: Optional[float] = None,
+) -> Tuple[Optional[dict], str]:
+    """
+    Return (answer, source) where source is "cache", "llm" or "stale".
+
+    `ask(user, menus, meal_type)` is the async LLM call. If it fails or
+    runs past `timeout` the last answer for the same fingerprint is served
+    even if expired; with none, the error (asyncio.TimeoutError on timeout)
+    is raised. A call that times out keeps running in the background (up to
+    the client's own deadline) and still fills the cache when it finishes.
+    """
+    key = fingerprint(user, menus, meal_type)
+    answer = recommendation_cache.get(key)
+    if answer is not None:
+        return answer, "cache"
+
+    async def call_and_store():
+        recommendation_cache.llm_calls += 1
+        result = await ask(user, menus, meal_type)
+        recommendation_cache.set(key, result)
+        return result
+
+    timeout = settings.coach_llm_timeout if timeout is None else timeout
+    call = asyncio.ensure_future(call_and_store())
+    # Nobody awaits the call after a timeout; retrieve its error so it isn't logged as lost.
+    call.add_done_callback(lambda task: task.cancelled() or task.exception())
+    try:
+        # shield: our timeout stops the wait, not the call
+        return await asyncio.wait_for(asyncio.shield(call), timeout), "llm"
+    except Exception as e:
+        if isinstance(e, asyncio.TimeoutError):
+            recommendation_cache.llm_timeouts += 1
+        stale = recommendation_cache.get(key, allow_stale=True)
+        if stale is None:
+            raise
+        print(f"Coach LLM call failed ({type(e).__name__}), serving a stale recommendation")
+        recommendation_cache.stale_served += 1
+        return stale, "stale"
@@ -0,0 +1,152 @@
+# app/services/reference_data.py
+"""
+In-process cache for the small dimension tables the log endpoints look up on
+every write (dining halls, meal types, workout types), plus a bounded LRU of
+external_user_key -> user_id.
+
+Dimension tables are loaded whole and refreshed after `reference_cache_ttl`
+seconds or when `invalidate()` is called. User ids never change once assigned,
+so the LRU only needs a size bound.
+"""
+import threading
+import time
+from typing import Dict, Optional
+
+from ..cache import MISSING, TTLCache
+from ..config import settings
+from ..db import fetch_all_async, fetch_one_async
+
+# name -> (query, code column, id column)
+REFERENCE_TABLES = {
+    "dining_halls": (
+        "SELECT hall_code, dining_hall_id FROM dining_halls",
+        "HALL_CODE", "DINING_HALL_ID",
+    ),
+    "meal_types": (
+        "SELECT meal_type_code, meal_type_id FROM meal_types",
+        "MEAL_TYPE_CODE", "MEAL_TYPE_ID",
+    ),
+    "workout_types": (
+        "SELECT workout_code, workout_type_id FROM workout_types",
+        "WORKOUT_CODE", "WORKOUT_TYPE_ID",
+    ),
+}
+
+
+class ReferenceCache:
+    """Code -> id maps for the dimension tables, reloaded on expiry."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._tables: Dict[str, Dict[str, int]] = {}
+        self._loaded_at: Dict[str, float] = {}
+        self.hits = 0
+        self.loads = 0
+
+    def _fresh(self, name: str) -> Optional[Dict[str, int]]:
+        with self._lock:
+            loaded_at = self._loaded_at.get(name)
+            if loaded_at is not None and time.monotonic() - loaded_at < self.ttl:
+                self.hits += 1
+                return self._tables[name]
+        return None
+
+    async def get_table(self, name: str) -> Dict[str, int]:
+        table = self._fresh(name)
+        if table is not None:
+            return table
+
+        query, code_col, id_col = REFERENCE_TABLES[name]
+        rows = await fetch_all_async(query)
+        table = {str(r[code_col]).upper(): r[id_col] for r in rows}
+        with self._lock:
+            self._tables[name] = table
+            self._loaded_at[name] = time.monotonic()
+            self.loads += 1
+        return table
+
+    async def lookup(self, name: str, code: str) -> Optional[int]:
+        table = await self.get_table(name)
+        return table.get(code.upper())
+
+    def invalidate(self, name: Optional[str] = None):
+        with self._lock:
+            if name is None:
+                self._loaded_at.clear()
+            else:
+                self._loaded_at.pop(name, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "hits": self.hits,
+                "loads": self.loads,
+                "tables": {
+                    name: {
+                        "rows": len(self._tables.get(name, {})),
+                        "age_s": round(now - loaded_at, 1),
+                    }
+                    for name, loaded_at in self._loaded_at.items()
+                },
+            }
+
+
+class UserKeyCache:
+    """LRU of external_user_key -> user_id on the shared TTLCache (no TTL: ids never change)."""
+
+    def __init__(self, max_size: int):
+        self._entries = TTLCache(max_size)
+
+    def get(self, external_user_key: str) -> Optional[int]:
+        user_id = self._entries.get(external_user_key)
+        return None if user_id is MISSING else user_id
+
+    def remember(self, external_user_key: str, user_id: int):
+        self._entries.set(external_user_key, user_id)
+
+    def invalidate(self, external_user_key: Optional[str] = None):
+        if external_user_key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(external_user_key)
+
+    def stats(self) -> dict:
+        return self._entries.stats()
+
+
+reference_cache = ReferenceCache(ttl=settings.reference_cache_ttl)
+user_keys = UserKeyCache(max_size=settings.user_key_cache_size)
+
+
+async def get_dining_hall_id(hall_code: str) -> Optional[int]:
+    return await reference_cache.lookup("dining_halls", hall_code)
+
+async def get_meal_type_id(meal_type_code: str) -> Optional[int]:
+    return await reference_cache.lookup("meal_types", meal_type_code)
+
+async def get_workout_type_id(workout_code: str) -> Optional[int]:
+    return await reference_cache.lookup("workout_types", workout_code)
+
+async def get_user_id(external_user_key: str) -> Optional[int]:
+    """Resolve a user's id, hitting the database only on an LRU miss."""
+    user_id = user_keys.get(external_user_key)
+    if user_id is not None:
+        return user_id
+
+    user = await fetch_one_async(
+        "SELECT user_id FROM users WHERE external_user_key = %s",
+        (external_user_key,),
+    )
+    if not user:
+        return None
+    user_keys.remember(external_user_key, user["USER_ID"])
+    return user["USER_ID"]
+
+def invalidate(table: Optional[str] = None):
+    """Drop cached dimension tables (all of them if `table` is None)."""
+    reference_cache.invalidate(table)
+
+def cache_stats() -> dict:
+    return {"reference_tables": reference_cache.stats(), "user_keys": user_keys.stats()}
@@ -0,0 +1,181 @@
+# app/services/targets.py
+"""
+Daily calorie and macro targets (Mifflin-St Jeor), for one user or everyone.
+
+`compute_targets` is vectorized with NumPy: /onboarding/goals calls it with a
+single user, and the daily rollover job calls it with every active user at
+once. The rollover then writes the next day's user_daily_targets rows with a
+few large MERGE statements in one transaction, instead of a round trip per
+user:
+
+    python -m app.services.targets               # tomorrow's targets
+    python -m app.services.targets --day 2025-11-20
+
+Run it from cron (or POST /admin/targets/rollover) once a day, before
+midnight, so /dashboard/today and /coach have targets for the new day.
+"""
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ..db import execute_transaction, fetch_all
+
+# Onboarding does not collect an age yet; every target assumes this one.
+ASSUMED_AGE = 20
+
+# Activity level -> TDEE multiplier. Keys are compared without underscores, so
+# both 'NOT_VERY_ACTIVE' and 'NOTVERYACTIVE' (from 'notVeryActive') match.
+ACTIVITY_MULTIPLIERS = {
+    "NOTVERYACTIVE": 1.2,    # Sedentary
+    "LIGHTLYACTIVE": 1.375,  # Light exercise
+    "ACTIVE": 1.55,          # Moderate exercise
+    "VERYACTIVE": 1.725,     # Heavy exercise
+}
+DEFAULT_ACTIVITY_MULTIPLIER = 1.2
+
+# Goal type -> kcal adjustment on top of TDEE
+GOAL_ADJUSTMENTS = {
+    "CUT": -500.0,   # deficit for weight loss
+    "BULK": 300.0,   # surplus for muscle gain
+    "MAINTAIN": 0.0,
+}
+
+PROTEIN_G_PER_KG = 2.0
+FAT_SHARE = 0.25
+
+# Users who logged a meal or workout on any of the last this-many days get tomorrow's targets.
+ACTIVE_DAYS = 30
+# Rows per MERGE statement (10 binds each); SQLite caps a UNION ALL at 500 terms.
+MAX_ROWS_PER_MERGE = 500
+
+
+def _lookup(values, table: dict, default: float, normalize=lambda v: v) -> np.ndarray:
+    return np.array([table.get(normalize(str(v or "").upper()), default) for v in values], dtype=np.float64)
+
+
+def compute_targets(weight_lbs, height_in, gender_identity, activity_level, goal_type) -> Dict[str, np.ndarray]:
+    """
+    Targets for aligned sequences of user attributes.
+
+    Returns arrays "kcal", "protein_g", "carb_g" and "fat_g".
+    """
+    weight_kg = np.asarray(weight_lbs, dtype=np.float64) * 0.453592
+    height_cm = np.asarray(height_in, dtype=np.float64) * 2.54
+    is_male = np.array([str(g or "").upper() == "MALE" for g in gender_identity])
+
+    # BMR Formula
+    bmr = 10 * weight_kg + 6.25 * height_cm - 5 * ASSUMED_AGE + np.where(is_male, 5.0, -161.0)
+    # TDEE (Total Daily Energy Expenditure), adjusted for the goal
+    tdee = bmr * _lookup(
+        activity_level, ACTIVITY_MULTIPLIERS, DEFAULT_ACTIVITY_MULTIPLIER, lambda v: v.replace("_", "")
+    )
+    kcal = tdee + _lookup(goal_type, GOAL_ADJUSTMENTS, 0.0)
+
+    # Macros: protein by body weight, fat by share of calories, carbs get the rest
+    protein = weight_kg * PROTEIN_G_PER_KG
+    fat = kcal * FAT_SHARE / 9
+    carb = (kcal - protein * 4 - fat * 9) / 4
+    return {"kcal": kcal, "protein_g": protein, "carb_g": carb, "fat_g": fat}
+
+
+# Active = logged a meal or workout in the window, or signed up in it (so new
+# users get day-2 targets before their first log). Targets rows don't count:
+# the rollover writes them itself, so every user would stay active forever.
+# A row that already exists for the day keeps its goal and activity level, so
+# its targets are computed from those rather than the user's current ones.
+ACTIVE_USERS_SQL = """
+    SELECT u.user_id, u.weight_lbs, u.height_in, u.gender_identity,
+           COALESCE(x.activity_level, u.activity_level) AS activity_level,
+           COALESCE(x.goal_type, u.goal_type) AS goal_type
+    FROM users u
+    LEFT JOIN user_daily_targets x ON x.user_id = u.user_id AND x.date_id = %s
+    WHERE u.weight_lbs IS NOT NULL
+      AND u.height_in IS NOT NULL
+      AND (
+          u.created_at >= %s
+          OR u.user_id IN (
+              SELECT DISTINCT user_id FROM user_daily_totals
+              WHERE date_id >= %s AND (meals_logged > 0 OR workouts_logged > 0)
+          )
+      )
+"""
+
+COLUMNS = [
+    "user_id", "date_id", "kcal_target", "protein_target_g", "carb_target_g", "fat_target_g",
+    "goal_type", "activity_level", "weight_lbs_snapshot", "height_in_snapshot",
+]
+# An existing row for the day only gets new numbers; its goal, activity level
+# and snapshots (e.g. from /onboarding/goals) are left alone.
+COMPUTED_COLUMNS = ["kcal_target", "protein_target_g", "carb_target_g", "fat_target_g"]
+
+
+def build_merge(rows: List[tuple]) -> tuple:
+    """One MERGE upserting `rows` (tuples in COLUMNS order) into user_daily_targets."""
+    first = "SELECT " + ", ".join(f"%s AS {c}" for c in COLUMNS)
+    rest = "SELECT " + ", ".join(["%s"] * len(COLUMNS))
+    source = " UNION ALL ".join([first] + [rest] * (len(rows) - 1))
+    updates = ", ".join(f"{c} = s.{c}" for c in COMPUTED_COLUMNS)
+    query = f"""
+        MERGE INTO user_daily_targets t
+        USING ({source}) s
+        ON t.user_id = s.user_id AND t.date_id = s.date_id
+        WHEN MATCHED THEN UPDATE SET {updates}
+        WHEN NOT MATCHED THEN INSERT ({", ".join(COLUMNS)}, target_source)
+        VALUES ({", ".join(f"s.{c}" for c in COLUMNS)}, 'AUTO_CALC')
+    """
+    return query, tuple(v for row in rows for v in row)
+
+
+def rollover_targets(day: Optional[date] = None, active_days: int = ACTIVE_DAYS) -> dict:
+    """Write `day`'s (default tomorrow) targets for every active user; returns counts and timings."""
+    day = day or date.today() + timedelta(days=1)
+    started = time.perf_counter()
+    since = (day - timedelta(days=active_days)).isoformat()
+    users = fetch_all(ACTIVE_USERS_SQL, (day.isoformat(), since, since))
+    read_s = time.perf_counter() - started
+
+    targets = compute_targets(
+        [u["WEIGHT_LBS"] for u in users],
+        [u["HEIGHT_IN"] for u in users],
+        [u["GENDER_IDENTITY"] for u in users],
+        [u["ACTIVITY_LEVEL"] for u in users],
+        [u["GOAL_TYPE"] for u in users],
+    )
+    compute_s = time.perf_counter() - started - read_s
+
+    day_id = day.isoformat()
+    rows = [
+        (
+            u["USER_ID"], day_id, kcal, protein, carb, fat,
+            u["GOAL_TYPE"] or "MAINTAIN", u["ACTIVITY_LEVEL"], u["WEIGHT_LBS"], u["HEIGHT_IN"],
+        )
+        for u, kcal, protein, carb, fat in zip(
+            users,
+            targets["kcal"].round(1).tolist(), targets["protein_g"].round(1).tolist(),
+            targets["carb_g"].round(1).tolist(), targets["fat_g"].round(1).tolist(),
+        )
+    ]
+    statements = [build_merge(rows[i:i + MAX_ROWS_PER_MERGE]) for i in range(0, len(rows), MAX_ROWS_PER_MERGE)]
+    if statements:
+        execute_transaction(statements)
+    write_s = time.perf_counter() - started - read_s - compute_s
+    return {
+        "day": day_id,
+        "users": len(rows),
+        "statements": len(statements),
+        "read_s": round(read_s, 3),
+        "compute_s": round(compute_s, 3),
+        "write_s": round(write_s, 3),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write next-day user_daily_targets for all active users.")
+    parser.add_argument("--day", type=date.fromisoformat, help="target day (default: tomorrow)")
+    parser.add_argument("--active-days", type=int, default=ACTIVE_DAYS)
+    args = parser.parse_args()
+    print(rollover_targets(args.day, args.active_days))
@@ -0,0 +1,477 @@
+# app/services/write_queue.py
+"""
+Write-behind pipeline for food_logs and workout_logs.
+
+POST /meals and POST /workouts append their row to a local append-only journal
+and return as soon as it is fsync'd. A background thread flushes pending rows
+to the database as multi-row INSERTs once `write_batch_size` rows are queued or
+every `write_flush_interval` seconds, whichever comes first. The same
+transaction adds the batch's per-user, per-day sums to user_daily_totals
+(see services/daily_totals.py), so the rollup always matches the log tables.
+
+Durability: every record carries a sequence number. After a batch commits the
+highest flushed seq is written to a checkpoint file, and on startup any
+journal record newer than the checkpoint is replayed. A crash between the
+database commit and the checkpoint write can replay that one batch, so
+delivery is at-least-once.
+
+Workers: each process journals to its own slot (`write_journal_path`, then
+`.1`, `.2`, ...) held with an fcntl lock, so one worker's compaction or
+checkpoint never touches another's records. On startup a worker also adopts
+the records of any slot no process holds (a worker that exited or crashed).
+Without fcntl (Windows) there is one journal, so run a single worker there.
+
+Bad rows: a batch that fails for any reason other than the database being
+unreachable is retried one row at a time. A row that fails on its own
+`write_max_attempts` times is moved to the `.dead` file next to the journal
+and skipped, so it can't hold up everything queued behind it.
+
+Rows that have not been flushed yet are still visible through
+`pending_totals()`, which /dashboard/today merges into its snapshot.
+"""
+import asyncio
+import glob
+import itertools
+import json
+import os
+import threading
+import time
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import settings
+from ..db import PoolTimeout, QueryTimeout, execute_transaction
+from .daily_totals import build_increments
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# table -> (columns bound as parameters, literal values appended to each row)
+TABLES = {
+    "food_logs": (
+        ["user_id", "date_id", "meal_type_id", "dining_hall_id",
+         "kcal_total", "protein_total_g", "carb_total_g", "fat_total_g"],
+        {"logged_mode": "'MANUAL'"},
+    ),
+    "workout_logs": (
+        ["user_id", "date_id", "workout_type_id",
+         "duration_min", "intensity", "kcal_burned"],
+        {"is_planned": "FALSE"},
+    ),
+}
+
+# Keep each INSERT comfortably under driver bind-variable limits.
+MAX_ROWS_PER_INSERT = 500
+
+
+def build_statements(rows_by_table: Dict[str, List[dict]]) -> list:
+    """INSERTs for the log rows plus the matching user_daily_totals increments."""
+    statements = []
+    for table, rows in rows_by_table.items():
+        for i in range(0, len(rows), MAX_ROWS_PER_INSERT):
+            statements.append(build_insert(table, rows[i:i + MAX_ROWS_PER_INSERT]))
+    return statements + build_increments(rows_by_table)
+
+
+# Driver errors (by DB-API class name) that mean the database is down or busy,
+# not that a row is bad; they never count against a row's attempts.
+TRANSIENT_ERRORS = ("OperationalError", "InterfaceError")
+
+
+def _transient(e: Exception) -> bool:
+    if isinstance(e, (PoolTimeout, QueryTimeout, OSError, TimeoutError)):
+        return True
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(e).__mro__)
+
+
+def build_insert(table: str, rows: List[dict]):
+    """Build one multi-row INSERT for `rows`; returns (query, params)."""
+    columns, literals = TABLES[table]
+    placeholders = ", ".join(["%s"] * len(columns) + list(literals.values()))
+    query = (
+        f"INSERT INTO {table} ({', '.join(columns + list(literals))}) VALUES "
+        + ", ".join([f"({placeholders})"] * len(rows))
+    )
+    params = tuple(row[c] for row in rows for c in columns)
+    return query, params
+
+
+def _slot_path(base: str, slot: int) -> str:
+    return base if slot == 0 else f"{base}.{slot}"
+
+
+def _is_slot(base: str, path: str) -> bool:
+    return path == base or (path.startswith(base + ".") and path[len(base) + 1:].isdigit())
+
+
+def _try_lock(f) -> bool:
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def _claim_slot(base: str):
+    """Lock the first journal slot no other process holds; returns (path, lock file)."""
+    if fcntl is None:
+        return base, None
+    for slot in itertools.count():
+        path = _slot_path(base, slot)
+        lock = open(path + ".lock", "a")
+        if _try_lock(lock):
+            return path, lock
+        lock.close()
+
+
+def _read_journal(path: str) -> Tuple[List[dict], int, int, int]:
+    """(unflushed records, checkpointed seq, highest seq, torn lines) of the journal at `path`."""
+    flushed_seq = 0
+    if os.path.exists(path + ".checkpoint"):
+        with open(path + ".checkpoint", encoding="utf-8") as f:
+            flushed_seq = int(f.read().strip() or 0)
+    pending, last_seq, torn = [], flushed_seq, 0
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    if not line.endswith("\n"):
+                        raise ValueError("no newline")
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn write from a crash; it was never acknowledged. Keep
+                    # reading: records appended after it still count.
+                    torn += 1
+                    continue
+                last_seq = max(last_seq, record["seq"])
+                if record["seq"] > flushed_seq:
+                    pending.append(record)
+    return pending, flushed_seq, last_seq, torn
+
+
+class WriteQueue:
+    def __init__(
+        self,
+        journal_path: str,
+        batch_size: int,
+        flush_interval: float,
+        compact_bytes: int = 16 * 1024 * 1024,
+        max_attempts: int = 3,
+    ):
+        self.journal_path, self._slot_lock = _claim_slot(journal_path)
+        self.checkpoint_path = self.journal_path + ".checkpoint"
+        self.dead_letter_path = journal_path + ".dead"
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.compact_bytes = compact_bytes
+        self.max_attempts = max(1, max_attempts)
+
+        self._lock = threading.Lock()          # guards the journal file and _pending
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._pending: List[dict] = []         # records in seq order, not yet committed
+        self._seq = 0
+        self._flushed_seq = 0
+        # Seqlock-style counters so readers can tell if a flush overlapped a query.
+        self._flushes_started = 0
+        self._flushes_finished = 0
+        self._attempts: Dict[int, int] = {}   # seq -> failed solo attempts
+
+        self.stats_counters = {
+            "appended": 0, "flushed": 0, "batches": 0, "flush_errors": 0, "replayed": 0,
+            "adopted": 0, "dead_lettered": 0,
+        }
+
+        self._replay()
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._adopt_orphans(journal_path)
+        self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+        self._thread.start()
+
+    # -- journal -------------------------------------------------------------
+
+    def _replay(self):
+        self._pending, self._flushed_seq, self._seq, torn = _read_journal(self.journal_path)
+        if torn:
+            # Drop the torn bytes before appending again, or the next record
+            # would be glued onto them and lost on the following replay.
+            print(f"Write queue: dropping {torn} torn journal line(s)")
+            self._rewrite_journal()
+        if self._pending:
+            self.stats_counters["replayed"] = len(self._pending)
+            print(f"Write queue: replaying {len(self._pending)} unflushed journal records")
+
+    def _adopt_orphans(self, base: str):
+        """Move the unflushed records of slots no process holds into this journal."""
+        if fcntl is None:
+            return
+        for lock_path in sorted(glob.glob(glob.escape(base) + "*.lock")):
+            path = lock_path[:-len(".lock")]
+            if path == self.journal_path or not _is_slot(base, path):
+                continue
+            with open(lock_path, "a") as lock:
+                if not _try_lock(lock):
+                    continue  # a live worker's slot
+                records = _read_journal(path)[0]
+                with self._lock:
+                    for record in records:
+                        self._journal_record(record["table"], record["row"])
+                # Re-journaled here first, so a crash now can only replay them twice.
+                for leftover in (path, path + ".checkpoint"):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+            if records:
+                self.stats_counters["adopted"] += len(records)
+                print(f"Write queue: adopted {len(records)} unflushed records from {path}")
+
+    def _journal_record(self, table: str, row: dict) -> dict:
+        """Append and fsync one record. Caller holds _lock."""
+        self._seq += 1
+        record = {"seq": self._seq, "table": table, "row": row}
+        self._journal.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._pending.append(record)
+        return record
+
+    def append(self, table: str, row: dict) -> int:
+        """Durably journal one row; returns its sequence number."""
+        if table not in TABLES:
+            raise ValueError(f"write queue does not handle table {table!r}")
+        with self._lock:
+            record = self._journal_record(table, row)
+            self.stats_counters["appended"] += 1
+            should_wake = len(self._pending) >= self.batch_size
+        if should_wake:
+            self._wakeup.set()
+        return record["seq"]
+
+    def _write_checkpoint(self, seq: int):
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(str(seq))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.checkpoint_path)
+
+    def _compact(self):
+        """Rewrite the journal with only unflushed records once it gets large or empty."""
+        with self._lock:
+            size = self._journal.tell()
+            if self._pending and size < self.compact_bytes:
+                return
+            self._journal.close()
+            self._rewrite_journal()
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def _rewrite_journal(self):
+        """Atomically replace the journal with just the pending records."""
+        tmp = self.journal_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for record in self._pending:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.journal_path)
+
+    # -- flushing ------------------------------------------------------------
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # Rows stay pending and are retried on the next tick.
+                self.stats_counters["flush_errors"] += 1
+                print(f"Write queue flush failed: {e}")
+                self._stop.wait(min(self.flush_interval * 5, 30))
+
+    def flush(self) -> int:
+        """Write all currently pending rows in one transaction; returns the rows written."""
+        with self._lock:
+            batch = list(self._pending)
+        if not batch:
+            return 0
+        try:
+            self._commit(batch)
+            return len(batch)
+        except Exception as e:
+            if _transient(e):
+                raise
+            print(f"Write queue: batch of {len(batch)} failed ({e}), retrying its rows one at a time")
+        # In seq order, so the checkpoint only ever moves past committed or dead-lettered rows.
+        written = 0
+        for record in batch:
+            try:
+                self._commit([record])
+            except Exception as e:
+                if _transient(e) or not self._give_up(record, e):
+                    raise
+                continue
+            written += 1
+        return written
+
+    def _commit(self, batch: List[dict]):
+        """One transaction for `batch` (a prefix of _pending), then checkpoint past it."""
+        with self._lock:
+            self._flushes_started += 1
+        try:
+            rows_by_table = {table: [r["row"] for r in batch if r["table"] == table] for table in TABLES}
+            execute_transaction(build_statements({t: rows for t, rows in rows_by_table.items() if rows}))
+            self._advance(batch[-1]["seq"])
+            with self._lock:
+                self.stats_counters["flushed"] += len(batch)
+                self.stats_counters["batches"] += 1
+        finally:
+            with self._lock:
+                self._flushes_finished += 1
+        self._compact()
+
+    def _advance(self, seq: int):
+        """Checkpoint `seq` and drop it and everything before it from _pending."""
+        self._write_checkpoint(seq)
+        with self._lock:
+            self._flushed_seq = seq
+            self._pending = [r for r in self._pending if r["seq"] > seq]
+            for done in [s for s in self._attempts if s <= seq]:
+                del self._attempts[done]
+
+    def _give_up(self, record: dict, error: Exception) -> bool:
+        """Count a failed solo attempt; after max_attempts move the row to the dead-letter file."""
+        attempts = self._attempts.get(record["seq"], 0) + 1
+        self._attempts[record["seq"]] = attempts
+        if attempts < self.max_attempts:
+            return False
+        line = json.dumps({**record, "error": str(error), "failed_at": time.time()}, separators=(",", ":"))
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._advance(record["seq"])
+        with self._lock:
+            self.stats_counters["dead_lettered"] += 1
+        print(f"Write queue: moved {record['table']} row seq {record['seq']} to {self.dead_letter_path} "
+              f"after {attempts} attempts: {error}")
+        return True
+
+    def close(self):
+        """Stop the background thread after a final flush."""
+        self._stop.set()
+        self._wakeup.set()
+        self._thread.join(timeout=10)
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Write queue final flush failed, rows stay journaled: {e}")
+        with self._lock:
+            self._journal.close()
+        if self._slot_lock is not None:
+            self._slot_lock.close()
+
+    # -- read-your-writes ----------------------------------------------------
+
+    def flush_token(self):
+        with self._lock:
+            return (self._flushes_started, self._flushes_finished)
+
+    def pending_totals(self, user_id: int, date_id: str) -> Dict[str, float]:
+        """Sum the not-yet-flushed rows for one user and day."""
+        totals = {
+            "kcal": 0.0, "protein_g": 0.0, "carb_g": 0.0, "fat_g": 0.0, "kcal_burned": 0.0,
+            "meals": 0, "workouts": 0,
+        }
+        with self._lock:
+            for record in self._pending:
+                row = record["row"]
+                if row["user_id"] != user_id or row["date_id"] != date_id:
+                    continue
+                if record["table"] == "food_logs":
+                    totals["kcal"] += row["kcal_total"]
+                    totals["protein_g"] += row["protein_total_g"]
+                    totals["carb_g"] += row["carb_total_g"]
+                    totals["fat_g"] += row["fat_total_g"]
+                    totals["meals"] += 1
+                else:
+                    totals["kcal_burned"] += row["kcal_burned"]
+                    totals["workouts"] += 1
+        return totals
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats_counters,
+                "pending": len(self._pending),
+                "last_seq": self._seq,
+                "flushed_seq": self._flushed_seq,
+                "journal": self.journal_path,
+            }
+
+
+# Singleton queue
+_write_queue = None
+_write_queue_lock = threading.Lock()
+
+def get_write_queue() -> Optional[WriteQueue]:
+    """Get or start the write queue; None when WRITE_QUEUE_ENABLED is off."""
+    global _write_queue
+    if not settings.write_queue_enabled:
+        return None
+    if _write_queue is None:
+        with _write_queue_lock:
+            if _write_queue is None:
+                _write_queue = WriteQueue(
+                    settings.write_journal_path,
+                    batch_size=settings.write_batch_size,
+                    flush_interval=settings.write_flush_interval,
+                    max_attempts=settings.write_max_attempts,
+                )
+    return _write_queue
+
+def close_write_queue():
+    global _write_queue
+    if _write_queue is not None:
+        _write_queue.close()
+        _write_queue = None
+
+
+async def submit(table: str, row: dict):
+    """
+    Record one log row. Goes through the journal when the queue is enabled,
+    otherwise it is inserted right away.
+    """
+    row = {**row, "date_id": row.get("date_id") or date.today().isoformat()}
+    queue = get_write_queue()
+    if queue is None:
+        await run_in_threadpool(execute_transaction, build_statements({table: [row]}))
+    else:
+        await run_in_threadpool(queue.append, table, row)
+
+async def read_with_pending(query_fn, date_id: Optional[str] = None, attempts: int = 3):
+    """
+    Await `query_fn()` (returns a row dict with USER_ID, or None) and return it
+    with the pending totals for that user and day.
+
+    A flush that commits while the query runs could make rows show up in
+    both places (or neither), so the read is retried until no flush overlapped it.
+    """
+    queue = get_write_queue()
+    if queue is None:
+        return await query_fn(), None
+
+    date_id = date_id or date.today().isoformat()
+    for _ in range(attempts):
+        before = queue.flush_token()
+        row = await query_fn()
+        if row is None:
+            return None, None
+        totals = queue.pending_totals(row["USER_ID"], date_id)
+        if before[0] == before[1] and queue.flush_token() == before:
+            break
+        await asyncio.sleep(0.05)
+    return row, totals
@@ -1,12 +1,12 @@
 from fastapi import APIRouter
-from .db import fetch_all
+from .db import fetch_all_async
 
 router = APIRouter()
 
 @router.get("/testdb")
-def test_db():
+async def test_db():
     try:
-        rows = fetch_all("SELECT CURRENT_VERSION() AS version;")
+        rows = await fetch_all_async("SELECT CURRENT_VERSION() AS version;")
         return {"connected": True, "snowflake_version": rows[0]["VERSION"]}
     except Exception as e:
         return {"connected": False, "error": str(e)}
@@ -0,0 +1,72 @@
+"""
+Batch image matching: get_multiple_images vs. one get_food_image call per name
+(and vs. the old uncached loop).
+
+Builds a batch of dining-hall names with repeats (like a client sending a
+whole menu), clears the lookup cache before each run so every distinct name
+has to be matched, and checks both strategies return the same matches.
+Set IMAGE_MATCH_WORKERS to compare pool sizes.
+
+    FOOD_INDEX_PATH=food_index.bin IMAGE_MATCH_WORKERS=4 python -m benchmarks.bench_batch_images
+"""
+import argparse
+import random
+import time
+
+from app.config import settings
+from app.food_image_service import get_food_image_service, shutdown_match_pool
+from benchmarks.bench_fuzzy_match import dining_hall_names
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", type=int, default=200, help="names per batch")
+    parser.add_argument("--distinct", type=int, default=120, help="distinct names in the batch")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--from-db", action="store_true", help="take names from the dining table")
+    args = parser.parse_args()
+
+    service = get_food_image_service()
+    if not service.store:
+        raise SystemExit("food index unavailable")
+
+    rng = random.Random(7)
+    pool = rng.sample(dining_hall_names(args.from_db), args.distinct)
+    batch = [rng.choice(pool) for _ in range(args.batch)]
+    print(f"{len(batch)} names, {len(set(batch))} distinct, match workers {settings.image_match_workers}")
+
+    # Warm the process pool so worker start-up is not billed to the first round.
+    service.get_multiple_images(pool[:settings.image_match_parallel_min * 2])
+
+    timings = {"uncached": [], "per-name": [], "batch": []}
+    for _ in range(args.rounds):
+        # The old loop: every name matched from scratch, repeats included.
+        start = time.perf_counter()
+        for name in batch:
+            service._lookup(service._normalize_name(name), 0.7)
+        timings["uncached"].append(time.perf_counter() - start)
+
+        service.lookup_cache.clear()
+        start = time.perf_counter()
+        serial = {name: service.get_food_image(name) for name in batch}
+        timings["per-name"].append(time.perf_counter() - start)
+
+        service.lookup_cache.clear()
+        start = time.perf_counter()
+        batched = service.get_multiple_images(batch)
+        timings["batch"].append(time.perf_counter() - start)
+
+        assert list(batched) == list(serial), "batch results out of input order"
+        assert all(
+            (serial[n] or {}).get("matched_name") == (batched[n] or {}).get("matched_name") for n in batch
+        ), "batch and per-name matches differ"
+
+    for label, samples in timings.items():
+        best = min(samples) * 1000
+        mean = sum(samples) / len(samples) * 1000
+        print(f"{label:<10} best {best:>9.1f} ms   mean {mean:>9.1f} ms")
+    shutdown_match_pool()
+
+
+if __name__ == "__main__":
+    main()
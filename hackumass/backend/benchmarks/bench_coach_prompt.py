@@ -0,0 +1,122 @@
+"""
+/coach prompt size: the old indent=2 JSON dump of the snapshot and full menu
+vs. the filtered, compact prompt from app/services/coach_prompt.py.
+
+Prompt tokens are estimated (chars / 4) unless --count-tokens asks Gemini to
+count them. --live also sends both prompts to Gemini and times the calls.
+Needs GEMINI_API_KEY for either flag.
+
+    DB_BACKEND=sqlite python -m benchmarks.bench_coach_prompt --users 50
+"""
+import argparse
+import json
+import statistics
+import time
+
+from app.db import fetch_all
+from app.services.coach_prompt import build_prompt, estimate_tokens
+from benchmarks.bench_fuzzy_match import percentile
+
+SNAPSHOT_SQL = """
+    SELECT *
+    FROM user_daily_targets t
+    JOIN users u ON u.user_id = t.user_id
+    WHERE t.date_id = CURRENT_DATE()
+    LIMIT %s
+"""
+
+MENU_SQL = """
+    SELECT d.hall_name, m.item_name, m.category, m.kcal, m.protein_g, m.carb_g, m.fat_g,
+           m.allergens, m.diet_tags
+    FROM menu_items m
+    JOIN dining_halls d ON m.dining_hall_id = d.dining_hall_id
+    WHERE m.date_id = CURRENT_DATE()
+"""
+
+
+def legacy_prompt(user: dict, menus: list, meal_type: str) -> str:
+    """The prompt ask_umunch used to send (instructions abridged, data verbatim)."""
+    # The old /coach rows also carried the image-match fields.
+    menus = [{**row, "has_image": True, "matched_food_name": row.get("ITEM_NAME")} for row in menus]
+    return f"""
+You are a nutrition assistant helping a student choose meals.
+
+User info (JSON):
+{json.dumps(user, indent=2, default=str)}
+
+Dining hall options (JSON; each row has hall_name/location, item name, kcal, macros, allergens, etc):
+{json.dumps(menus, indent=2, default=str)}
+
+The student is eating **{meal_type.lower()}**.
+
+For EACH dining hall (Worcester, Franklin, Berkshire, Hampshire), pick the top 5 meal options that:
+- Do NOT include any of the user's allergies
+- Respect the user's diet type if provided
+- Are at least 100 calories so the meal is filling
+- Help keep them near or under their daily calorie target if the data is available
+
+Return VALID JSON **only** in the recommendations format.
+"""
+
+
+def summarize(label, samples, unit):
+    print(
+        f"{label:<22} mean {statistics.mean(samples):>10.1f} {unit}   p50 {percentile(samples, 50):>10.1f}"
+        f"   p95 {percentile(samples, 95):>10.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--meal-type", default="lunch")
+    parser.add_argument("--count-tokens", action="store_true", help="use Gemini's tokenizer")
+    parser.add_argument("--live", action="store_true", help="also time real Gemini calls (a few users)")
+    args = parser.parse_args()
+
+    users = fetch_all(SNAPSHOT_SQL, (args.users,))
+    menus = fetch_all(MENU_SQL)
+    print(f"{len(users)} users, {len(menus)} menu rows today")
+
+    model = None
+    if args.count_tokens or args.live:
+        import google.generativeai as genai
+        from app.config import settings
+
+        genai.configure(api_key=settings.gemini_api_key)
+        model = genai.GenerativeModel("gemini-2.0-flash")
+
+    def tokens(prompt):
+        if args.count_tokens:
+            return model.count_tokens(prompt).total_tokens
+        return estimate_tokens(prompt)
+
+    old_tokens, new_tokens, build_ms, kept = [], [], [], []
+    for user in users:
+        old_tokens.append(tokens(legacy_prompt(user, menus, args.meal_type)))
+        start = time.perf_counter()
+        prompt, stats = build_prompt(user, menus, args.meal_type)
+        build_ms.append((time.perf_counter() - start) * 1000)
+        new_tokens.append(tokens(prompt))
+        kept.append(stats["in_prompt"])
+
+    unit = "tok" if args.count_tokens else "~tok"
+    summarize("old prompt", old_tokens, unit)
+    summarize("new prompt", new_tokens, unit)
+    summarize("rows kept", kept, "rows")
+    summarize("build time", build_ms, "ms")
+    print(f"token reduction: {statistics.mean(old_tokens) / statistics.mean(new_tokens):.1f}x")
+
+    if args.live:
+        generation_config = {"response_mime_type": "application/json"}
+        for label, make in (("old", legacy_prompt), ("new", lambda u, m, t: build_prompt(u, m, t)[0])):
+            latencies = []
+            for user in users[:5]:
+                start = time.perf_counter()
+                model.generate_content(make(user, menus, args.meal_type), generation_config=generation_config)
+                latencies.append((time.perf_counter() - start) * 1000)
+            summarize(f"{label} Gemini latency", latencies, "ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+/dashboard/today latency as the log tables grow: the old query (GROUP BY
+over all of food_logs and workout_logs, then filter) vs. the point lookup on
+user_daily_totals.
+
+Builds a SQLite fixture per history length in a temp dir and times both
+queries for random users. The two must return the same numbers.
+
+    python -m benchmarks.bench_dashboard --users 500 --days 7 30 120
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date
+
+from app import local_db
+from app.routers.dashboard import DASHBOARD_SQL
+from benchmarks.bench_fuzzy_match import percentile
+
+LEGACY_DASHBOARD_SQL = """
+    SELECT
+        u.user_id,
+        t.date_id AS day,
+        t.kcal_target,
+        COALESCE(f.consumed_kcal, 0) AS consumed_kcal,
+        COALESCE(f.consumed_protein_g, 0) AS consumed_protein_g,
+        COALESCE(f.consumed_carb_g, 0) AS consumed_carb_g,
+        COALESCE(f.consumed_fat_g, 0) AS consumed_fat_g,
+        COALESCE(w.kcal_burned_total, 0) AS workout_kcal_burned,
+        (COALESCE(f.consumed_kcal, 0) - COALESCE(w.kcal_burned_total, 0)) AS net_kcal,
+        t.kcal_target - COALESCE(f.consumed_kcal, 0) AS remaining_kcal
+    FROM user_daily_targets t
+    JOIN users u ON u.user_id = t.user_id
+    LEFT JOIN (
+        SELECT user_id, date_id,
+               SUM(kcal_total) AS consumed_kcal,
+               SUM(protein_total_g) AS consumed_protein_g,
+               SUM(carb_total_g) AS consumed_carb_g,
+               SUM(fat_total_g) AS consumed_fat_g
+        FROM food_logs
+        GROUP BY user_id, date_id
+    ) f ON f.user_id = t.user_id AND f.date_id = t.date_id
+    LEFT JOIN (
+        SELECT user_id, date_id, SUM(kcal_burned) AS kcal_burned_total
+        FROM workout_logs
+        GROUP BY user_id, date_id
+    ) w ON w.user_id = t.user_id AND w.date_id = t.date_id
+    WHERE u.external_user_key = %s AND t.date_id = CURRENT_DATE();
+"""
+
+COMPARED = ("CONSUMED_KCAL", "CONSUMED_PROTEIN_G", "WORKOUT_KCAL_BURNED", "NET_KCAL", "REMAINING_KCAL")
+
+
+def query_ms(cursor, sql, params):
+    start = time.perf_counter()
+    cursor.execute(sql, params)
+    columns = [d[0] for d in cursor.description]
+    row = cursor.fetchone()
+    return (time.perf_counter() - start) * 1000, dict(zip(columns, row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--days", type=int, nargs="+", default=[7, 30, 120])
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    print(f"{'days':>5} {'food_logs':>10}   {'old p50':>9} {'old p95':>9}   {'new p50':>9} {'new p95':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for days in args.days:
+            path = os.path.join(tmp, f"dashboard_{days}.db")
+            raw = local_db._open(path)
+            local_db.create_schema(raw)
+            local_db.seed(raw, users=args.users, days=days, items_per_meal=5)
+            raw.close()
+            conn = local_db.SQLiteConnection(local_db._open(path))
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM food_logs")
+            food_logs = cursor.fetchone()[0]
+
+            old, new = [], []
+            for _ in range(args.queries):
+                key = f"student{rng.randrange(args.users)}@umass.edu"
+                old_ms, old_row = query_ms(cursor, LEGACY_DASHBOARD_SQL, (key,))
+                new_ms, new_row = query_ms(cursor, DASHBOARD_SQL, (key, date.today().isoformat()))
+                for column in COMPARED:
+                    assert abs(old_row[column] - new_row[column]) < 1e-6, (key, column, old_row, new_row)
+                old.append(old_ms)
+                new.append(new_ms)
+            conn.close()
+            print(
+                f"{days:>5} {food_logs:>10}   {statistics.median(old):>7.2f}ms {percentile(old, 95):>7.2f}ms"
+                f"   {statistics.median(new):>7.2f}ms {percentile(new, 95):>7.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Fuzzy food-name matching: trigram index vs. the old linear SequenceMatcher scan.
+
+Reports p50/p99 latency per lookup for both strategies and how often they
+agree on the best match, using dining-hall item names as queries.
+
+    # against the real MM-Food-100K index (downloads the dataset)
+    python -m benchmarks.bench_fuzzy_match
+    # offline: one dish name per line, queries from the dining table
+    DB_BACKEND=sqlite python -m benchmarks.bench_fuzzy_match --names-file dishes.txt --from-db
+"""
+import argparse
+import time
+
+from app.food_image_service import FoodImageService, get_food_image_service
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def dining_hall_names(from_db: bool) -> list[str]:
+    if from_db:
+        from app.db import fetch_all
+
+        rows = fetch_all("SELECT DISTINCT NAME FROM umunch_db.dining_data.nov_12_2025")
+        return [r["NAME"] for r in rows]
+
+    from app.local_db import MENU_DISHES, MENU_MODIFIERS
+
+    return [modifier + dish[0] for dish in MENU_DISHES for modifier in MENU_MODIFIERS]
+
+
+def time_lookups(match_fn, queries, threshold):
+    results, timings = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(match_fn(query, threshold))
+        timings.append((time.perf_counter() - start) * 1000)
+    return results, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--names-file", help="index these dish names instead of loading MM-Food-100K")
+    parser.add_argument("--from-db", action="store_true", help="query with names from the dining table")
+    parser.add_argument("--threshold", type=float, default=0.7)
+    parser.add_argument("--limit", type=int, default=0, help="only run this many queries")
+    args = parser.parse_args()
+
+    if args.names_file:
+        with open(args.names_file, encoding="utf-8") as f:
+            service = FoodImageService.from_names([line.strip() for line in f if line.strip()])
+    else:
+        service = get_food_image_service()
+
+    # Exact hits never reach the fuzzy matcher, so only misses are measured.
+    queries = []
+    for name in dining_hall_names(args.from_db):
+        normalized = service._normalize_name(name)
+        if normalized and service.store.find_name(normalized) is None and normalized not in queries:
+            queries.append(normalized)
+    if args.limit:
+        queries = queries[:args.limit]
+    print(f"{len(service.store.names)} indexed names, {len(queries)} fuzzy queries, threshold {args.threshold}")
+
+    linear, linear_ms = time_lookups(service._fuzzy_match_linear, queries, args.threshold)
+    indexed, indexed_ms = time_lookups(service._fuzzy_match, queries, args.threshold)
+
+    agree = sum(
+        (a is None and b is None) or (a is not None and b is not None and a[0] == b[0])
+        for a, b in zip(linear, indexed)
+    )
+    print(f"{'strategy':<10} {'p50 ms':>10} {'p99 ms':>10} {'total s':>10}")
+    for label, timings in (("linear", linear_ms), ("trigram", indexed_ms)):
+        print(
+            f"{label:<10} {percentile(timings, 50):>10.3f} {percentile(timings, 99):>10.3f} "
+            f"{sum(timings) / 1000:>10.2f}"
+        )
+    print(f"agreement: {agree}/{len(queries)} ({100 * agree / max(1, len(queries)):.1f}%)")
+    print(f"matches: linear {sum(r is not None for r in linear)}, trigram {sum(r is not None for r in indexed)}")
+
+
+if __name__ == "__main__":
+    main()
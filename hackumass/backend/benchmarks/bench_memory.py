@@ -0,0 +1,148 @@
+"""
+Memory held by the food image data: the old in-process Dataset + name dict vs.
+the mmap'd columnar index (app/food_index_store.py).
+
+Each layout is loaded in a fresh interpreter and reports RSS, PSS (RSS with
+shared pages split between the processes mapping them), anonymous memory and
+peak RSS from /proc, minus an interpreter-only baseline.
+Anonymous memory is what every extra uvicorn worker pays again; the mmap'd
+index pages are file-backed and shared through the page cache.
+
+The dataset is synthetic (MM-Food-100K-shaped rows built from a names file)
+and saved with `datasets`, so the old layout is loaded the same way the old
+service loaded the HF cache. Linux only.
+
+    python -m benchmarks.bench_memory --names-file dishes.txt --rows 100000
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+from app.food_index_store import DATASET_SOURCE, FoodIndexStore, build_index_bytes, write_index
+from app.name_index import normalize_name
+
+METHODS = ["grilled", "baked", "fried", "steamed", "raw", "roasted"]
+INGREDIENTS = ["rice", "chicken", "onion", "garlic", "tomato", "beans", "cheese", "flour", "egg", "spinach"]
+
+
+def synthetic_columns(names, rows, seed=3):
+    rng = random.Random(seed)
+    columns = {c: [] for c in ("dish_name", "image_url", "nutritional_profile", "ingredients", "cooking_method")}
+    for i in range(rows):
+        columns["dish_name"].append(rng.choice(names))
+        columns["image_url"].append(f"https://example.com/mm-food-100k/images/{i:06d}.jpg")
+        columns["nutritional_profile"].append({
+            "calories_kcal": rng.randint(50, 900),
+            "protein_g": rng.randint(0, 60),
+            "carbohydrate_g": rng.randint(0, 120),
+            "fat_g": rng.randint(0, 50),
+        })
+        columns["ingredients"].append(rng.sample(INGREDIENTS, rng.randint(3, 8)))
+        columns["cooking_method"].append(rng.choice(METHODS))
+    return columns
+
+
+def memory_kb() -> dict:
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    # VmHWM rather than ru_maxrss, which a child inherits from the parent across exec.
+    with open("/proc/self/status") as f:
+        peak = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+    return {
+        "rss": fields["Rss"],
+        "pss": fields["Pss"],
+        "anon": fields["Anonymous"],
+        "peak_rss": peak,
+    }
+
+
+def run_child(mode, data_dir, lookups):
+    if mode == "old":
+        from datasets import load_from_disk
+
+        # Mirrors the original FoodImageService: keep the Dataset, index every row.
+        dataset = load_from_disk(os.path.join(data_dir, "dataset"))
+        food_index = {}
+        for idx, item in enumerate(dataset):
+            food_name = item.get("dish_name", "")
+            if food_name:
+                food_index.setdefault(normalize_name(food_name), []).append(idx)
+        for name in list(food_index)[:lookups]:
+            dataset[food_index[name][0]]
+    elif mode == "index":
+        store = FoodIndexStore.open(os.path.join(data_dir, "food_index.bin"))
+        name_index = store.trigram_index()
+        for name_id in range(min(lookups, len(store.names))):
+            store.row(store.row_for_name(name_id))
+        name_index.best_match("grilled chiken", 0.7)
+    elif mode == "build":
+        # Peak of an in-process rebuild, which is why the API builds in a child.
+        with open(os.path.join(data_dir, "columns.json"), encoding="utf-8") as f:
+            build_index_bytes(json.load(f), DATASET_SOURCE)
+    print(json.dumps(memory_kb()))
+
+
+def measure(mode, data_dir, lookups):
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_memory", "--child", mode, "--data-dir", data_dir,
+         "--lookups", str(lookups)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--names-file", help="one dish name per line (default: dining-hall names)")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=2000, help="rows to decode after loading")
+    parser.add_argument("--child", choices=["baseline", "old", "index", "build"], help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        if args.child == "baseline":
+            print(json.dumps(memory_kb()))
+        else:
+            run_child(args.child, args.data_dir, args.lookups)
+        return
+
+    if args.names_file:
+        with open(args.names_file, encoding="utf-8") as f:
+            names = [line.strip() for line in f if line.strip()]
+    else:
+        from benchmarks.bench_fuzzy_match import dining_hall_names
+
+        names = dining_hall_names(False)
+
+    from datasets import Dataset
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        columns = synthetic_columns(names, args.rows)
+        Dataset.from_dict(columns).save_to_disk(os.path.join(data_dir, "dataset"))
+        write_index(os.path.join(data_dir, "food_index.bin"), build_index_bytes(columns, DATASET_SOURCE))
+        with open(os.path.join(data_dir, "columns.json"), "w", encoding="utf-8") as f:
+            json.dump(columns, f)
+        index_mb = os.path.getsize(os.path.join(data_dir, "food_index.bin")) / 2**20
+        print(f"{args.rows} rows, {len(set(names))} distinct names, index file {index_mb:.1f} MB")
+
+        base = measure("baseline", data_dir, args.lookups)
+        print(f"{'layout':<18} {'RSS MB':>9} {'PSS MB':>9} {'anon MB':>9} {'peak MB':>9}")
+        for label, mode in (("old Dataset+dict", "old"), ("mmap index", "index"), ("in-process build", "build")):
+            m = measure(mode, data_dir, args.lookups)
+            print(
+                f"{label:<18} {(m['rss'] - base['rss']) / 1024:>9.1f} {(m['pss'] - base['pss']) / 1024:>9.1f} "
+                f"{(m['anon'] - base['anon']) / 1024:>9.1f} {(m['peak_rss'] - base['peak_rss']) / 1024:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
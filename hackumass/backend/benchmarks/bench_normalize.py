@@ -0,0 +1,61 @@
+"""
+Food-name normalization and trigram extraction, the per-name work every image
+lookup does before it reaches the index.
+
+Queries are dining-hall item names plus noisy variants (case, punctuation,
+extra spaces), like the names clients send.
+
+    python -m benchmarks.bench_normalize --rounds 20
+"""
+import argparse
+import random
+import time
+
+from app.name_index import normalize_name, trigrams
+from benchmarks.bench_fuzzy_match import dining_hall_names, percentile
+
+
+def noisy_names(names, seed=3):
+    rng = random.Random(seed)
+    variants = []
+    for name in names:
+        variants.append(name)
+        variants.append(name.upper())
+        variants.append("  " + name.replace(" ", "   ") + "  ")
+        variants.append(name + rng.choice([" (V)", " - GF", "!", " w/ Rice", "*"]))
+    return variants
+
+
+def time_calls(fn, inputs, rounds):
+    """Per-call microseconds, timed over each pass through `inputs`."""
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for value in inputs:
+            fn(value)
+        timings.append((time.perf_counter() - start) * 1e6 / len(inputs))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from-db", action="store_true", help="use names from the dining table")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    names = noisy_names(dining_hall_names(args.from_db))
+    normalized = [normalize_name(n) for n in names]
+    print(f"{len(names)} names, {args.rounds} rounds")
+    print(f"{'step':<22} {'p50 us':>9} {'p99 us':>9} {'names/s':>12}")
+    for label, fn, inputs in (
+        ("normalize_name", normalize_name, names),
+        ("trigrams", trigrams, normalized),
+        ("normalize + trigrams", lambda n: trigrams(normalize_name(n)), names),
+    ):
+        timings = time_calls(fn, inputs, args.rounds)
+        p50 = percentile(timings, 50)
+        print(f"{label:<22} {p50:>9.2f} {percentile(timings, 99):>9.2f} {1e6 / p50:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
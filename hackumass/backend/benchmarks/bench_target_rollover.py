@@ -0,0 +1,86 @@
+"""
+Daily target rollover: the batch job in app/services/targets.py (one read,
+NumPy for everyone, a few bulk MERGEs) vs. what onboarding does per user
+(read the user, compute in Python, MERGE one row), timed on a sample and
+extrapolated.
+
+Builds a SQLite fixture with --users users in a temp dir.
+
+    python -m benchmarks.bench_target_rollover --users 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--sample", type=int, default=500, help="users timed one by one")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    # Settings are read at import time, so point them at the fixture first.
+    os.environ["DB_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = os.path.join(tmp, "rollover.db")
+
+    from app import local_db
+    from app.db import execute, fetch_all, fetch_one
+    from app.services.targets import ACTIVE_USERS_SQL, build_merge, compute_targets, rollover_targets
+
+    start = time.perf_counter()
+    raw = local_db._open(os.environ["SQLITE_PATH"])
+    local_db.create_schema(raw)
+    local_db.seed(raw, users=args.users, days=1, items_per_meal=1)
+    raw.close()
+    print(f"fixture: {args.users} users in {time.perf_counter() - start:.1f}s")
+
+    result = rollover_targets()
+    total = result["read_s"] + result["compute_s"] + result["write_s"]
+    print(
+        f"batch:    {result['users']} users, {result['statements']} MERGE statements, "
+        f"read {result['read_s']:.2f}s + compute {result['compute_s']:.2f}s + write {result['write_s']:.2f}s "
+        f"= {total:.2f}s"
+    )
+
+    # The old shape: a round trip to read and one to write, per user.
+    day = (date.today() + timedelta(days=2)).isoformat()
+    since = (date.today() - timedelta(days=30)).isoformat()
+    user_ids = [r["USER_ID"] for r in fetch_all(ACTIVE_USERS_SQL + " LIMIT %s", (day, since, since, args.sample))]
+    start = time.perf_counter()
+    for user_id in user_ids:
+        user = fetch_one(
+            "SELECT user_id, weight_lbs, height_in, gender_identity, activity_level, goal_type "
+            "FROM users WHERE user_id = %s",
+            (user_id,),
+        )
+        targets = compute_targets(
+            [user["WEIGHT_LBS"]], [user["HEIGHT_IN"]], [user["GENDER_IDENTITY"]],
+            [user["ACTIVITY_LEVEL"]], [user["GOAL_TYPE"]],
+        )
+        query, params = build_merge([(
+            user_id, day, *(float(targets[k][0]) for k in ("kcal", "protein_g", "carb_g", "fat_g")),
+            user["GOAL_TYPE"], user["ACTIVITY_LEVEL"], user["WEIGHT_LBS"], user["HEIGHT_IN"],
+        )])
+        execute(query, params)
+    per_user = (time.perf_counter() - start) / max(1, len(user_ids))
+    print(
+        f"per-user: {per_user * 1000:.2f} ms/user over {len(user_ids)} users "
+        f"-> ~{per_user * result['users']:.1f}s for {result['users']} (local SQLite; "
+        f"each round trip costs far more against Snowflake)"
+    )
+
+    # Sanity: the batch wrote the same numbers the per-user path computes.
+    check = fetch_one(
+        "SELECT COUNT(*) AS n FROM user_daily_targets a JOIN user_daily_targets b "
+        "ON a.user_id = b.user_id AND a.date_id = %s AND b.date_id = %s "
+        "WHERE ABS(a.kcal_target - b.kcal_target) > 0.1",
+        (result["day"], day),
+    )
+    print(f"mismatched targets between the two paths: {check['N']}")
+
+
+if __name__ == "__main__":
+    main()
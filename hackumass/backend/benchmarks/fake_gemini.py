@@ -0,0 +1,99 @@
+"""
+Local stand-in for the Gemini REST API, for load tests and trying GeminiClient
+without a key or network.
+
+Serves generateContent and streamGenerateContent (alt=sse) for any model.
+The canned answer picks the first few rows per hall from the candidate table
+in the /coach prompt. Latency, jitter and a 503 failure rate are configurable
+so retries, hedging and timeouts can be exercised.
+
+    python -m benchmarks.fake_gemini --port 8089 --latency 1.5 --fail-rate 0.05
+    GEMINI_API_BASE=http://127.0.0.1:8089 GEMINI_API_KEY=fake uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+HALLS = ("Worcester", "Franklin", "Berkshire", "Hampshire")
+
+app = FastAPI(title="fake Gemini")
+app.state.latency = 0.5
+app.state.jitter = 0.2
+app.state.fail_rate = 0.0
+app.state.calls = 0
+
+
+def canned_answer(prompt: str, per_hall: int = 5) -> dict:
+    """Recommend the first `per_hall` candidate rows of each hall in the prompt."""
+    recommendations = {hall: [] for hall in HALLS}
+    for line in prompt.splitlines():
+        parts = line.split("|")
+        if len(parts) < 4 or parts[0] not in recommendations or len(recommendations[parts[0]]) >= per_hall:
+            continue
+        try:
+            kcal = float(parts[3])
+        except ValueError:
+            continue
+        recommendations[parts[0]].append({
+            "itemName": parts[1],
+            "estimatedCalories": kcal,
+            "reason": "Fits your remaining calories and macro targets.",
+        })
+    return {"recommendations": recommendations}
+
+
+def _response(text: str) -> dict:
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+        "usageMetadata": {"promptTokenCount": 0, "candidatesTokenCount": len(text) // 4},
+    }
+
+
+async def _delay():
+    await asyncio.sleep(max(0.0, random.gauss(app.state.latency, app.state.jitter)))
+
+
+@app.post("/v1beta/models/{model_action}")
+async def generate(model_action: str, request: Request):
+    app.state.calls += 1
+    body = await request.json()
+    prompt = "".join(p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", []))
+    if random.random() < app.state.fail_rate:
+        await asyncio.sleep(0.05)
+        return JSONResponse({"error": {"code": 503, "message": "overloaded", "status": "UNAVAILABLE"}}, 503)
+
+    text = json.dumps(canned_answer(prompt))
+    if model_action.endswith(":streamGenerateContent"):
+        async def events():
+            chunks = [text[i:i + 64] for i in range(0, len(text), 64)]
+            for chunk in chunks:
+                await asyncio.sleep(app.state.latency / max(1, len(chunks)))
+                yield f"data: {json.dumps(_response(chunk))}\r\n\r\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    await _delay()
+    return _response(text)
+
+
+@app.get("/stats")
+def stats():
+    return {"calls": app.state.calls}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.5, help="mean seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.2, help="std dev of the latency")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of calls answered with 503")
+    args = parser.parse_args()
+
+    app.state.latency, app.state.jitter, app.state.fail_rate = args.latency, args.jitter, args.fail_rate
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
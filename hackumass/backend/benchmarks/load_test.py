@@ -0,0 +1,362 @@
+"""
+Load test for the API: a closed-loop mix of menu browsing, meal logging,
+dashboard polling and /coach requests against a real uvicorn process.
+
+Everything runs locally. A SQLite fixture stands in for Snowflake
+(DB_BACKEND=sqlite), benchmarks/fake_gemini.py stands in for Gemini, and a
+synthetic food index stands in for MM-Food-100K. All three are built in a
+temp dir for each run.
+
+`--concurrency` virtual users each pick a scenario by weight, run it and go
+again until `--duration` is up. Samples from the first `--warmup` seconds are
+dropped. The run reports throughput and p50/p95/p99 per request and overall.
+It then compares them with a stored baseline run (default
+benchmarks/baselines/load_test.json).
+
+Client and server share the machine, so compare runs from the same host only.
+
+    python -m benchmarks.load_test                                   # compare with the baseline
+    python -m benchmarks.load_test --save-baseline                   # record a new baseline
+    python -m benchmarks.load_test --mix menu=1,dashboard=1 --concurrency 32 --duration 60
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.bench_fuzzy_match import dining_hall_names, percentile
+
+DEFAULT_MIX = "menu=40,log=20,dashboard=35,coach=5"
+# Options that change what is measured (and so must match the baseline's).
+RUN_OPTIONS = (
+    "mix", "concurrency", "duration", "warmup", "think_time", "timeout", "seed",
+    "users", "days", "items_per_meal", "gemini_latency", "gemini_fail_rate",
+)
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "load_test.json")
+
+HALLS = ["WORCESTER", "FRANKLIN", "BERKSHIRE", "HAMPSHIRE"]
+MEALS = ["BREAKFAST", "LUNCH", "DINNER"]
+QUESTIONS = ["What should I eat for lunch?", "High protein dinner ideas", "Something light for breakfast"]
+
+
+# -- scenarios ----------------------------------------------------------------
+
+class Recorder:
+    """Latency samples and failures per request name."""
+
+    def __init__(self):
+        self.recording = False
+        self.samples = {}
+        self.errors = {}
+
+    async def request(self, client, name, method, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            ok = response.status_code in (200, 304)
+            if ok and response.status_code == 200 and response.headers.get("content-type", "").startswith("application/json"):
+                body = response.json()
+                ok = not (isinstance(body, dict) and "error" in body)
+        except httpx.HTTPError:
+            response, ok = None, False
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if self.recording:
+            self.samples.setdefault(name, []).append(elapsed_ms)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+        return response
+
+
+async def browse_menu(client, rec, rng, user_key, state):
+    """First page of one hall's meal, then the next page if there is one."""
+    params = {"dining_hall_code": rng.choice(HALLS), "meal_type_code": rng.choice(MEALS), "limit": 20}
+    response = await rec.request(client, "GET /meals/menu", "GET", "/meals/menu", params=params)
+    if response is not None and response.status_code == 200 and response.json().get("next_cursor"):
+        params["cursor"] = response.json()["next_cursor"]
+        await rec.request(client, "GET /meals/menu", "GET", "/meals/menu", params=params)
+
+
+async def log_meal(client, rec, rng, user_key, state):
+    body = {
+        "external_user_key": user_key,
+        "dining_hall_code": rng.choice(HALLS),
+        "meal_type_code": rng.choice(MEALS),
+        "kcal_total": rng.randint(300, 1100),
+        "protein_total_g": rng.randint(10, 60),
+        "carb_total_g": rng.randint(20, 140),
+        "fat_total_g": rng.randint(5, 45),
+    }
+    await rec.request(client, "POST /meals", "POST", "/meals", json=body)
+
+
+async def poll_dashboard(client, rec, rng, user_key, state):
+    """Polls like the app does: with the last ETag it got for this user."""
+    headers = {"If-None-Match": state[user_key]} if user_key in state else {}
+    response = await rec.request(
+        client, "GET /dashboard/today", "GET", "/dashboard/today",
+        params={"external_user_key": user_key}, headers=headers,
+    )
+    if response is not None and response.headers.get("etag"):
+        state[user_key] = response.headers["etag"]
+
+
+async def ask_coach(client, rec, rng, user_key, state):
+    body = {"external_user_key": user_key, "question": rng.choice(QUESTIONS)}
+    await rec.request(client, "POST /coach", "POST", "/coach", json=body)
+
+
+SCENARIOS = {"menu": browse_menu, "log": log_meal, "dashboard": poll_dashboard, "coach": ask_coach}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise SystemExit(f"unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def drive(base_url, args, mix):
+    rec = Recorder()
+    etags = {}
+    names, weights = list(mix), list(mix.values())
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+
+        async def virtual_user(i):
+            rng = random.Random(args.seed * 1000 + i)
+            while time.perf_counter() < deadline:
+                user_key = f"student{rng.randrange(args.users)}@umass.edu"
+                await SCENARIOS[rng.choices(names, weights)[0]](client, rec, rng, user_key, etags)
+                if args.think_time:
+                    await asyncio.sleep(rng.expovariate(1 / args.think_time))
+
+        async def start_recording():
+            await asyncio.sleep(args.warmup)
+            rec.recording = True
+            return time.perf_counter()
+
+        deadline = time.perf_counter() + args.warmup + args.duration
+        recorder = asyncio.create_task(start_recording())
+        await asyncio.gather(*(virtual_user(i) for i in range(args.concurrency)))
+        elapsed = time.perf_counter() - await recorder
+    return rec, elapsed
+
+
+# -- servers ------------------------------------------------------------------
+
+def build_fixture(tmp, args):
+    from app import local_db
+    from app.food_index_store import DATASET_SOURCE, build_index_bytes, write_index
+    from benchmarks.bench_memory import synthetic_columns
+
+    db_path = os.path.join(tmp, "load_test.db")
+    raw = local_db._open(db_path)
+    local_db.create_schema(raw)
+    local_db.seed(raw, users=args.users, days=args.days, items_per_meal=args.items_per_meal)
+    raw.close()
+    index_path = os.path.join(tmp, "food_index.bin")
+    write_index(index_path, build_index_bytes(synthetic_columns(dining_hall_names(False), 20_000), DATASET_SOURCE))
+    return db_path, index_path
+
+
+def start_process(argv, env, log_path):
+    log = open(log_path, "w")
+    return subprocess.Popen(argv, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_ready(url, process, log_path, timeout=60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"{url} exited during startup; see {log_path}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"{url} not ready after {timeout}s; see {log_path}")
+
+
+# -- report -------------------------------------------------------------------
+
+def summarize(rec, elapsed):
+    results = {}
+    everything = []
+    for name in sorted(rec.samples):
+        samples = rec.samples[name]
+        everything.extend(samples)
+        results[name] = {
+            "count": len(samples),
+            "errors": rec.errors.get(name, 0),
+            "rps": round(len(samples) / elapsed, 1),
+            "p50_ms": round(percentile(samples, 50), 2),
+            "p95_ms": round(percentile(samples, 95), 2),
+            "p99_ms": round(percentile(samples, 99), 2),
+        }
+    if everything:
+        results["total"] = {
+            "count": len(everything),
+            "errors": sum(rec.errors.values()),
+            "rps": round(len(everything) / elapsed, 1),
+            "p50_ms": round(percentile(everything, 50), 2),
+            "p95_ms": round(percentile(everything, 95), 2),
+            "p99_ms": round(percentile(everything, 99), 2),
+        }
+    return results
+
+
+def print_results(results):
+    print(f"{'request':<22} {'count':>7} {'errors':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, r in results.items():
+        print(
+            f"{name:<22} {r['count']:>7} {r['errors']:>7} {r['rps']:>8.1f} "
+            f"{r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f}"
+        )
+
+
+def compare(results, baseline, tolerance):
+    """Print changes vs. the baseline; returns the metrics that got worse by more than `tolerance`."""
+    regressions = []
+    print(f"\nvs. baseline ({baseline['meta']['recorded_at']}, tolerance {tolerance:.0%}):")
+    print(f"{'request':<22} {'req/s':>16} {'p50 ms':>16} {'p95 ms':>16} {'p99 ms':>16}")
+    for name, r in results.items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:<22} (not in baseline)")
+            continue
+        cells = []
+        for metric, higher_is_better in (("rps", True), ("p50_ms", False), ("p95_ms", False), ("p99_ms", False)):
+            change = (r[metric] - old[metric]) / old[metric] if old[metric] else 0.0
+            worse = -change if higher_is_better else change
+            flag = "!" if worse > tolerance else " "
+            if flag == "!":
+                regressions.append(f"{name} {metric}")
+            cells.append(f"{old[metric]:>7.1f}{change:>+7.0%}{flag}")
+        print(f"{name:<22} " + " ".join(f"{c:>16}" for c in cells))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario weights, e.g. menu=4,log=2,dashboard=3,coach=1")
+    parser.add_argument("--concurrency", type=int, default=16, help="virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds run before measuring")
+    parser.add_argument("--think-time", type=float, default=0, help="mean seconds between a user's requests")
+    parser.add_argument("--timeout", type=float, default=30, help="per-request client timeout")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--users", type=int, default=2000, help="fixture users")
+    parser.add_argument("--days", type=int, default=30, help="fixture log history")
+    parser.add_argument("--items-per-meal", type=int, default=40, help="fixture menu items per hall and meal")
+    parser.add_argument("--gemini-latency", type=float, default=0.8, help="fake Gemini mean seconds per call")
+    parser.add_argument("--gemini-fail-rate", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8765, help="API port (fake Gemini uses port + 1)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run to --baseline")
+    parser.add_argument("--output", help="also write this run's JSON here")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative change counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 if anything regressed")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        db_path, index_path = build_fixture(tmp, args)
+        print(f"fixture: {args.users} users, {args.days} days of logs in {time.perf_counter() - started:.1f}s")
+
+        gemini_port = args.port + 1
+        env = {
+            **os.environ,
+            "DB_BACKEND": "sqlite",
+            "SQLITE_PATH": db_path,
+            "FOOD_INDEX_PATH": index_path,
+            "WRITE_JOURNAL_PATH": os.path.join(tmp, "write_journal.log"),
+            "COACH_CACHE_PATH": "",
+            "GEMINI_API_KEY": "fake",
+            "GEMINI_API_BASE": f"http://127.0.0.1:{gemini_port}",
+            "ADMIN_TOKEN": "load-test",
+            "PYTHONWARNINGS": "ignore",
+        }
+        gemini_log, api_log = os.path.join(tmp, "fake_gemini.log"), os.path.join(tmp, "api.log")
+        gemini = start_process(
+            [sys.executable, "-m", "benchmarks.fake_gemini", "--port", str(gemini_port),
+             "--latency", str(args.gemini_latency), "--fail-rate", str(args.gemini_fail_rate)],
+            env, gemini_log,
+        )
+        api = start_process(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port),
+             "--log-level", "warning", "--no-access-log"],
+            env, api_log,
+        )
+        base_url = f"http://127.0.0.1:{args.port}"
+        try:
+            wait_ready(f"http://127.0.0.1:{gemini_port}/docs", gemini, gemini_log)
+            wait_ready(f"{base_url}/health/ready", api, api_log)
+            print(
+                f"driving {base_url}: mix {args.mix}, {args.concurrency} users, "
+                f"{args.warmup:g}s warmup + {args.duration:g}s"
+            )
+            rec, elapsed = asyncio.run(drive(base_url, args, mix))
+            server_stats = httpx.get(f"{base_url}/admin/cache", headers={"X-Admin-Token": "load-test"}, timeout=5).json()
+        finally:
+            for process in (api, gemini):
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    results = summarize(rec, elapsed)
+    print()
+    print_results(results)
+    print(f"\ngemini: {server_stats.get('gemini')}")
+
+    run = {
+        "meta": {
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "args": {k: getattr(args, k) for k in RUN_OPTIONS},
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+
+    regressions = []
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+            f.write("\n")
+        print(f"\nsaved baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["meta"]["args"] != run["meta"]["args"]:
+            print("\nnote: baseline was recorded with different options; deltas are not like-for-like")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nregressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+    else:
+        print(f"\nno baseline at {args.baseline}; record one with --save-baseline")
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+from app.services.coach_prompt import build_prompt
+from app.services.meal_ranking import MenuMatrix, rank_menu, ranked_answer, tags, unfiltered
+
+MENU = [
+    {"HALL_NAME": "Worcester Dining Commons", "ITEM_NAME": "Mac and Cheese", "KCAL": 470, "PROTEIN_G": 18,
+     "CARB_G": 48, "FAT_G": 22, "ALLERGENS": "wheat,milk", "DIET_TAGS": "vegetarian"},
+    {"HALL_NAME": "Worcester Dining Commons", "ITEM_NAME": "Greek Yogurt Parfait", "KCAL": 240, "PROTEIN_G": 14,
+     "CARB_G": 32, "FAT_G": 6, "ALLERGENS": "tree_nut", "DIET_TAGS": "vegetarian"},
+    {"HALL_NAME": "Worcester Dining Commons", "ITEM_NAME": "Chana Masala", "KCAL": 310, "PROTEIN_G": 12,
+     "CARB_G": 45, "FAT_G": 9, "ALLERGENS": "", "DIET_TAGS": "vegan,vegetarian"},
+]
+
+
+def eligible_names(user):
+    matrix = MenuMatrix(MENU)
+    return [row["ITEM_NAME"] for row, ok in zip(MENU, matrix.eligible(user)) if ok]
+
+
+def test_frontend_allergy_ids_match_menu_tags():
+    # The ids DietaryRestrictionsForm.tsx sends.
+    assert tags('["peanuts","tree-nuts","dairy","eggs","soy","wheat-gluten","fish","shellfish"]') == {
+        "peanut", "tree_nut", "milk", "egg", "soy", "wheat", "fish", "shellfish",
+    }
+    user = {"ALLERGIES": '["dairy","tree-nuts","wheat-gluten"]', "DIET_TYPE": "NONE"}
+    assert eligible_names(user) == ["Chana Masala"]
+    assert unfiltered(user) == {}
+
+
+def test_frontend_diet_ids():
+    assert eligible_names({"DIET_TYPE": "GLUTEN-FREE"}) == ["Greek Yogurt Parfait", "Chana Masala"]
+    assert eligible_names({"DIET_TYPE": "PESCATARIAN"}) == ["Mac and Cheese", "Greek Yogurt Parfait", "Chana Masala"]
+    assert eligible_names({"DIET_TYPE": "VEGAN"}) == ["Chana Masala"]
+    for diet in ("KOSHER", "KETO", "PALEO"):
+        user = {"DIET_TYPE": diet, "KCAL_TARGET": 2000}
+        assert unfiltered(user) == {"diet": diet.lower()}
+        assert ranked_answer(user, rank_menu(user, MENU, k=5))["unfiltered"] == {"diet": diet.lower()}
+    assert "unfiltered" not in ranked_answer({"DIET_TYPE": "GLUTEN-FREE"}, {})
+
+
+def test_untagged_menu_filters_nothing_and_says_so():
+    # menu_items without the optional allergens/diet_tags columns (see menu_service).
+    menu = [{**row, "ALLERGENS": None, "DIET_TAGS": None} for row in MENU]
+    user = {"ALLERGIES": '["dairy"]', "DIET_TYPE": "VEGAN", "KCAL_TARGET": 2000}
+    assert MenuMatrix(menu).eligible(user).all()
+    assert unfiltered(user, menu) == {"allergies": ["milk"], "diet": "vegan"}
+    assert ranked_answer(user, rank_menu(user, menu, k=5))["unfiltered"] == {"allergies": ["milk"], "diet": "vegan"}
+    prompt, _ = build_prompt(user, menu, "lunch")
+    assert "already safe" not in prompt
+
+
+def test_unmapped_restrictions_are_not_claimed_safe():
+    user = {"ALLERGIES": '["other"]', "DIET_TYPE": "KETO"}
+    assert unfiltered(user) == {"allergies": ["other"], "diet": "keto"}
+    prompt, _ = build_prompt(user, MENU, "lunch")
+    assert "already safe" not in prompt
+    assert "WARNING" in prompt
+    assert "|allergens|diet_tags" in prompt
+
+    prompt, _ = build_prompt({"ALLERGIES": '["dairy"]', "DIET_TYPE": "VEGAN"}, MENU, "lunch")
+    assert "already safe" in prompt
+    assert "|allergens|diet_tags" not in prompt